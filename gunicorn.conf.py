@@ -0,0 +1,61 @@
+import multiprocessing
+import os
+
+# Production server settings, used by `gunicorn -c gunicorn.conf.py mealpricetracker.wsgi`.
+#
+# SERVER_MODE=asgi runs uvicorn workers instead, for mealpricetracker.asgi:application.
+# Every setting can be overridden on the command line or through GUNICORN_CMD_ARGS.
+
+bind = f"0.0.0.0:{os.environ.get('APP_PORT', '8000')}"
+
+# The usual (2 x CPUs) + 1 workers, so that some workers can run while others wait on the database.
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+
+if os.environ.get('SERVER_MODE', 'wsgi') == 'asgi':
+	worker_class = 'uvicorn.workers.UvicornWorker'
+	wsgi_app = 'mealpricetracker.asgi:application'
+else:
+	worker_class = 'gthread'
+	threads = int(os.environ.get('GUNICORN_THREADS', 2))
+	wsgi_app = 'mealpricetracker.wsgi:application'
+
+# Load Django once in the master process, before forking, so that workers share its memory copy-on-write.
+preload_app = True
+
+# Keep connections from a reverse proxy or load balancer open between requests.
+# This must be shorter than the proxy's own idle timeout.
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = timeout
+
+# Replace workers now and then, so that memory leaked by a worker is returned.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+
+# The directory of Prometheus metrics (see meals/metrics.py) must exist before the app is preloaded, which happens
+# before on_starting(). The files of a previous run are removed once the master has started, so that they are not counted.
+PROMETHEUS_MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+if PROMETHEUS_MULTIPROC_DIR:
+	os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+def on_starting(server):
+	if PROMETHEUS_MULTIPROC_DIR:
+		for filename in os.listdir(PROMETHEUS_MULTIPROC_DIR):
+			os.remove(os.path.join(PROMETHEUS_MULTIPROC_DIR, filename))
+
+# Connections opened by the master while the app was preloaded must not be shared with workers.
+def post_fork(server, worker):
+	from django.db import connections
+
+	connections.close_all()
+
+def child_exit(server, worker):
+	if PROMETHEUS_MULTIPROC_DIR:
+		from prometheus_client import multiprocess
+
+		multiprocess.mark_process_dead(worker.pid)
@@ -9,8 +9,31 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
+from asgiref.wsgi import WsgiToAsgi
+from django.conf import settings
 from django.core.asgi import get_asgi_application
+from whitenoise import WhiteNoise
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mealpricetracker.settings')
 
-application = get_asgi_application()
+# Leaves WhiteNoise out of the middleware, so that Django can run async views without a thread (see settings.py).
+os.environ['SERVER_MODE'] = 'asgi'
+
+django_application = get_asgi_application()
+
+# Static files collected into STATIC_ROOT are served by WhiteNoise in front of Django, in a thread.
+# Files with a hash in their names, as stored by CompressedManifestStaticFilesStorage, are cached forever.
+static_files = WhiteNoise(
+    None,
+    root=settings.STATIC_ROOT,
+    prefix=settings.STATIC_URL,
+    max_age=0 if settings.DEBUG else 60,
+    immutable_file_test=r'^.+\.[0-9a-f]{12}\..+$',
+)
+static_application = WsgiToAsgi(static_files)
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] in static_files.files:
+        return await static_application(scope, receive, send)
+
+    return await django_application(scope, receive, send)
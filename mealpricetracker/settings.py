@@ -26,17 +26,16 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.environ.get('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DEBUG', 'true').lower() in ['1', 'true', 'yes']
 
-ALLOWED_HOSTS = []
+# A comma separated list of the host names the site is served from, needed when DEBUG is off.
+ALLOWED_HOSTS = [host for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host]
 
 
 # Application definition
 
 INSTALLED_APPS = [
     'meals.apps.MealsConfig',
-    'dal',
-    'dal_select2',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -50,14 +49,25 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'meals.profiling.ProfilingMiddleware',
+    'meals.metrics.MetricsMiddleware',
 ]
 
+# Whether the site is served by mealpricetracker/asgi.py, which sets this to 'asgi', or by mealpricetracker/wsgi.py.
+# WhiteNoise only handles synchronous requests, and would make Django run every async view in a thread,
+# so under ASGI it is left out of the middleware and asgi.py serves static files in front of Django instead.
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+
+if SERVER_MODE == 'asgi':
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
 ROOT_URLCONF = 'mealpricetracker.urls'
 
 TEMPLATES = [
@@ -82,16 +92,43 @@ WSGI_APPLICATION = 'mealpricetracker.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
-DATABASES = {
-    	'default': {
-		'ENGINE': 'django.db.backends.postgresql_psycopg2',
-		'NAME': os.environ.get('DATABASE_NAME'),
-		'USER': os.environ.get('DATABASE_USERNAME'),
-		'PASSWORD': os.environ.get('DATABASE_PASSWORD'),
-		'HOST': os.environ.get('DATABASE_HOSTNAME'),
-		'PORT': ''
-	}
-}
+# DATABASE_ENGINE can be set to 'sqlite' to use an SQLite database in DATABASE_NAME (db.sqlite3 by default),
+# so that the app and its tests can be run without a PostgreSQL server.
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'postgresql')
+
+if DATABASE_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DATABASE_NAME') or BASE_DIR / 'db.sqlite3',
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql_psycopg2',
+            'NAME': os.environ.get('DATABASE_NAME'),
+            'USER': os.environ.get('DATABASE_USERNAME'),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD'),
+            'HOST': os.environ.get('DATABASE_HOSTNAME'),
+            'PORT': '',
+        }
+    }
+
+# Connections are kept open for DATABASE_CONN_MAX_AGE seconds and reused by later requests, rather than
+# connecting for each request. Set it to 0 to close them at the end of each request.
+# A connection which is reused is checked first, so that a connection closed by the server is replaced.
+DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DATABASE_CONN_MAX_AGE', 60))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Set DATABASE_POOLER to 'pgbouncer' when connecting through PgBouncer in transaction pooling mode.
+# Each transaction may then run on a different server connection, so cursors cannot be kept open across
+# transactions: server-side cursors are disabled, and exports read their rows a page at a time instead.
+# The pool is PgBouncer's, so connections to it can be kept open (DATABASE_CONN_MAX_AGE) as usual.
+DATABASE_POOLER = os.environ.get('DATABASE_POOLER')
+
+if DATABASE_POOLER == 'pgbouncer':
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
 
 
 # Password validation
@@ -130,6 +167,20 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Static files are collected into STATIC_ROOT by `manage.py collectstatic` and served by WhiteNoise.
+# Outside of debug mode they are stored compressed, with a hash of their contents in their names,
+# so that browsers can cache them forever.
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG else 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -140,6 +191,84 @@ LOGOUT_REDIRECT_URL = '/'
 
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
+# The currency that prices are shown in, unless another currency is requested.
+DEFAULT_CURRENCY = os.environ.get('DEFAULT_CURRENCY', 'EUR')
+
+# The maximum number of exchange rates held in memory by meals.currency.
+FX_RATE_CACHE_SIZE = int(os.environ.get('FX_RATE_CACHE_SIZE', 4096))
+
+# The number of seconds exchange rates are held in memory for, so that processes which do not share
+# the price cache see rates loaded by `manage.py load_fx_rates` after at most this long.
+FX_RATE_CACHE_TIMEOUT = int(os.environ.get('FX_RATE_CACHE_TIMEOUT', 300))
+
+# The number of rows fetched from the database at a time when exporting purchases.
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# The number of rows inserted at a time when importing purchases.
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 5000))
+
+# The largest number of meals which can be created or copied at once through the meal batch and clone APIs.
+MEAL_BATCH_SIZE = int(os.environ.get('MEAL_BATCH_SIZE', 100))
+
+# The meal planner (see meals/planner.py) plans up to PLANNER_MAX_DAYS days, and stops searching for a cheaper plan
+# after PLANNER_TIME_LIMIT seconds. It uses scipy's MILP solver if scipy is installed.
+PLANNER_MAX_DAYS = int(os.environ.get('PLANNER_MAX_DAYS', 28))
+PLANNER_TIME_LIMIT = float(os.environ.get('PLANNER_TIME_LIMIT', 0.5))
+
+# The number of rows on each page of the list views, and the largest number that can be asked for with page_size.
+PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 50))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 500))
+
+# The food item autocomplete (see meals/autocomplete.py) returns up to AUTOCOMPLETE_RESULTS food items.
+# The name indexes of the last AUTOCOMPLETE_CACHE_SIZE users to search are kept in the memory of each process.
+# Users with more than AUTOCOMPLETE_MAX_INDEX_SIZE food items are searched in the database instead.
+AUTOCOMPLETE_RESULTS = int(os.environ.get('AUTOCOMPLETE_RESULTS', 20))
+AUTOCOMPLETE_CACHE_SIZE = int(os.environ.get('AUTOCOMPLETE_CACHE_SIZE', 1000))
+AUTOCOMPLETE_MAX_INDEX_SIZE = int(os.environ.get('AUTOCOMPLETE_MAX_INDEX_SIZE', 10000))
+
+# The maximum number of points in a food item's price history. Longer histories are downsampled.
+PRICE_HISTORY_POINTS = int(os.environ.get('PRICE_HISTORY_POINTS', 200))
+
+# The number of days of meal cost snapshots kept up to date by `manage.py rollup_meal_costs`,
+# and the number of meals whose snapshots are calculated at a time.
+MEAL_COST_SNAPSHOT_DAYS = int(os.environ.get('MEAL_COST_SNAPSHOT_DAYS', 365))
+MEAL_COST_ROLLUP_BATCH_SIZE = int(os.environ.get('MEAL_COST_ROLLUP_BATCH_SIZE', 100))
+
+# Per-request profiling (see meals/profiling.py) is off unless PROFILING_ENABLED is set.
+# The timings of the last PROFILING_WINDOW_SIZE requests of each view are shown to staff at /_perf/.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '').lower() in ['1', 'true', 'yes']
+PROFILING_WINDOW_SIZE = int(os.environ.get('PROFILING_WINDOW_SIZE', 1000))
+
+# Prometheus metrics are served at /metrics (see meals/metrics.py) to staff, and to scrapers which send
+# METRICS_TOKEN as a bearer token in the Authorization header. Without a token, only staff can read them.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ['1', 'true', 'yes']
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Calculated prices are cached in the 'prices' cache (see meals/cache.py).
+# By default they are held in the memory of each process. PRICE_CACHE_BACKEND can be set to 'file' to share
+# them between processes through a directory, or to 'db' to use a table created by `manage.py createcachetable`.
+PRICE_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'prices'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache' / 'prices')),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'meals_price_cache'),
+}
+
+PRICE_CACHE_BACKEND, PRICE_CACHE_LOCATION = PRICE_CACHE_BACKENDS[os.environ.get('PRICE_CACHE_BACKEND', 'locmem')]
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'prices': {
+        'BACKEND': PRICE_CACHE_BACKEND,
+        'LOCATION': os.environ.get('PRICE_CACHE_LOCATION', PRICE_CACHE_LOCATION),
+        'TIMEOUT': int(os.environ.get('PRICE_CACHE_TIMEOUT', 60 * 60 * 24)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('PRICE_CACHE_MAX_ENTRIES', 100000)),
+        },
+    },
+}
+
 # try:
 #     from local_settings import *
 # except ImportError:
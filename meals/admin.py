@@ -5,10 +5,14 @@ from .models.food_item import FoodItem
 from .models.food_purchase import FoodPurchase
 from .models.standard_ingredient import StandardIngredient
 from .models.meal_instance import MealInstance
+from .models.fx_rate import FxRate
+from .models.meal_cost_snapshot import MealCostSnapshot
 
 
 admin.site.register(Meal)
 admin.site.register(FoodItem)
 admin.site.register(FoodPurchase)
 admin.site.register(StandardIngredient)
-admin.site.register(MealInstance)
\ No newline at end of file
+admin.site.register(MealInstance)
+admin.site.register(FxRate)
+admin.site.register(MealCostSnapshot)
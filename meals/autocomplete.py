@@ -0,0 +1,248 @@
+import re
+import time
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections, models, transaction
+from django.db.models.functions import Upper
+
+from meals.cache import get_price_cache
+from meals.models import FoodItem
+
+# The food item autocomplete, which is requested on every keystroke in the food item select boxes.
+#
+# The names of each user's food items are kept in memory in a NameIndex, sorted, so that names starting with
+# the search are found by binary search, and with an index of their trigrams, so that names which are spelt
+# differently are found too. The indexes of the users most recently searched are kept in each process.
+# Writes to a user's food items change their version in the price cache, which is shared between processes
+# when PRICE_CACHE_BACKEND is, and an index built for an older version is rebuilt when it is next searched.
+#
+# Users with more than AUTOCOMPLETE_MAX_INDEX_SIZE food items are searched in the database instead,
+# with the trigram index created by migrations/0004_query_indexes.py where the pg_trgm extension is available.
+
+# The lowest similarity of a name to the search for it to be suggested, as in pg_trgm.
+SIMILARITY_THRESHOLD = 0.3
+
+# The ranks of the ways a name can match the search, best first.
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING, SIMILAR = range(5)
+
+def _normalise(name):
+	return name.casefold().strip()
+
+# Return the trigrams of a name, as pg_trgm does: the trigrams of each word, padded with two spaces before and one after.
+def get_trigrams(name):
+	trigrams = set()
+
+	for word in re.findall(r'\w+', name.casefold()):
+		padded = f'  {word} '
+		trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+
+	return trigrams
+
+class NameIndex:
+
+	def __init__(self, food_items):
+		entries = sorted((_normalise(name), food_item_id, name) for food_item_id, name in food_items)
+
+		self.keys = [key for key, _, _ in entries]
+		self.ids = [food_item_id for _, food_item_id, _ in entries]
+		self.names = [name for _, _, name in entries]
+		self.trigram_counts = []
+		self.trigram_positions = {}
+
+		for position, key in enumerate(self.keys):
+			trigrams = get_trigrams(key)
+			self.trigram_counts.append(len(trigrams))
+
+			for trigram in trigrams:
+				self.trigram_positions.setdefault(trigram, []).append(position)
+
+	def __len__(self):
+		return len(self.keys)
+
+	# Return the (id, name) of the food items best matching the search, up to limit:
+	# an exact match, then names starting with the search, then names with a word starting with it,
+	# then names containing it, and then names which are similar to it, most similar first.
+	def search(self, query, limit):
+		query = _normalise(query)
+
+		if not query:
+			return [(self.ids[position], self.names[position]) for position in range(min(limit, len(self)))]
+
+		ranks = {}
+
+		start = bisect_left(self.keys, query)
+		end = bisect_left(self.keys, query + '\U0010ffff', start)
+
+		for position in range(start, end):
+			ranks[position] = (EXACT if self.keys[position] == query else PREFIX, 0)
+
+		word_prefix = re.compile(r'\b' + re.escape(query))
+
+		for position, key in enumerate(self.keys):
+			if position not in ranks and query in key:
+				ranks[position] = (WORD_PREFIX if word_prefix.search(key) else SUBSTRING, 0)
+
+		query_trigrams = get_trigrams(query)
+		shared_counts = Counter()
+
+		for trigram in query_trigrams:
+			shared_counts.update(self.trigram_positions.get(trigram, ()))
+
+		for position, shared in shared_counts.items():
+			if position in ranks:
+				continue
+
+			similarity = shared / (len(query_trigrams) + self.trigram_counts[position] - shared)
+
+			if similarity >= SIMILARITY_THRESHOLD:
+				ranks[position] = (SIMILAR, -similarity)
+
+		best = sorted(ranks, key=lambda position: (ranks[position], position))[:limit]
+
+		return [(self.ids[position], self.names[position]) for position in best]
+
+def _get_version_key(user_id):
+	return f'autocomplete:user:{user_id}:version'
+
+def _get_version(user_id):
+	price_cache = get_price_cache()
+	key = _get_version_key(user_id)
+	version = price_cache.get(key)
+
+	if version is None:
+		price_cache.add(key, time.time_ns(), timeout=None)
+
+		# Another process may have added the version first.
+		version = price_cache.get(key)
+
+	return version
+
+# The indexes of the users most recently searched, by user id, with the versions they were built for.
+class IndexCache:
+
+	def __init__(self):
+		self._lock = Lock()
+		self._indexes = OrderedDict()
+
+	def get(self, user_id, version):
+		with self._lock:
+			entry = self._indexes.get(user_id)
+
+			if entry is None or entry[0] != version:
+				return None
+
+			self._indexes.move_to_end(user_id)
+
+			return entry[1]
+
+	def set(self, user_id, version, index):
+		with self._lock:
+			self._indexes[user_id] = (version, index)
+			self._indexes.move_to_end(user_id)
+
+			while len(self._indexes) > settings.AUTOCOMPLETE_CACHE_SIZE:
+				self._indexes.popitem(last=False)
+
+	def discard(self, user_ids):
+		with self._lock:
+			for user_id in user_ids:
+				self._indexes.pop(user_id, None)
+
+	def clear(self):
+		with self._lock:
+			self._indexes.clear()
+
+indexes = IndexCache()
+
+# Return the user's name index, building it if it is out of date, or None if they have too many food items to index.
+def get_index(user_id):
+	version = _get_version(user_id)
+	index = indexes.get(user_id, version)
+
+	if index is not None:
+		return index
+
+	food_items = list(FoodItem.objects.filter(user_id=user_id).values_list('id', 'name')[:settings.AUTOCOMPLETE_MAX_INDEX_SIZE + 1])
+
+	if len(food_items) > settings.AUTOCOMPLETE_MAX_INDEX_SIZE:
+		return None
+
+	index = NameIndex(food_items)
+	indexes.set(user_id, version, index)
+
+	return index
+
+# Mark the name indexes of the given users as out of date, in every process.
+# This is done again once the current transaction has been committed, in case another request
+# rebuilds an index from the old names before then.
+def invalidate_users(user_ids):
+	user_ids = set(user_ids)
+
+	if not user_ids:
+		return
+
+	def invalidate():
+		indexes.discard(user_ids)
+		get_price_cache().set_many({_get_version_key(user_id): time.time_ns() for user_id in user_ids}, timeout=None)
+
+	invalidate()
+	transaction.on_commit(invalidate)
+
+def has_trigram_extension(using='default'):
+	connection = connections[using]
+
+	if connection.vendor != 'postgresql':
+		return False
+
+	if not hasattr(connection, '_meals_has_pg_trgm'):
+		with connection.cursor() as cursor:
+			cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+			connection._meals_has_pg_trgm = cursor.fetchone() is not None
+
+	return connection._meals_has_pg_trgm
+
+# Search the user's food items in the database, ranked in the same way as NameIndex.search().
+def _search_database(user_id, query, limit):
+	query = query.strip()
+	food_items = FoodItem.objects.filter(user_id=user_id)
+
+	if not query:
+		return list(food_items.order_by('name', 'id').values_list('id', 'name')[:limit])
+
+	matches = models.Q(name__icontains=query)
+	rank = models.Case(
+		models.When(name__iexact=query, then=models.Value(EXACT)),
+		models.When(name__istartswith=query, then=models.Value(PREFIX)),
+		default=models.Value(SUBSTRING),
+	)
+
+	if has_trigram_extension(food_items.db):
+		matches |= TrigramSimilar(Upper('name'), query.upper())
+		similarity = TrigramSimilarity(Upper('name'), query.upper())
+		rank = models.Case(
+			models.When(name__icontains=query, then=rank),
+			default=models.Value(SIMILAR),
+		)
+	else:
+		similarity = models.Value(0.0)
+
+	return list(
+		food_items.filter(matches).annotate(rank=rank, similarity=similarity).order_by('rank', '-similarity', 'name', 'id').values_list('id', 'name')[:limit]
+	)
+
+# Return the (id, name) of the user's food items best matching the search, up to limit.
+def search(user_id, query, limit=None):
+	if limit is None:
+		limit = settings.AUTOCOMPLETE_RESULTS
+
+	index = get_index(user_id)
+
+	if index is None:
+		return _search_database(user_id, query, limit)
+
+	return index.search(query, limit)
@@ -0,0 +1,236 @@
+import time
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from meals import metrics, pricing
+from meals.models.standard_ingredient import StandardIngredient
+
+# A cache of the prices calculated for each user's meals and food items.
+#
+# Each meal's entry holds its price and the prices of its ingredients, in each currency that has been requested.
+# Each food item's entry holds its formatted newest price. Entries are stored under keys which include
+# the user's cache version, and a global version, so all of a user's prices (or everyone's) can be
+# invalidated by incrementing a version. Otherwise, the signals in meals/signals.py delete the entries
+# of just the meals and food items affected by a change.
+
+CACHE_ALIAS = 'prices'
+
+GLOBAL_VERSION_KEY = 'prices:version'
+
+def get_price_cache():
+	return caches[CACHE_ALIAS]
+
+# Counts of cache hits and misses in this process, to show how effective the cache is.
+# They are also exported to Prometheus, as counts across all processes (see meals/metrics.py).
+class CacheStats:
+
+	def __init__(self):
+		self._lock = Lock()
+		self.reset()
+
+	def record(self, hits, misses):
+		with self._lock:
+			self.hits += hits
+			self.misses += misses
+
+		metrics.record_cache_lookups(hits, misses)
+
+	def reset(self):
+		self.hits = 0
+		self.misses = 0
+
+	@property
+	def hit_rate(self):
+		total = self.hits + self.misses
+		return self.hits / total if total else None
+
+stats = CacheStats()
+
+def _get_user_version_key(user_id):
+	return f'prices:user:{user_id}:version'
+
+# Return a new cache version. Versions are never reused, so if a version key is evicted from the cache,
+# entries stored under the old version cannot be mistaken for current ones.
+def _new_version():
+	return time.time_ns()
+
+# Return the cache key prefix of each of the given users' entries.
+def _get_key_prefixes(user_ids):
+	user_ids = set(user_ids)
+	price_cache = get_price_cache()
+
+	version_keys = [GLOBAL_VERSION_KEY] + [_get_user_version_key(user_id) for user_id in user_ids]
+	versions = price_cache.get_many(version_keys)
+
+	missing_version_keys = [key for key in version_keys if key not in versions]
+
+	if missing_version_keys:
+		for key in missing_version_keys:
+			price_cache.add(key, _new_version(), timeout=None)
+
+		# Another process may have added the version first.
+		versions.update(price_cache.get_many(missing_version_keys))
+
+	return {
+		user_id: f'prices:{versions[GLOBAL_VERSION_KEY]}:user:{user_id}:{versions[_get_user_version_key(user_id)]}'
+		for user_id in user_ids
+	}
+
+def _get_meal_key(prefix, meal_id):
+	return f'{prefix}:meal:{meal_id}'
+
+def _get_food_item_key(prefix, food_item_id):
+	return f'{prefix}:food_item:{food_item_id}'
+
+def _increment_version(key):
+	price_cache = get_price_cache()
+
+	# incr() fails if the key does not exist, e.g. if it has been evicted.
+	try:
+		price_cache.incr(key)
+	except ValueError:
+		price_cache.set(key, _new_version(), timeout=None)
+
+# Return the cache entries of the given meals, in the given currency, calculating any that are missing.
+def _get_meal_entries(user, meal_ids, currency):
+	if currency is None:
+		currency = settings.DEFAULT_CURRENCY
+
+	meal_ids = list(dict.fromkeys(meal_ids))
+	price_cache = get_price_cache()
+
+	prefix = _get_key_prefixes([user.pk])[user.pk]
+	keys = {meal_id: _get_meal_key(prefix, meal_id) for meal_id in meal_ids}
+
+	cached_entries = price_cache.get_many(keys.values())
+	entries = {}
+	missing_meal_ids = []
+
+	for meal_id, key in keys.items():
+		entry = cached_entries.get(key, {})
+
+		if currency in entry:
+			entries[meal_id] = entry[currency]
+		else:
+			missing_meal_ids.append(meal_id)
+
+	stats.record(hits=len(entries), misses=len(missing_meal_ids))
+
+	if not missing_meal_ids:
+		return entries
+
+	ingredients = list(StandardIngredient.objects.filter(meal_id__in=missing_meal_ids))
+	ingredient_prices = pricing.get_ingredient_prices(ingredients, currency=currency)
+	meal_prices = pricing.get_meal_prices(missing_meal_ids, currency=currency, ingredients=ingredients, ingredient_prices=ingredient_prices)
+
+	new_entries = {
+		meal_id: {
+			'price': meal_price,
+			'ingredient_prices': {},
+		}
+		for meal_id, meal_price in meal_prices.items()
+	}
+
+	for ingredient in ingredients:
+		new_entries[ingredient.meal_id]['ingredient_prices'][ingredient.id] = ingredient_prices[ingredient.id]
+
+	price_cache.set_many({
+		keys[meal_id]: {**cached_entries.get(keys[meal_id], {}), currency: entry}
+		for meal_id, entry in new_entries.items()
+	})
+
+	entries.update(new_entries)
+
+	return entries
+
+# Return a dict mapping the id of each of the user's meals to its newest price, as pricing.get_meal_prices() does.
+def get_meal_prices(user, meals, currency=None):
+	meal_ids = [meal.id if hasattr(meal, 'id') else meal for meal in meals]
+	entries = _get_meal_entries(user, meal_ids, currency)
+
+	return {meal_id: entries[meal_id]['price'] for meal_id in meal_ids}
+
+# Return the newest price of one of the user's meals, and a dict mapping the id of each of its ingredients to their prices.
+def get_meal_price_details(user, meal, currency=None):
+	entry = _get_meal_entries(user, [meal.id], currency)[meal.id]
+
+	return entry['price'], entry['ingredient_prices']
+
+# Return a dict mapping the id of each of the user's food items to its formatted newest price per unit.
+def get_food_item_prices(user, food_items):
+	food_items = list(food_items)
+	price_cache = get_price_cache()
+
+	prefix = _get_key_prefixes([user.pk])[user.pk]
+	keys = {food_item.id: _get_food_item_key(prefix, food_item.id) for food_item in food_items}
+
+	cached_prices = price_cache.get_many(keys.values())
+	prices = {}
+	new_prices = {}
+
+	for food_item in food_items:
+		key = keys[food_item.id]
+
+		if key in cached_prices:
+			prices[food_item.id] = cached_prices[key]
+		else:
+			prices[food_item.id] = new_prices[key] = food_item.get_newest_price()
+
+	stats.record(hits=len(food_items) - len(new_prices), misses=len(new_prices))
+
+	if new_prices:
+		price_cache.set_many(new_prices)
+
+	return prices
+
+# Delete the given cache keys now, and again once the current transaction has been committed.
+# Otherwise another request could cache prices calculated from the old data before it is committed.
+def _delete_keys(keys):
+	if not keys:
+		return
+
+	price_cache = get_price_cache()
+	price_cache.delete_many(keys)
+	transaction.on_commit(lambda: price_cache.delete_many(keys))
+
+# Invalidate the cached prices of the given meals, which are (meal id, user id) pairs.
+def invalidate_meals(meals):
+	meals = list(meals)
+	prefixes = _get_key_prefixes(user_id for _, user_id in meals)
+
+	_delete_keys([_get_meal_key(prefixes[user_id], meal_id) for meal_id, user_id in meals])
+
+# Invalidate the cached prices of the given food items, which are (food item id, user id) pairs,
+# along with the prices of the meals which use them.
+def invalidate_food_items(food_items):
+	food_items = list(food_items)
+
+	if not food_items:
+		return
+
+	meals = StandardIngredient.objects.filter(
+		food_item_id__in=[food_item_id for food_item_id, _ in food_items]
+	).values_list('meal_id', 'meal__user_id').distinct()
+
+	meals = list(meals)
+	prefixes = _get_key_prefixes([user_id for _, user_id in food_items] + [user_id for _, user_id in meals])
+
+	_delete_keys(
+		[_get_food_item_key(prefixes[user_id], food_item_id) for food_item_id, user_id in food_items] +
+		[_get_meal_key(prefixes[user_id], meal_id) for meal_id, user_id in meals]
+	)
+
+# Invalidate all of a user's cached prices.
+def invalidate_user(user):
+	_increment_version(_get_user_version_key(user.pk))
+
+# Invalidate everyone's cached prices, e.g. when the exchange rates have changed.
+def invalidate_all():
+	_increment_version(GLOBAL_VERSION_KEY)
+
+def clear():
+	get_price_cache().clear()
+	stats.reset()
@@ -0,0 +1,215 @@
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from decimal import Decimal
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+
+from meals.models.fx_rate import FxRate
+
+# Currency conversion, using the exchange rates in the FxRate table.
+# Rates are published against the euro on working days, so the rate of a currency on a date
+# is the most recent rate published on or before that date.
+# Rates are cached in memory by (currency, date), so that converting a page of prices
+# usually needs no queries at all.
+
+BASE_CURRENCY = 'EUR'
+
+VERSION_KEY = 'fx_rates:version'
+
+# Error to be raised when there is no exchange rate for a currency on a date.
+class MissingFxRateError(LookupError):
+	pass
+
+# A least recently used cache, with a maximum number of entries, each of which expires after timeout seconds.
+# It is shared by the threads of a process, so it is guarded by a lock.
+class RateCache:
+
+	def __init__(self, maxsize, timeout=None):
+		self.maxsize = maxsize
+		self.timeout = timeout
+		self.version = None
+		self._lock = Lock()
+		self._rates = OrderedDict()
+
+	def __contains__(self, key):
+		return self.get(key) is not None
+
+	def __len__(self):
+		return len(self._rates)
+
+	# Return the cached rate of the key, or None if it is not cached or has expired.
+	def get(self, key):
+		with self._lock:
+			entry = self._rates.get(key)
+
+			if entry is None:
+				return None
+
+			rate, expires = entry
+
+			if expires is not None and expires <= time.monotonic():
+				del self._rates[key]
+				return None
+
+			self._rates.move_to_end(key)
+
+			return rate
+
+	def set(self, key, rate):
+		expires = None if self.timeout is None else time.monotonic() + self.timeout
+
+		with self._lock:
+			self._rates[key] = (rate, expires)
+			self._rates.move_to_end(key)
+
+			while len(self._rates) > self.maxsize:
+				self._rates.popitem(last=False)
+
+	# Forget the cached rates if they were cached for another version of the FxRate table.
+	def check_version(self, version):
+		with self._lock:
+			if version != self.version:
+				self._rates.clear()
+				self.version = version
+
+	def clear(self):
+		with self._lock:
+			self._rates.clear()
+
+rate_cache = RateCache(settings.FX_RATE_CACHE_SIZE, settings.FX_RATE_CACHE_TIMEOUT)
+
+# The version of the FxRate table is kept in the 'prices' cache (see meals/cache.py), so that when it is shared
+# between processes, clearing the rates in one process clears them in all of them. Otherwise, rates cached by
+# other processes expire after FX_RATE_CACHE_TIMEOUT.
+def _get_version():
+	price_cache = caches['prices']
+	version = price_cache.get(VERSION_KEY)
+
+	if version is None:
+		price_cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+		# Another process may have added the version first.
+		version = price_cache.get(VERSION_KEY)
+
+	return version
+
+# Forget all the cached rates, in every process. This must be called when the FxRate table changes.
+def clear_rate_cache():
+	rate_cache.clear()
+	caches['prices'].set(VERSION_KEY, time.time_ns(), timeout=None)
+
+# Load the rates of the given (currency, date) keys from the database.
+# Keys which have no rate on or before their date map to None.
+def _load_rates(keys):
+	keys_by_currency = {}
+
+	for currency, date in keys:
+		keys_by_currency.setdefault(currency, []).append(date)
+
+	first_date = min(date for _, date in keys)
+	last_date = max(date for _, date in keys)
+
+	rates = FxRate.objects.filter(
+		currency__in=keys_by_currency,
+		date__gte=first_date,
+		date__lte=last_date
+	).order_by('currency', 'date').values_list('currency', 'date', 'rate')
+
+	history = {currency: ([], []) for currency in keys_by_currency}
+
+	for currency, date, rate in rates:
+		history[currency][0].append(date)
+		history[currency][1].append(rate)
+
+	loaded_rates = {}
+
+	for currency, dates in keys_by_currency.items():
+		rate_dates, currency_rates = history[currency]
+
+		# Dates before the first rate in the range need the latest rate before the range.
+		if not rate_dates or min(dates) < rate_dates[0]:
+			previous_rate = FxRate.objects.filter(
+				currency=currency,
+				date__lt=first_date
+			).order_by('-date').values_list('date', 'rate').first()
+
+			if previous_rate:
+				rate_dates.insert(0, previous_rate[0])
+				currency_rates.insert(0, previous_rate[1])
+
+		for date in dates:
+			index = bisect_right(rate_dates, date)
+			loaded_rates[(currency, date)] = currency_rates[index - 1] if index else None
+
+	return loaded_rates
+
+# Return a dict mapping each (currency, date) key to the rate of the currency on that date,
+# or None if there is no rate. The rates which are not cached are loaded together.
+def get_rates(keys):
+	rates = {}
+	uncached_keys = set()
+
+	rate_cache.check_version(_get_version())
+
+	for key in set(keys):
+		if key[0] == BASE_CURRENCY:
+			rates[key] = Decimal(1)
+		else:
+			rates[key] = rate_cache.get(key)
+
+			if rates[key] is None:
+				uncached_keys.add(key)
+
+	# Missing rates are not cached, so that they are found once they are loaded.
+	if uncached_keys:
+		for key, rate in _load_rates(uncached_keys).items():
+			if rate is not None:
+				rate_cache.set(key, rate)
+
+			rates[key] = rate
+
+	return rates
+
+# Return the rate of a currency on a date, raising MissingFxRateError if there is none.
+def get_rate(currency, date):
+	rate = get_rates([(currency, date)])[(currency, date)]
+
+	if rate is None:
+		raise MissingFxRateError(f'There is no exchange rate for {currency} on or before {date}.')
+
+	return rate
+
+# Convert amounts of money into the target currency, using the rates on the given dates.
+# There is one entry in each of amounts, currencies and dates per amount.
+# Returns a list of the converted amounts, rounded to the cent. Amounts which cannot be converted are None.
+def convert(amounts, currencies, dates, target=None):
+	if target is None:
+		target = settings.DEFAULT_CURRENCY
+
+	amounts, currencies, dates = list(amounts), list(currencies), list(dates)
+
+	rates = get_rates(
+		[(currency, date) for currency, date in zip(currencies, dates) if currency != target] +
+		[(target, date) for currency, date in zip(currencies, dates) if currency != target]
+	)
+
+	converted_amounts = []
+
+	for amount, currency, date in zip(amounts, currencies, dates):
+		if currency == target:
+			converted_amounts.append(amount)
+			continue
+
+		from_rate = rates[(currency, date)]
+		to_rate = rates[(target, date)]
+
+		if from_rate is None or to_rate is None:
+			converted_amounts.append(None)
+			continue
+
+		converted_amounts.append(round(Decimal(amount) * to_rate / from_rate, 2))
+
+	return converted_amounts
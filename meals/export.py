@@ -0,0 +1,95 @@
+import csv
+import json
+from datetime import date
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+
+from meals.models import FoodPurchase
+
+# Exports of a user's purchase history.
+# The rows are read through a server-side cursor and written out one at a time,
+# so an export uses the same amount of memory however long the history is.
+# When server-side cursors are disabled (see DATABASE_POOLER in the settings), the rows are read a page at a time instead.
+
+EXPORT_FIELDS = ['id', 'date', 'food_item', 'price_amount', 'currency', 'quantity', 'unit', 'location']
+
+# Error to be raised when the filters of an export are invalid.
+class ExportFilterError(ValueError):
+	pass
+
+def _parse_date(value, name):
+	try:
+		return date.fromisoformat(value)
+	except ValueError:
+		raise ExportFilterError(f'{name} must be a date in the format YYYY-MM-DD. Got {value}.')
+
+# Return the user's purchases to be exported, filtered by the query parameters of the request:
+# start and end (inclusive dates) and food_item (one or more food item ids).
+def get_export_queryset(user, params):
+	purchases = FoodPurchase.objects.filter(user=user)
+
+	if params.get('start'):
+		purchases = purchases.filter(date__gte=_parse_date(params['start'], 'start'))
+
+	if params.get('end'):
+		purchases = purchases.filter(date__lte=_parse_date(params['end'], 'end'))
+
+	food_item_ids = params.getlist('food_item')
+
+	if food_item_ids:
+		try:
+			food_item_ids = [int(food_item_id) for food_item_id in food_item_ids]
+		except ValueError:
+			raise ExportFilterError('food_item must be the id of a food item.')
+
+		purchases = purchases.filter(food_item_id__in=food_item_ids)
+
+	return purchases.order_by('date', 'id').values_list(
+		'id', 'date', 'food_item__name', 'price_amount', 'currency', 'quantity', 'unit', 'location'
+	)
+
+def _iterate_rows(purchases):
+	if connections[purchases.db].settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+		return _iterate_pages(purchases, settings.EXPORT_CHUNK_SIZE)
+
+	return purchases.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+# Read the rows in pages of page_size, each starting after the date and id of the last row of the previous page.
+# Each page is read by its own query, so no cursor is kept open between them.
+def _iterate_pages(purchases, page_size):
+	page = list(purchases[:page_size])
+
+	while page:
+		yield from page
+
+		if len(page) < page_size:
+			break
+
+		last_id, last_date = page[-1][:2]
+		page = list(purchases.filter(Q(date__gt=last_date) | Q(date=last_date, id__gt=last_id))[:page_size])
+
+# A file-like object which returns what is written to it, so that csv.writer can produce one line at a time.
+class Echo:
+	def write(self, value):
+		return value
+
+def generate_csv(purchases):
+	writer = csv.writer(Echo())
+
+	yield writer.writerow(EXPORT_FIELDS)
+
+	for row in _iterate_rows(purchases):
+		yield writer.writerow(row)
+
+# Newline delimited JSON, with one purchase per line.
+# Prices and quantities are written as strings, so that they keep their exact decimal values.
+def generate_ndjson(purchases):
+	for row in _iterate_rows(purchases):
+		purchase = dict(zip(EXPORT_FIELDS, row))
+		purchase['date'] = purchase['date'].isoformat()
+		purchase['price_amount'] = str(purchase['price_amount'])
+		purchase['quantity'] = str(purchase['quantity'])
+
+		yield json.dumps(purchase) + '\n'
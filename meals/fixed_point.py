@@ -0,0 +1,126 @@
+from decimal import Decimal
+from fractions import Fraction
+
+import numpy as np
+
+from meals.helper import CONVERSION_RATIOS, DENSITY_EXPONENTS
+
+# Fixed-point arithmetic for pricing many items at once.
+# Amounts of money are held as integer minor units (cents), and quantities as integer hundredths,
+# in int64 NumPy arrays. Decimals are only created when the results are presented.
+# Results are rounded half to even, as Decimal rounding is, so they match the Decimal calculations to the cent.
+
+DECIMAL_PLACES = 2
+SCALE = 10 ** DECIMAL_PLACES
+
+# Products larger than this are calculated with Python integers, so that they do not overflow int64.
+MAX_INT64_PRODUCT = 2 ** 62
+
+# The exact conversion ratio between every pair of units within a dimension, as integer numerators and denominators.
+# Pairs of units which need a density, or which cannot be converted, have a numerator of 0.
+def _build_ratio_matrices():
+	num_units = len(CONVERSION_RATIOS)
+
+	numerators = np.zeros((num_units, num_units), dtype=np.int64)
+	denominators = np.ones((num_units, num_units), dtype=np.int64)
+
+	for from_id, row in enumerate(CONVERSION_RATIOS):
+		for to_id, conversion in enumerate(row):
+			if conversion is None or conversion[1] != 0:
+				continue
+
+			numerators[from_id, to_id] = conversion[0].numerator
+			denominators[from_id, to_id] = conversion[0].denominator
+
+	return numerators, denominators
+
+RATIO_NUMERATORS, RATIO_DENOMINATORS = _build_ratio_matrices()
+
+# Convert Decimal amounts of money or quantities to integer hundredths, rounding half to even.
+def to_fixed_point(values):
+	return np.array([int((Decimal(value) * SCALE).to_integral_value()) for value in values], dtype=np.int64)
+
+# Convert an integer number of hundredths back to a Decimal, with two decimal places.
+def from_fixed_point(value):
+	return Decimal(int(value)).scaleb(-DECIMAL_PLACES)
+
+# Divide arrays of integers, rounding the results half to even.
+# This works for arrays of Python integers (with dtype=object) as well as int64 arrays.
+def divide_round_half_even(numerators, denominators):
+	quotients = numerators // denominators
+	remainders = numerators - quotients * denominators
+
+	round_up = (2 * remainders > denominators) | ((2 * remainders == denominators) & (quotients % 2 == 1))
+
+	return quotients + round_up
+
+# Return the conversion ratios from the purchase units to the output units, as numerators and denominators.
+# The ratio is the number of output units in one purchase unit.
+def _get_conversion_ratios(purchase_unit_ids, unit_ids, densities):
+	numerators = RATIO_NUMERATORS[purchase_unit_ids, unit_ids]
+	denominators = RATIO_DENOMINATORS[purchase_unit_ids, unit_ids]
+	density_exponents = DENSITY_EXPONENTS[purchase_unit_ids, unit_ids]
+
+	# Conversions between mass and volume depend upon the density of each food item, so they are worked out one by one.
+	# Their numerators and denominators may not fit in int64, so Python integers are used.
+	if density_exponents.any():
+		numerators = numerators.astype(object)
+		denominators = denominators.astype(object)
+
+		for i in np.flatnonzero(density_exponents):
+			density = densities[i] if densities is not None else None
+
+			if not density or density != density: # Missing, zero or NaN.
+				continue
+
+			ratio = CONVERSION_RATIOS[purchase_unit_ids[i]][unit_ids[i]][0] * Fraction(density) ** int(density_exponents[i])
+
+			numerators[i] = ratio.numerator
+			denominators[i] = ratio.denominator
+
+	return numerators, denominators
+
+# Calculate the prices of quantities of food items, based upon their purchases.
+# There is one entry in each array per item. Prices and quantities are in fixed point, and units are unit IDs.
+# The densities, in g/ml, are only needed to convert between mass and volume.
+# Returns an int64 array of prices in minor units, and a boolean array of which prices could be calculated.
+def calculate_prices(purchase_prices, purchase_quantities, purchase_unit_ids, quantities, unit_ids, densities=None):
+	purchase_prices = np.asarray(purchase_prices, dtype=np.int64)
+	purchase_quantities = np.asarray(purchase_quantities, dtype=np.int64)
+	quantities = np.asarray(quantities, dtype=np.int64)
+	purchase_unit_ids = np.asarray(purchase_unit_ids, dtype=np.intp)
+	unit_ids = np.asarray(unit_ids, dtype=np.intp)
+
+	ratio_numerators, ratio_denominators = _get_conversion_ratios(purchase_unit_ids, unit_ids, densities)
+
+	priced = (ratio_numerators != 0) & (purchase_quantities != 0)
+	priced = priced.astype(bool)
+
+	# price = purchase price / purchase quantity * quantity / ratio
+	# The scales of the two quantities cancel out, leaving the price in minor units.
+	numerators = [purchase_prices, quantities, np.where(priced, ratio_denominators, 0)]
+	denominators = [np.where(priced, purchase_quantities, 1), np.where(priced, ratio_numerators, 1)]
+
+	# Estimate the size of the products, to find any that might overflow.
+	largest_product = np.maximum(
+		np.prod([np.abs(value.astype(np.float64)) for value in numerators], axis=0),
+		np.prod([np.abs(value.astype(np.float64)) for value in denominators], axis=0),
+	)
+
+	if (largest_product < MAX_INT64_PRODUCT).all():
+		numerators = [value.astype(np.int64) for value in numerators]
+		denominators = [value.astype(np.int64) for value in denominators]
+	else:
+		numerators = [value.astype(object) for value in numerators]
+		denominators = [value.astype(object) for value in denominators]
+
+	prices = divide_round_half_even(np.prod(numerators, axis=0), np.prod(denominators, axis=0))
+
+	return prices.astype(np.int64), priced
+
+# Sum the values of each group, where groups is an array of group indexes between 0 and num_groups.
+def sum_groups(values, groups, num_groups):
+	totals = np.zeros(num_groups, dtype=np.int64)
+	np.add.at(totals, np.asarray(groups, dtype=np.intp), np.asarray(values, dtype=np.int64))
+
+	return totals
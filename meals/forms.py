@@ -3,12 +3,13 @@ from pprint import pprint
 from django import forms
 from django.contrib import messages
 from django.contrib.auth.models import User
+from django.utils.functional import cached_property
 
 from django_select2 import forms as s2forms
 
 from .models import FoodItem, FoodPurchase, Meal, MealInstance, StandardIngredient
 
-from meals.models.food_item import UserDuplicateFoodItemError
+from meals.models.food_item import normalise_food_item_name
 
 class MealForm(forms.ModelForm):
 	class Meta:
@@ -63,7 +64,7 @@ class MealInstanceForm(forms.ModelForm):
 class FoodItemForm(forms.ModelForm):
 	class Meta:
 		model = FoodItem
-		fields = ['name']
+		fields = ['name', 'density']
 
 	def __init__(self, *args, **kwargs):
 		self.user    = kwargs.pop('user', None)
@@ -79,23 +80,26 @@ class FoodItemForm(forms.ModelForm):
 		food_item = super().save(commit=False)
 		food_item.user = self.user
 
-		if commit:
-			try:
-				food_item.save()
+		if commit and not food_item._state.adding:
+			food_item.save()
+
+		# New food items are created by resolve_names(), which inserts the name with ON CONFLICT DO NOTHING,
+		# so that a food item with the same name created by another request is found rather than duplicated.
+		elif commit:
+			new_food_item = food_item
+			food_item = next(iter(FoodItem.objects.resolve_names(self.user, [food_item.name]).values()))
 
 			# If the user already has a food item with the same name, return that food item.
-			except UserDuplicateFoodItemError as e:
-				
+			if not food_item.created:
 				if self.request: # We can only pass the message if the request is provided.
 					messages.warning(
 						self.request,
-						f'Food item "{food_item.name}" already exists.'
+						f'Food item "{new_food_item.name}" already exists.'
 					)
 
-				return FoodItem.objects.filter(
-					name__iexact=food_item.name,
-					user=self.user
-				).first()
+			elif new_food_item.density is not None:
+				food_item.density = new_food_item.density
+				FoodItem.objects.filter(pk=food_item.pk).update(density=food_item.density)
 
 		return food_item
 
@@ -133,10 +137,17 @@ class FoodPurchaseForm(forms.ModelForm):
 		elif food_item.user != self.user:
 			self.add_error('food_item', 'The selected food item does not belong to the current user.')
 
+# Searches are answered by the food item autocomplete (see meals/autocomplete.py), rather than by
+# django_select2's own view, so the widget does not need to store its queryset in the cache to be searched.
 class FoodItemWidget(s2forms.ModelSelect2Widget):
-	search_fields = [
-		'name__icontains',
-	]
+	search_fields = []
+
+	def __init__(self, *args, **kwargs):
+		kwargs.setdefault('data_view', 'food_item_autocomplete')
+		super().__init__(*args, **kwargs)
+
+	def set_to_cache(self):
+		pass
 
 	def get_queryset(self):
 		user = self.attrs.get('user', None)
@@ -149,6 +160,10 @@ class FoodItemField(forms.ModelChoiceField):
 
 	def __init__(self, *args, **kwargs):
 		self.user = kwargs.pop('user', None)
+
+		# The food items already loaded for the values which may be submitted, by value (see preload_food_items()).
+		self.food_items = dict(kwargs.pop('food_items', None) or {})
+
 		super().__init__(FoodItem.objects.filter(user=self.user), *args, **kwargs)
 
 		self.widget = FoodItemWidget(attrs={
@@ -160,41 +175,23 @@ class FoodItemField(forms.ModelChoiceField):
 		})
 
 	def to_python(self, value):
+		if value in self.food_items:
+			return self.food_items[value]
+
 		if value.isdigit():
 			return super().to_python(value)
-		
-		# food_item_name = value.strip().capitalize()
-		
-		# existing_food_item = FoodItem.objects.filter(
-		# 	name__iexact=food_item_name,
-		# 	user=self.user
-		# )
-
-		# if existing_food_item:
-		# 	return existing_food_item.first()
-
-
-		# new_food_item = FoodItem(
-		# 	name=food_item_name,
-		# 	user=self.user
-		# )
-
-		# new_food_item.save()
-
-		# return new_food_item
-
 
 		# TODO: A potential problem here is that this creates and saves the new food item even if the form is not valid.
 		# This means we could end up with a bunch of food items that are not used anywhere.
-		# I've tried simply returning the new food item without saving it (see commented out code above),
-		# but then the validation failed because the food_item fields is apparently empty.
-		# Need to investigate this further.
-		food_item_name = value.strip().capitalize()
-		food_item, created = FoodItem.objects.get_or_create(
-			user=self.user,
-			name=food_item_name
-		)
-		return food_item
+		return self.resolve_name(value)
+
+	# Return the user's food item with the name, creating it if it does not exist.
+	# The food item is kept, as the form looks up the same name before it is validated.
+	def resolve_name(self, name):
+		if name not in self.food_items:
+			self.food_items[name] = next(iter(FoodItem.objects.resolve_names(self.user, [name]).values()))
+
+		return self.food_items[name]
 		
 	def validate(self, value):
 		super().validate(value)
@@ -217,6 +214,7 @@ class StandardIngredientForm(forms.ModelForm):
 	def __init__(self, *args, **kwargs):
 		self.meal = kwargs.pop('meal', None)
 		self.user = kwargs.pop('user', None)
+		food_items = kwargs.pop('food_items', None)
 
 		if self.user is None:
 			raise ValueError('User must be provided to the StandardIngredientForm.')
@@ -226,7 +224,7 @@ class StandardIngredientForm(forms.ModelForm):
 
 		super().__init__(*args, **kwargs)
 		self.fields['form_type'] = forms.CharField(widget=forms.HiddenInput, initial='standard_ingredient')
-		self.fields['food_item'] = FoodItemField(user=self.user)
+		self.fields['food_item'] = FoodItemField(user=self.user, food_items=food_items)
 
 		if self.instance and hasattr(self.instance, 'meal'):
 			self.meal = self.instance.meal
@@ -256,6 +254,14 @@ class StandardIngredientForm(forms.ModelForm):
 			instance.save()
 
 		return instance
+
+	# The food_item field only returns the user's existing food items, so the ingredient does not need to query
+	# for its food item again when it is validated.
+	def _get_validation_exclusions(self):
+		exclusions = super()._get_validation_exclusions()
+		exclusions.add('food_item')
+
+		return exclusions
 	
 	def assign_food_item(self):
 		food_item = self.data.get('food_item', None)
@@ -269,13 +275,67 @@ class StandardIngredientForm(forms.ModelForm):
 
 		if isinstance(food_item, FoodItem):
 			self.instance.food_item = food_item
+		elif food_item in self.fields['food_item'].food_items:
+			self.instance.food_item = self.fields['food_item'].food_items[food_item]
 		elif food_item.isdigit():
-			self.instance.food_item = FoodItem.objects.get(id=food_item)
+			# A food item which does not exist is reported when the food_item field is cleaned.
+			self.instance.food_item = FoodItem.objects.filter(id=food_item).first()
 		else:
-			food_item_name = food_item.strip().capitalize()
-			self.instance.food_item = FoodItem.objects.get_or_create(
-				user=self.user,
-				name=food_item_name
-			)[0]
+			# An invalid name is reported when the food_item field is cleaned.
+			try:
+				self.instance.food_item = self.fields['food_item'].resolve_name(food_item)
+			except forms.ValidationError:
+				pass
+
+		
+
+# Return a dict mapping each of the values submitted for food item fields to the user's food item, in two queries for
+# any number of values: one for the food items chosen by id, and one which creates those named which do not exist yet.
+# Values which are not valid are left out, to be reported by the fields.
+def preload_food_items(user, values):
+	values = {value for value in values if isinstance(value, str) and value.strip()}
+	ids = [value for value in values if value.isdigit()]
+	names = {}
+	food_items = {}
+
+	for value in values:
+		if not value.isdigit():
+			try:
+				names[value] = normalise_food_item_name(value).lower()
+			except forms.ValidationError:
+				pass
+
+	for food_item in FoodItem.objects.filter(user=user, pk__in=ids):
+		food_item.user = user
+		food_items[str(food_item.pk)] = food_item
+
+	if names:
+		resolved = FoodItem.objects.resolve_names(user, names)
+
+		for value, lower_name in names.items():
+			food_items[value] = resolved[lower_name]
+
+	return food_items
+
+# A formset of the ingredients of a new meal, which loads the food items of all of the ingredients at once,
+# and saves the meal and its ingredients together (see MealQuerySet.bulk_create_with_ingredients()).
+class BaseStandardIngredientFormSet(forms.BaseFormSet):
+
+	def get_form_kwargs(self, index):
+		kwargs = super().get_form_kwargs(index)
+
+		if self.is_bound and index is not None:
+			kwargs['food_items'] = self.food_items
+
+		return kwargs
+
+	@cached_property
+	def food_items(self):
+		values = [self.data.get(self.add_prefix(index) + '-food_item') for index in range(self.total_form_count())]
+
+		return preload_food_items(self.form_kwargs['user'], values)
+
+	def save(self, meal):
+		ingredients = [form.instance for form in self.forms]
 
-		
\ No newline at end of file
+		return Meal.objects.bulk_create_with_ingredients([(meal, ingredients)])[0]
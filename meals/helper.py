@@ -1,48 +1,178 @@
-def get_unit_conversion_factor(from_unit, to_unit):
+"""
+Unit conversion.
+
+Every unit belongs to a dimension, and is defined as a whole number of the dimension's base unit.
+The base units are small enough that all of the units below are exact multiples of them,
+so conversions within a dimension are exact ratios of integers.
+
+Conversions between mass and volume are possible when the density of the food is known.
+Conversions to or from pieces are never possible, as the weight of a piece is unknown.
+
+The conversion ratios between every pair of units are calculated once, when this module is imported.
+Units are looked up by an integer ID, which indexes the conversion matrices.
+"""
+
+from fractions import Fraction
+
+import numpy as np
+
+MASS   = 'mass'
+VOLUME = 'volume'
+COUNT  = 'count'
+
+# The base unit of mass is 0.1 mg, and the base unit of volume is 1 µl.
+# These are the number of grams and millilitres in each base unit, which are used for density conversions.
+BASE_UNIT_SIZES = {
+	MASS: Fraction(1, 10_000),
+	VOLUME: Fraction(1, 1_000),
+	COUNT: Fraction(1),
+}
+
+# The dimension of each unit, and the number of the dimension's base unit that it is made up of.
+# The cup is the 250 ml metric cup.
+UNITS = {
+	'g': (MASS, 10_000),
+	'kg': (MASS, 10_000_000),
+	'oz': (MASS, 283_495),
+	'lb': (MASS, 4_535_920),
+	'ml': (VOLUME, 1_000),
+	'l': (VOLUME, 1_000_000),
+	'tsp': (VOLUME, 5_000),
+	'tbsp': (VOLUME, 15_000),
+	'cup': (VOLUME, 250_000),
+	'pc': (COUNT, 1),
+}
+
+UNIT_IDS = {unit: unit_id for unit_id, unit in enumerate(UNITS)}
+
+class UnitConversionError(ValueError):
+	pass
+
+def get_unit_id(unit):
+	"""
+	Returns the integer ID of a unit. Unit names are case insensitive.
+	"""
+	try:
+		return UNIT_IDS[unit]
+	except KeyError:
+		pass
+
+	try:
+		return UNIT_IDS[unit.lower()]
+	except (KeyError, AttributeError):
+		raise UnitConversionError(f'Unknown unit: {unit}')
+
+def get_unit_ids(units):
+	"""
+	Returns an array of the integer IDs of the given units.
+	"""
+	if isinstance(units, np.ndarray) and np.issubdtype(units.dtype, np.integer):
+		return units
+
+	return np.array([get_unit_id(unit) for unit in units], dtype=np.intp)
+
+def _get_conversion(from_unit, to_unit):
+	"""
+	Returns the ratio for converting from one unit to the other when the density is 1 g/ml,
+	and the power of the density that the ratio must be multiplied by.
+	Returns None if there is no conversion between the units.
+	"""
+	from_dimension, from_size = UNITS[from_unit]
+	to_dimension, to_size = UNITS[to_unit]
+
+	ratio = Fraction(from_size, to_size)
+
+	if from_dimension == to_dimension:
+		return ratio, 0
+
+	ratio *= BASE_UNIT_SIZES[from_dimension] / BASE_UNIT_SIZES[to_dimension]
+
+	if (from_dimension, to_dimension) == (MASS, VOLUME):
+		return ratio, -1
+
+	if (from_dimension, to_dimension) == (VOLUME, MASS):
+		return ratio, 1
+
+	return None
+
+def _build_conversion_matrices():
+	num_units = len(UNITS)
+
+	ratios = [[None] * num_units for _ in range(num_units)]
+	factors = np.full((num_units, num_units), np.nan)
+	density_exponents = np.zeros((num_units, num_units), dtype=np.int8)
+
+	for from_unit, from_id in UNIT_IDS.items():
+		for to_unit, to_id in UNIT_IDS.items():
+			conversion = _get_conversion(from_unit, to_unit)
+
+			if conversion is None:
+				continue
+
+			ratio, density_exponent = conversion
+
+			ratios[from_id][to_id] = (ratio, density_exponent)
+			factors[from_id, to_id] = float(ratio)
+			density_exponents[from_id, to_id] = density_exponent
+
+	return ratios, factors, density_exponents
+
+CONVERSION_RATIOS, CONVERSION_FACTORS, DENSITY_EXPONENTS = _build_conversion_matrices()
+
+def get_unit_conversion_ratio(from_unit, to_unit, density=None):
+	"""
+	Returns the exact number of to_units in one from_unit, as a Fraction.
+	The density of the food, in g/ml, is needed to convert between mass and volume.
+	"""
+	conversion = CONVERSION_RATIOS[get_unit_id(from_unit)][get_unit_id(to_unit)]
+
+	if conversion is None:
+		raise UnitConversionError(f'Cannot convert from {from_unit} to {to_unit}.')
+
+	ratio, density_exponent = conversion
+
+	if density_exponent == 0:
+		return ratio
+
+	if not density:
+		raise UnitConversionError(f'Cannot convert from {from_unit} to {to_unit} without the density of the food.')
+
+	return ratio * Fraction(density) ** density_exponent
+
+def get_unit_conversion_factor(from_unit, to_unit, density=None):
 	"""
 	Converts from one unit to another.
+	Returns the number of to_units in one from_unit.
 	"""
-	conversion_factor = 1
-
-	from_unit = from_unit.lower()
-	to_unit = to_unit.lower()
-
-	if from_unit == to_unit:
-		return conversion_factor
-
-	if from_unit == 'oz':
-		if to_unit == 'lb':
-			conversion_factor = 1 / 16
-		elif to_unit == 'g':
-			conversion_factor = 28.3495
-		elif to_unit == 'kg':
-			conversion_factor = 0.0283495
-	elif from_unit == 'lb':
-		if to_unit == 'oz':
-			conversion_factor = 16
-		elif to_unit == 'g':
-			conversion_factor = 453.592
-		elif to_unit == 'kg':
-			conversion_factor = 0.453592
-	elif from_unit == 'g':
-		if to_unit == 'oz':
-			conversion_factor = 0.035274
-		elif to_unit == 'lb':
-			conversion_factor = 0.00220462
-		elif to_unit == 'kg':
-			conversion_factor = 0.001
-	elif from_unit == 'kg':
-		if to_unit == 'oz':
-			conversion_factor = 35.274
-		elif to_unit == 'lb':
-			conversion_factor = 2.20462
-		elif to_unit == 'g':
-			conversion_factor = 1000
-	elif from_unit == 'ml':
-		if to_unit == 'l':
-			conversion_factor = 0.001
-	elif from_unit == 'l':
-		if to_unit == 'ml':
-			conversion_factor = 1000
-
-	return conversion_factor
\ No newline at end of file
+	return float(get_unit_conversion_ratio(from_unit, to_unit, density=density))
+
+def convert_quantities(quantities, from_units, to_units, densities=None):
+	"""
+	Converts an array of quantities from one unit to another, in a single call.
+	The units may be given as names or as unit IDs. Densities are only needed for
+	conversions between mass and volume, and may be NaN elsewhere.
+	"""
+	quantities = np.asarray(quantities, dtype=np.float64)
+	from_ids = get_unit_ids(from_units)
+	to_ids = get_unit_ids(to_units)
+
+	factors = CONVERSION_FACTORS[from_ids, to_ids]
+	density_exponents = DENSITY_EXPONENTS[from_ids, to_ids]
+
+	if np.isnan(factors).any():
+		raise UnitConversionError('Cannot convert between units of these dimensions.')
+
+	if density_exponents.any():
+		if densities is None:
+			raise UnitConversionError('Cannot convert between mass and volume without the density of the food.')
+
+		densities = np.asarray(densities, dtype=np.float64)
+		needs_density = density_exponents != 0
+
+		if np.broadcast_to(np.isnan(densities) | (densities <= 0), needs_density.shape)[needs_density].any():
+			raise UnitConversionError('Cannot convert between mass and volume without the density of the food.')
+
+		# Any power of NaN is NaN, except the zeroth power, which is 1.
+		factors = factors * np.power(densities, density_exponents)
+
+	return quantities * factors
@@ -0,0 +1,263 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import models
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from meals.currency import convert
+from meals.helper import COUNT, MASS, UNITS, VOLUME, UnitConversionError, get_unit_conversion_ratio, get_unit_id
+from meals.models import FoodPurchase
+from meals.validators import MealValidators
+
+# The price history of a food item, as a time series of prices per unit for charts.
+#
+# Every purchase is normalised to the price of one canonical unit in the database, where the purchases are
+# grouped into weeks or months and the minimum, average and maximum prices of each period are calculated.
+# Only one row per period and currency is returned, however many purchases there are. The periods are then
+# converted to a single currency, and long series are downsampled to a bounded number of points with the
+# Largest-Triangle-Three-Buckets algorithm, which keeps the points that matter most to the shape of the chart.
+
+PERIODS = {
+	'week': TruncWeek,
+	'month': TruncMonth,
+}
+
+# The unit that prices are given per, by default, for food items bought in each dimension.
+CANONICAL_UNITS = {
+	MASS: 'kg',
+	VOLUME: 'l',
+	COUNT: 'pc',
+}
+
+PRICE_PLACES = Decimal('0.01')
+
+# Error to be raised when the query parameters of a price history are invalid.
+class HistoryParameterError(ValueError):
+	pass
+
+# Return the indexes of the points to keep when downsampling the series (x, y) to num_points points,
+# using the Largest-Triangle-Three-Buckets algorithm. The first and last points are always kept.
+def downsample_lttb(x, y, num_points):
+	x = np.asarray(x, dtype=np.float64)
+	y = np.asarray(y, dtype=np.float64)
+	length = len(x)
+
+	if num_points >= length:
+		return np.arange(length)
+
+	if num_points < 3:
+		return np.array([0, length - 1][:num_points], dtype=np.intp)
+
+	# The points between the first and the last are split into num_points - 2 buckets, and one point is kept from each.
+	edges = np.linspace(1, length - 1, num_points - 1).astype(np.intp)
+	indexes = np.empty(num_points, dtype=np.intp)
+	indexes[0] = 0
+	indexes[-1] = length - 1
+
+	previous = 0
+
+	for bucket in range(num_points - 2):
+		start, end = edges[bucket], edges[bucket + 1]
+
+		# The third point of each triangle is the average of the next bucket, or the last point.
+		if bucket + 2 < len(edges):
+			next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+			next_x, next_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+		else:
+			next_x, next_y = x[-1], y[-1]
+
+		# Twice the area of the triangle between the previous point kept, each point in the bucket, and the next bucket.
+		areas = np.abs(
+			(x[previous] - next_x) * (y[start:end] - y[previous]) -
+			(x[previous] - x[start:end]) * (next_y - y[previous])
+		)
+
+		previous = start + int(np.argmax(areas))
+		indexes[bucket + 1] = previous
+
+	return indexes
+
+# Return the canonical unit of a food item, which is that of the dimension of its newest purchase.
+def get_canonical_unit(food_item):
+	newest_purchase = food_item.get_newest_purchase()
+
+	if newest_purchase is None:
+		return None
+
+	try:
+		return CANONICAL_UNITS[UNITS[newest_purchase.unit.lower()][0]]
+	except KeyError:
+		return None
+
+# Return an expression choosing the given value for each unit, for the units which can be converted.
+def _get_unit_case(values):
+	return models.Case(
+		*[models.When(unit=unit, then=models.Value(value)) for unit, value in values.items()],
+		output_field=models.DecimalField()
+	)
+
+# The value of a decimal expression, which SQLite is made to divide as a real number.
+# SQLite stores whole decimals as integers, and divides integers without a remainder.
+class _Dividend(models.Func):
+	template = '%(expressions)s'
+	output_field = models.DecimalField()
+
+	def as_sqlite(self, compiler, connection, **extra_context):
+		return self.as_sql(compiler, connection, template='CAST(%(expressions)s AS REAL)', **extra_context)
+
+# Return the query parameters of a price history: the period, the unit, the currency and the number of points.
+def parse_parameters(food_item, params):
+	period = params.get('period') or 'week'
+
+	if period not in PERIODS:
+		raise HistoryParameterError(f'period must be one of {", ".join(PERIODS)}. Got {period}.')
+
+	unit = params.get('unit') or get_canonical_unit(food_item)
+
+	if unit is not None:
+		try:
+			get_unit_id(unit)
+		except UnitConversionError:
+			raise HistoryParameterError(f'Unknown unit: {unit}.')
+
+		unit = unit.lower()
+
+	currency = (params.get('currency') or settings.DEFAULT_CURRENCY).upper()
+
+	if not MealValidators.is_valid_currency(currency):
+		raise HistoryParameterError(f'Unsupported currency: {currency}.')
+
+	try:
+		num_points = int(params.get('points') or settings.PRICE_HISTORY_POINTS)
+	except ValueError:
+		raise HistoryParameterError(f'points must be a whole number. Got {params["points"]}.')
+
+	if not 2 <= num_points <= settings.PRICE_HISTORY_POINTS:
+		raise HistoryParameterError(f'points must be between 2 and {settings.PRICE_HISTORY_POINTS}. Got {num_points}.')
+
+	return period, unit, currency, num_points
+
+# Return the minimum, average and maximum price per unit of the food item's purchases in each period and currency.
+# Purchases in units which cannot be converted to the unit are left out.
+def get_period_prices(food_item, period, unit):
+	ratios = {}
+
+	for purchase_unit in UNITS:
+		try:
+			ratios[purchase_unit] = get_unit_conversion_ratio(purchase_unit, unit, density=food_item.density)
+		except UnitConversionError:
+			continue
+
+	# The price of one unit is price * denominator / (quantity * numerator), which is exact in the database.
+	unit_price = models.ExpressionWrapper(
+		_Dividend(models.F('price_amount') * _get_unit_case({purchase_unit: ratio.denominator for purchase_unit, ratio in ratios.items()})) /
+		(models.F('quantity') * _get_unit_case({purchase_unit: ratio.numerator for purchase_unit, ratio in ratios.items()})),
+		output_field=models.DecimalField()
+	)
+
+	return FoodPurchase.objects.filter(
+		food_item=food_item,
+		unit__in=ratios,
+		quantity__gt=0
+	).annotate(
+		period=PERIODS[period]('date'),
+		unit_price=unit_price
+	).values('period', 'currency').annotate(
+		min_price=models.Min('unit_price'),
+		avg_price=models.Avg('unit_price'),
+		max_price=models.Max('unit_price'),
+		num_purchases=models.Count('id'),
+		last_date=models.Max('date'),
+	).order_by('period', 'currency')
+
+# Combine the prices of each period in different currencies into prices in the target currency.
+# The prices of each currency are converted at the rate on the date of the period's last purchase in that currency.
+# Returns the periods in order, and the number of purchases which could not be converted.
+def _combine_periods(period_prices, currency):
+	period_prices = list(period_prices)
+
+	amounts, currencies, dates = [], [], []
+
+	for row in period_prices:
+		for field_name in ['min_price', 'avg_price', 'max_price']:
+			amounts.append(row[field_name])
+			currencies.append(row['currency'])
+			dates.append(row['last_date'])
+
+	converted = iter(convert(amounts, currencies, dates, target=currency))
+
+	periods = defaultdict(lambda: {'min': None, 'total': Decimal(0), 'max': None, 'count': 0})
+	num_unconverted = 0
+
+	for row in period_prices:
+		min_price, avg_price, max_price = next(converted), next(converted), next(converted)
+
+		if avg_price is None:
+			num_unconverted += row['num_purchases']
+			continue
+
+		period = periods[row['period']]
+		period['min'] = min_price if period['min'] is None else min(period['min'], min_price)
+		period['max'] = max_price if period['max'] is None else max(period['max'], max_price)
+		period['total'] += Decimal(avg_price) * row['num_purchases']
+		period['count'] += row['num_purchases']
+
+	combined_periods = [
+		{
+			'date': period_date if isinstance(period_date, date) else period_date.date(),
+			'min': Decimal(period['min']).quantize(PRICE_PLACES),
+			'avg': (period['total'] / period['count']).quantize(PRICE_PLACES),
+			'max': Decimal(period['max']).quantize(PRICE_PLACES),
+			'count': period['count'],
+		}
+		for period_date, period in sorted(periods.items())
+	]
+
+	return combined_periods, num_unconverted
+
+# Return the price history of a food item, as a dict to be sent as JSON.
+def get_price_history(food_item, params):
+	period, unit, currency, num_points = parse_parameters(food_item, params)
+
+	history = {
+		'food_item': food_item.id,
+		'name': food_item.name,
+		'period': period,
+		'unit': unit,
+		'currency': currency,
+		'num_periods': 0,
+		'num_unconverted': 0,
+		'downsampled': False,
+		'points': [],
+	}
+
+	if unit is None:
+		return history
+
+	periods, history['num_unconverted'] = _combine_periods(get_period_prices(food_item, period, unit), currency)
+	history['num_periods'] = len(periods)
+
+	if len(periods) > num_points:
+		indexes = downsample_lttb(
+			[period['date'].toordinal() for period in periods],
+			[period['avg'] for period in periods],
+			num_points
+		)
+		periods = [periods[index] for index in indexes]
+		history['downsampled'] = True
+
+	history['points'] = [
+		{
+			'date': period['date'].isoformat(),
+			'min': str(period['min']),
+			'avg': str(period['avg']),
+			'max': str(period['max']),
+			'count': period['count'],
+		}
+		for period in periods
+	]
+
+	return history
@@ -0,0 +1,242 @@
+import csv
+import json
+import os
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.forms import ValidationError
+
+from meals.helper import UnitConversionError, get_unit_id
+from meals.models import FoodItem, FoodPurchase
+from meals.models.food_item import normalise_food_item_name
+from meals.validators import MealValidators
+
+# Bulk imports of purchases, e.g. from receipts or from an export (see meals/export.py).
+#
+# Rows are read in chunks. The food items named in each chunk are looked up together, and any which
+# do not exist yet are created together. The purchases of each chunk are then inserted with bulk_create(),
+# and the newest purchase of each food item is refreshed once, after the last chunk.
+# The whole import runs in a single transaction. Rows which are invalid are skipped, and reported.
+# The columns (or keys) of each row are food_item, price_amount, currency, quantity, unit, location and date.
+
+# Error to be raised when a file is not in one of the supported formats, or cannot be read in its format.
+class ImportFormatError(ValueError):
+	pass
+
+# Error to be raised when a row of an import is invalid.
+class ImportRowError(ValueError):
+	pass
+
+class ImportResult:
+
+	def __init__(self):
+		self.num_imported = 0
+		self.num_food_items_created = 0
+		self.errors = []
+
+	def add_error(self, line_number, message):
+		self.errors.append({'line': line_number, 'error': message})
+
+	def as_dict(self):
+		return {
+			'imported': self.num_imported,
+			'food_items_created': self.num_food_items_created,
+			'errors': self.errors,
+		}
+
+# Read the rows of a CSV file with a header row. Yields (line number, row) pairs.
+# Files which are not UTF-8, or are not valid CSV, raise an ImportFormatError, as the rest of the file cannot be read.
+def read_csv(file):
+	reader = csv.DictReader(file)
+
+	try:
+		for row in reader:
+			yield reader.line_num, row
+	except UnicodeDecodeError:
+		raise ImportFormatError(f'The file must be UTF-8 encoded text. Line {reader.line_num + 1} is not.')
+	except csv.Error as e:
+		raise ImportFormatError(f'The file is not valid CSV: {e} on line {reader.line_num}.')
+
+# Read a file with one JSON object per line. Yields (line number, row) pairs.
+# Lines which are not valid JSON objects are given as an ImportRowError instead of a row.
+# Files which are not UTF-8 raise an ImportFormatError.
+def read_ndjson(file):
+	lines = enumerate(file, start=1)
+	line_number = 0
+
+	while True:
+		try:
+			line_number, line = next(lines)
+		except StopIteration:
+			return
+		except UnicodeDecodeError:
+			raise ImportFormatError(f'The file must be UTF-8 encoded text. Line {line_number + 1} is not.')
+
+		if not line.strip():
+			continue
+
+		try:
+			row = json.loads(line)
+		except json.JSONDecodeError as e:
+			yield line_number, ImportRowError(f'Invalid JSON: {e.msg}.')
+			continue
+
+		if not isinstance(row, dict):
+			row = ImportRowError('Each line must be a JSON object.')
+
+		yield line_number, row
+
+READERS = {
+	'csv': read_csv,
+	'ndjson': read_ndjson,
+	'jsonl': read_ndjson,
+}
+
+# Return the reader for a format, or for a file name with a format's extension.
+def get_reader(format_or_filename):
+	import_format = os.path.splitext(format_or_filename)[1].lstrip('.') or format_or_filename
+
+	try:
+		return READERS[import_format.lower()]
+	except KeyError:
+		raise ImportFormatError(f'Unsupported format: {import_format}. Use one of {", ".join(READERS)}.')
+
+def _get_required(row, field_name):
+	value = row.get(field_name)
+
+	if value is None or str(value).strip() == '':
+		raise ImportRowError(f'{field_name} is required.')
+
+	return str(value).strip()
+
+def _parse_decimal(row, field_name):
+	field = FoodPurchase._meta.get_field(field_name)
+	value = _get_required(row, field_name)
+
+	try:
+		number = Decimal(value)
+	except InvalidOperation:
+		raise ImportRowError(f'{field_name} must be a number. Got {value}.')
+
+	if not number.is_finite() or number < 0:
+		raise ImportRowError(f'{field_name} must be a positive number. Got {value}.')
+
+	if number != number.quantize(Decimal(1).scaleb(-field.decimal_places)):
+		raise ImportRowError(f'{field_name} must have no more than {field.decimal_places} decimal places. Got {value}.')
+
+	if number >= 10 ** (field.max_digits - field.decimal_places):
+		raise ImportRowError(f'{field_name} is too large. Got {value}.')
+
+	return number
+
+# Check a row and return the values of the purchase, raising ImportRowError if the row is invalid.
+def parse_row(row):
+	# The name is checked as it will be saved, as title casing can make it longer, e.g. 'ß' becomes 'Ss'.
+	try:
+		food_item_name = normalise_food_item_name(_get_required(row, 'food_item'))
+	except ValidationError as e:
+		raise ImportRowError(f'food_item is invalid: {e.messages[0]}')
+
+	price_amount = _parse_decimal(row, 'price_amount')
+	quantity = _parse_decimal(row, 'quantity')
+
+	if quantity == 0:
+		raise ImportRowError('quantity must be greater than 0.')
+
+	currency = _get_required(row, 'currency').upper()
+
+	if not MealValidators.is_valid_currency(currency):
+		raise ImportRowError(f'Unsupported currency: {currency}.')
+
+	unit = _get_required(row, 'unit').lower()
+
+	try:
+		get_unit_id(unit)
+	except UnitConversionError:
+		raise ImportRowError(f'Unknown unit: {unit}.')
+
+	location = _get_required(row, 'location')
+
+	if len(location) > FoodPurchase._meta.get_field('location').max_length:
+		raise ImportRowError('location is too long.')
+
+	try:
+		purchase_date = date.fromisoformat(_get_required(row, 'date'))
+	except ValueError:
+		raise ImportRowError(f'date must be in the format YYYY-MM-DD. Got {row["date"]}.')
+
+	return {
+		'food_item_name': food_item_name,
+		'price_amount': price_amount,
+		'currency': currency,
+		'quantity': quantity,
+		'unit': unit,
+		'location': location,
+		'date': purchase_date,
+	}
+
+# Return a dict mapping the lowercase version of each of the names to the id of the user's FoodItem with that name,
+# creating the FoodItems which do not exist yet. Also returns the number of FoodItems created.
+def resolve_food_items(user, names):
+	food_items = FoodItem.objects.resolve_names(user, names)
+
+	return (
+		{lower_name: food_item.id for lower_name, food_item in food_items.items()},
+		sum(food_item.created for food_item in food_items.values())
+	)
+
+def _get_chunks(rows, chunk_size):
+	rows = iter(rows)
+
+	while chunk := list(islice(rows, chunk_size)):
+		yield chunk
+
+# Import the (line number, row) pairs given by one of the readers as purchases of the user's food items.
+def import_purchases(user, rows, chunk_size=None):
+	if chunk_size is None:
+		chunk_size = settings.IMPORT_CHUNK_SIZE
+
+	result = ImportResult()
+	food_item_ids_imported = set()
+
+	with transaction.atomic():
+		for chunk in _get_chunks(rows, chunk_size):
+			purchases = []
+
+			for line_number, row in chunk:
+				try:
+					if isinstance(row, ImportRowError):
+						raise row
+
+					purchases.append((line_number, parse_row(row)))
+				except ImportRowError as e:
+					result.add_error(line_number, str(e))
+
+			if not purchases:
+				continue
+
+			food_item_names = {purchase['food_item_name'] for _, purchase in purchases}
+			food_item_ids, num_created = resolve_food_items(user, food_item_names)
+			result.num_food_items_created += num_created
+
+			new_purchases = []
+
+			for line_number, purchase in purchases:
+				food_item_id = food_item_ids.get(purchase.pop('food_item_name').lower())
+
+				if food_item_id is None:
+					result.add_error(line_number, 'The food item could not be created.')
+					continue
+
+				new_purchases.append(FoodPurchase(food_item_id=food_item_id, **purchase))
+
+			FoodPurchase.objects.bulk_create(new_purchases, refresh_latest_purchase=False)
+			result.num_imported += len(new_purchases)
+			food_item_ids_imported.update(purchase.food_item_id for purchase in new_purchases)
+
+		FoodItem.objects.filter(pk__in=food_item_ids_imported).refresh_latest_purchase()
+
+	return result
@@ -0,0 +1,43 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from meals.importer import ImportFormatError, get_reader, import_purchases
+
+# Import purchases from a CSV or NDJSON file, such as one produced by the purchase export.
+# The columns (or keys) are food_item, price_amount, currency, quantity, unit, location and date.
+# Food items which the user does not have yet are created.
+class Command(BaseCommand):
+	help = 'Import purchases for a user from a CSV or NDJSON file.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('path', help='The path of the file to import.')
+		parser.add_argument('--user', required=True, help='The username of the user the purchases belong to.')
+		parser.add_argument('--format', help='csv or ndjson. By default, this is taken from the file extension.')
+		parser.add_argument('--chunk-size', type=int, help='The number of rows to insert at a time.')
+
+	def handle(self, *args, **options):
+		try:
+			user = User.objects.get(username=options['user'])
+		except User.DoesNotExist:
+			raise CommandError(f'There is no user with the username {options["user"]}.')
+
+		try:
+			reader = get_reader(options['format'] or options['path'])
+		except ImportFormatError as e:
+			raise CommandError(str(e))
+
+		try:
+			with open(options['path'], newline='', encoding='utf-8-sig') as file:
+				result = import_purchases(user, reader(file), chunk_size=options['chunk_size'])
+		except OSError as e:
+			raise CommandError(f'Could not read {options["path"]}: {e}')
+		except ImportFormatError as e:
+			raise CommandError(str(e))
+
+		for error in result.errors:
+			self.stderr.write(f'Line {error["line"]}: {error["error"]}')
+
+		self.stdout.write(self.style.SUCCESS(
+			f'Imported {result.num_imported} purchases, creating {result.num_food_items_created} food items. '
+			f'{len(result.errors)} rows were skipped.'
+		))
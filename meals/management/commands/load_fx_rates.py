@@ -0,0 +1,80 @@
+import csv
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from meals.cache import invalidate_all
+from meals.currency import BASE_CURRENCY, clear_rate_cache
+from meals.models import FxRate, MealCostChange
+
+# Load exchange rates from a CSV file in the format of the European Central Bank's historical rates
+# (eurofxref-hist.csv). The first column is the date, and there is a column of rates against the euro
+# for each currency. Missing rates are written as N/A. Existing rates are updated.
+class Command(BaseCommand):
+	help = 'Load exchange rates from an ECB style CSV file.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('path', help='The path of the CSV file.')
+		parser.add_argument('--currencies', nargs='+', help='Only load the rates of these currencies.')
+		parser.add_argument('--batch-size', type=int, default=1000, help='The number of rates to insert per query.')
+
+	def handle(self, *args, **options):
+		try:
+			with open(options['path'], newline='') as csv_file:
+				fx_rates = list(self.read_rates(csv_file, options['currencies']))
+		except OSError as e:
+			raise CommandError(f'Could not read {options["path"]}: {e}')
+
+		with transaction.atomic():
+			FxRate.objects.bulk_create(
+				fx_rates,
+				batch_size=options['batch_size'],
+				update_conflicts=True,
+				unique_fields=['currency', 'date'],
+				update_fields=['rate']
+			)
+
+			if fx_rates:
+				MealCostChange.objects.record_all(date=min(fx_rate.date for fx_rate in fx_rates))
+
+		# bulk_create() does not send signals, so the cached rates and prices must be cleared here.
+		clear_rate_cache()
+		invalidate_all()
+
+		self.stdout.write(self.style.SUCCESS(f'Loaded {len(fx_rates)} exchange rates.'))
+
+	def read_rates(self, csv_file, currencies=None):
+		reader = csv.reader(csv_file)
+		header = next(reader, None)
+
+		if not header or header[0].strip().lower() != 'date':
+			raise CommandError('The first column of the CSV file must be the date.')
+
+		columns = [currency.strip().upper() for currency in header[1:]]
+
+		for line_number, row in enumerate(reader, start=2):
+			if not row:
+				continue
+
+			try:
+				date = datetime.strptime(row[0].strip(), '%Y-%m-%d').date()
+			except ValueError:
+				raise CommandError(f'Invalid date on line {line_number}: {row[0]}')
+
+			for currency, value in zip(columns, row[1:]):
+				value = value.strip()
+
+				if not currency or currency == BASE_CURRENCY or value in ['', 'N/A']:
+					continue
+
+				if currencies and currency not in currencies:
+					continue
+
+				try:
+					rate = Decimal(value)
+				except InvalidOperation:
+					raise CommandError(f'Invalid {currency} rate on line {line_number}: {value}')
+
+				yield FxRate(currency=currency, date=date, rate=rate)
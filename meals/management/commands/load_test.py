@@ -0,0 +1,128 @@
+import http.client
+import re
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Send requests to a running server from a number of threads at once, and report the throughput and latency.
+# Each thread keeps its connection open between requests, as a browser or reverse proxy would.
+#
+# To compare servers, run the same test against `manage.py runserver` and `gunicorn -c gunicorn.conf.py`, e.g.
+#   python manage.py load_test http://localhost:8000 --user alice --password secret --path /food_items/ --concurrency 16
+class Command(BaseCommand):
+	help = 'Measure the throughput and latency of a running server.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('url', help='The URL of the server, e.g. http://localhost:8000.')
+		parser.add_argument('--path', action='append', dest='paths', help='A path to request. Can be given more than once; the paths are requested in turn.')
+		parser.add_argument('--concurrency', type=int, default=8, help='The number of requests sent at once.')
+		parser.add_argument('--requests', type=int, default=1000, help='The total number of requests to send.')
+		parser.add_argument('--user', help='The username to log in with.')
+		parser.add_argument('--password', help='The password to log in with.')
+
+	def handle(self, *args, **options):
+		url = urlsplit(options['url'])
+
+		if url.scheme not in ['http', 'https'] or not url.netloc:
+			raise CommandError(f'{options["url"]} is not an HTTP URL.')
+
+		connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+		paths = options['paths'] or ['/']
+		headers = {}
+
+		if options['user']:
+			try:
+				headers['Cookie'] = log_in(connection_class(url.netloc), options['url'].rstrip('/'), options['user'], options['password'] or '')
+			except OSError as e:
+				raise CommandError(f'Could not connect to {options["url"]}: {e}')
+
+		latencies = []
+		statuses = {}
+		lock = threading.Lock()
+		remaining = iter(range(options['requests']))
+
+		def send_requests():
+			connection = connection_class(url.netloc)
+
+			for number in remaining:
+				path = paths[number % len(paths)]
+				start = time.perf_counter()
+
+				try:
+					status, _, _ = send_request(connection, 'GET', path, headers)
+				except (OSError, http.client.HTTPException):
+					connection.close()
+					status = 'error'
+
+				with lock:
+					latencies.append(time.perf_counter() - start)
+					statuses[status] = statuses.get(status, 0) + 1
+
+			connection.close()
+
+		threads = [threading.Thread(target=send_requests) for _ in range(options['concurrency'])]
+		start = time.perf_counter()
+
+		for thread in threads:
+			thread.start()
+
+		for thread in threads:
+			thread.join()
+
+		duration = time.perf_counter() - start
+		latencies.sort()
+		latency = {
+			name: round(latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))] * 1000, 1)
+			for name, percentile in [('p50', 50), ('p95', 95), ('p99', 99), ('max', 100)]
+		} if latencies else {}
+
+		self.stdout.write(f'{len(latencies)} requests in {duration:.2f}s from {options["concurrency"]} threads')
+		self.stdout.write(f'Throughput: {len(latencies) / duration:.1f} requests/s')
+		self.stdout.write('Latency (ms): ' + ', '.join(f'{name} {value}' for name, value in latency.items()))
+		self.stdout.write('Responses: ' + ', '.join(f'{status}: {count}' for status, count in sorted(statuses.items(), key=str)))
+
+# Send a request on a connection which is kept open, and return the status, the response headers and the body.
+def send_request(connection, method, path, headers, body=None):
+	connection.request(method, path, body=body, headers=headers)
+	response = connection.getresponse()
+
+	return response.status, response.headers, response.read()
+
+# Log in through the login form, and return the Cookie header to send with each request.
+def log_in(connection, origin, username, password):
+	cookies = SimpleCookie()
+
+	status, response_headers, body = send_request(connection, 'GET', '/accounts/login/', {})
+
+	for header in response_headers.get_all('Set-Cookie') or []:
+		cookies.load(header)
+
+	match = re.search(rb'name="csrfmiddlewaretoken" value="([^"]+)"', body)
+
+	if status != 200 or match is None:
+		raise CommandError(f'The login page returned {status}.')
+
+	status, response_headers, _ = send_request(
+		connection,
+		'POST',
+		'/accounts/login/',
+		{
+			'Content-Type': 'application/x-www-form-urlencoded',
+			'Cookie': '; '.join(f'{key}={morsel.value}' for key, morsel in cookies.items()),
+			'Referer': f'{origin}/accounts/login/',
+		},
+		urlencode({'username': username, 'password': password, 'csrfmiddlewaretoken': match.group(1).decode()}),
+	)
+
+	for header in response_headers.get_all('Set-Cookie') or []:
+		cookies.load(header)
+
+	if status != 302 or 'sessionid' not in cookies:
+		raise CommandError(f'Could not log in as {username}.')
+
+	connection.close()
+
+	return '; '.join(f'{key}={morsel.value}' for key, morsel in cookies.items())
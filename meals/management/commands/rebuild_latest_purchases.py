@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from meals.models import FoodItem
+
+# Recalculate the latest purchase of every FoodItem from its purchase history.
+# This should only be necessary if purchases have been changed without sending signals, e.g. by raw SQL.
+class Command(BaseCommand):
+	help = 'Recalculate the latest purchase of each food item from its purchase history.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--user', help='Only rebuild the food items belonging to the user with this username.')
+
+	def handle(self, *args, **options):
+		food_items = FoodItem.objects.all()
+
+		if options['user']:
+			food_items = food_items.filter(user__username=options['user'])
+
+		num_updated = food_items.refresh_latest_purchase()
+
+		self.stdout.write(self.style.SUCCESS(f'Rebuilt the latest purchase of {num_updated} food items.'))
@@ -0,0 +1,40 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from meals.rollup import rollup_meal_costs
+from meals.validators import MealValidators
+
+# Bring the daily meal cost snapshots up to date. This is meant to be run regularly, e.g. daily by cron.
+# Only the meals and days affected by changes since the last run are recalculated.
+class Command(BaseCommand):
+	help = 'Update the daily meal cost snapshots with the changes since the last rollup.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--date', help='The last date to calculate snapshots for, in the format YYYY-MM-DD. Defaults to today.')
+		parser.add_argument('--currency', help='The currency of the snapshots. Changing it recalculates every snapshot.')
+		parser.add_argument('--days', type=int, help='The number of days of snapshots to keep up to date.')
+		parser.add_argument('--batch-size', type=int, help='The number of meals to calculate at a time.')
+
+	def handle(self, *args, **options):
+		last_date = None
+
+		if options['date']:
+			try:
+				last_date = date.fromisoformat(options['date'])
+			except ValueError:
+				raise CommandError(f'--date must be in the format YYYY-MM-DD. Got {options["date"]}.')
+
+		currency = options['currency'].upper() if options['currency'] else None
+
+		if currency and not MealValidators.is_valid_currency(currency):
+			raise CommandError(f'Unsupported currency: {currency}.')
+
+		if options['days'] is not None and options['days'] < 1:
+			raise CommandError('--days must be at least 1.')
+
+		result = rollup_meal_costs(last_date=last_date, currency=currency, days=options['days'], batch_size=options['batch_size'])
+
+		self.stdout.write(self.style.SUCCESS(
+			f'Processed {result.num_changes} changes and saved {result.num_snapshots} snapshots of {result.num_meals} meals.'
+		))
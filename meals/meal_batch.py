@@ -0,0 +1,143 @@
+from django.conf import settings
+from django.db import transaction
+
+from meals.forms import MealForm, StandardIngredientForm, preload_food_items
+from meals.models import Meal
+
+# Creating and copying meals in batches, for the meal batch and clone APIs.
+#
+# The food items of every ingredient in a batch are loaded together (see forms.preload_food_items()), so the
+# meals and ingredients are validated without a query per ingredient. The meals are then inserted with one INSERT,
+# and all of their ingredients with another (see MealQuerySet.bulk_create_with_ingredients()). A batch is created
+# in a single transaction, and if any meal in it is invalid, none are created, including any new food items.
+
+# Error to be raised when a batch is invalid. errors maps the index of each invalid meal to its errors.
+class MealBatchError(ValueError):
+
+	def __init__(self, message, errors=None):
+		super().__init__(message)
+		self.errors = errors or {}
+
+	def as_dict(self):
+		return {'error': str(self), 'errors': self.errors}
+
+def _get_form_errors(form):
+	return {field: [error['message'] for error in errors] for field, errors in form.errors.get_json_data().items()}
+
+def _check_batch(meals):
+	if not isinstance(meals, list) or not meals:
+		raise MealBatchError('meals must be a list of at least one meal.')
+
+	if len(meals) > settings.MEAL_BATCH_SIZE:
+		raise MealBatchError(f'At most {settings.MEAL_BATCH_SIZE} meals can be created at once. Got {len(meals)}.')
+
+	if not all(isinstance(meal, dict) for meal in meals):
+		raise MealBatchError('Each meal must be an object.')
+
+def _get_ingredients(meal):
+	ingredients = meal.get('ingredients', [])
+
+	if not isinstance(ingredients, list) or not all(isinstance(ingredient, dict) for ingredient in ingredients):
+		return None
+
+	return ingredients
+
+def _get_ingredient_data(ingredient):
+	data = {field: ingredient.get(field) for field in ['food_item', 'quantity', 'unit']}
+	data = {field: '' if value is None else str(value) for field, value in data.items()}
+	data['form_type'] = 'standard_ingredient'
+
+	return data
+
+# Create the user's meals, which are dicts with a name and a list of ingredients, which each have a food_item
+# (the id or name of one of the user's food items, which is created if it does not exist), a quantity and a unit.
+# Returns the meals.
+def create_meals(user, meals):
+	_check_batch(meals)
+
+	with transaction.atomic():
+		food_items = preload_food_items(user, [
+			_get_ingredient_data(ingredient)['food_item']
+			for meal in meals
+			for ingredient in _get_ingredients(meal) or []
+		])
+
+		new_meals = []
+		errors = {}
+
+		for index, data in enumerate(meals):
+			meal_form = MealForm({'name': data.get('name')})
+			ingredients = _get_ingredients(data)
+
+			if not meal_form.is_valid():
+				errors[index] = _get_form_errors(meal_form)
+				continue
+
+			if ingredients is None:
+				errors[index] = {'ingredients': ['ingredients must be a list of objects.']}
+				continue
+
+			meal = meal_form.save(user=user, commit=False)
+			ingredient_forms = [
+				StandardIngredientForm(_get_ingredient_data(ingredient), user=user, meal=meal, food_items=food_items)
+				for ingredient in ingredients
+			]
+
+			ingredient_errors = {
+				ingredient_index: _get_form_errors(form)
+				for ingredient_index, form in enumerate(ingredient_forms)
+				if not form.is_valid()
+			}
+
+			if ingredient_errors:
+				errors[index] = {'ingredients': ingredient_errors}
+				continue
+
+			new_meals.append((meal, [form.instance for form in ingredient_forms]))
+
+		# Raising the error rolls back any food items created for the batch.
+		if errors:
+			raise MealBatchError('Some of the meals are invalid.', errors)
+
+		return Meal.objects.bulk_create_with_ingredients(new_meals)
+
+# Copy the user's meals, which are dicts with the id of the meal to copy and optionally the name of the copy.
+# The same meal can be copied more than once. Returns the copies, in the order of the batch.
+def clone_meals(user, meals):
+	_check_batch(meals)
+
+	copies = {}
+	errors = {}
+
+	for index, data in enumerate(meals):
+		# JSON true and false are loaded as bools, which are ints in Python.
+		if not isinstance(data.get('id'), int) or isinstance(data['id'], bool):
+			errors[index] = {'id': ['id must be the id of a meal.']}
+			continue
+
+		copies[index] = (data['id'], None)
+
+		if data.get('name') is not None:
+			meal_form = MealForm({'name': data['name']})
+
+			if not meal_form.is_valid():
+				errors[index] = _get_form_errors(meal_form)
+				continue
+
+			copies[index] = (data['id'], meal_form.cleaned_data['name'])
+
+	meal_ids = {meal_id for index, (meal_id, name) in copies.items() if index not in errors}
+	existing_ids = set(Meal.objects.filter(user=user, pk__in=meal_ids).values_list('pk', flat=True))
+
+	for index, (meal_id, name) in copies.items():
+		if index not in errors and meal_id not in existing_ids:
+			errors[index] = {'id': [f'Meal {meal_id} does not exist.']}
+
+	if errors:
+		raise MealBatchError('Some of the meals are invalid.', errors)
+
+	return Meal.objects.filter(user=user, pk__in=existing_ids).clone(list(copies.values()))
+
+# The meals created by a batch, as returned by the API.
+def serialise_meals(meals):
+	return [{'id': meal.pk, 'name': meal.name, 'num_ingredients': meal.num_ingredients} for meal in meals]
@@ -0,0 +1,152 @@
+import os
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+
+# Metrics for Prometheus, served at /metrics.
+#
+# Each process keeps its own metrics. When PROMETHEUS_MULTIPROC_DIR is set in the environment before the server starts,
+# prometheus_client keeps each process's values in a memory mapped file in that directory instead, and /metrics adds
+# up the files of every process, so that any gunicorn worker can serve the metrics of them all.
+# The directory must be emptied before the server starts, so that the files of old processes are not counted.
+
+REQUEST_LATENCY = Histogram(
+	'mealpricetracker_request_duration_seconds',
+	'Time taken to respond to requests, by view.',
+	['view'],
+	buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+REQUESTS = Counter(
+	'mealpricetracker_requests_total',
+	'Requests, by view, method and status code.',
+	['view', 'method', 'status']
+)
+
+REQUEST_QUERIES = Histogram(
+	'mealpricetracker_request_queries',
+	'Database queries run per request, by view.',
+	['view'],
+	buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+
+PRICING_DURATION = Histogram(
+	'mealpricetracker_pricing_duration_seconds',
+	'Time taken to calculate prices, by operation.',
+	['operation'],
+	buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+PRICE_CACHE_REQUESTS = Counter(
+	'mealpricetracker_price_cache_requests_total',
+	'Lookups of cached prices, by result (hit or miss).',
+	['result']
+)
+
+# Time each call of a function as a pricing operation.
+def time_pricing(operation):
+	histogram = PRICING_DURATION.labels(operation)
+
+	def decorator(function):
+		@wraps(function)
+		def wrapper(*args, **kwargs):
+			start = time.perf_counter()
+
+			try:
+				return function(*args, **kwargs)
+			finally:
+				histogram.observe(time.perf_counter() - start)
+
+		return wrapper
+
+	return decorator
+
+def record_cache_lookups(hits, misses):
+	if hits:
+		PRICE_CACHE_REQUESTS.labels('hit').inc(hits)
+
+	if misses:
+		PRICE_CACHE_REQUESTS.labels('miss').inc(misses)
+
+# Return the metrics of every process in the text exposition format, and its content type.
+def export():
+	if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+		registry = CollectorRegistry()
+		MultiProcessCollector(registry)
+	else:
+		registry = REGISTRY
+
+	return generate_latest(registry), CONTENT_TYPE_LATEST
+
+# Count the queries run by each request.
+class QueryCounter:
+
+	def __init__(self):
+		self.count = 0
+
+	def __call__(self, execute, sql, params, many, context):
+		self.count += 1
+		return execute(sql, params, many, context)
+
+# Record the latency and number of queries of each request, by the name of its view.
+# Requests which do not match a URL are recorded together, so that the number of labels is bounded.
+# Under ASGI the middleware is async, so that async views are not run in a thread for it.
+class MetricsMiddleware:
+	sync_capable = True
+	async_capable = True
+
+	def __init__(self, get_response):
+		if not settings.METRICS_ENABLED:
+			raise MiddlewareNotUsed()
+
+		self.get_response = get_response
+
+		if iscoroutinefunction(get_response):
+			markcoroutinefunction(self)
+
+	def __call__(self, request):
+		if iscoroutinefunction(self):
+			return self.__acall__(request)
+
+		start = time.perf_counter()
+		query_counter = QueryCounter()
+
+		with ExitStack() as stack:
+			for connection in connections.all():
+				stack.enter_context(connection.execute_wrapper(query_counter))
+
+			response = self.get_response(request)
+
+		self.record(request, response, start, query_counter)
+
+		return response
+
+	# The queries of async views are run by sync_to_async() in a thread of the request's own, with its own connections.
+	async def __acall__(self, request):
+		start = time.perf_counter()
+		query_counter = QueryCounter()
+
+		with ExitStack() as stack:
+			for connection in await sync_to_async(connections.all)():
+				stack.enter_context(connection.execute_wrapper(query_counter))
+
+			response = await self.get_response(request)
+
+		self.record(request, response, start, query_counter)
+
+		return response
+
+	def record(self, request, response, start, query_counter):
+		match = request.resolver_match
+		view = match.view_name if match else '<unresolved>'
+
+		REQUEST_LATENCY.labels(view).observe(time.perf_counter() - start)
+		REQUEST_QUERIES.labels(view).observe(query_counter.count)
+		REQUESTS.labels(view, request.method, str(response.status_code)).inc()
@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-18 15:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_latest_purchases(apps, schema_editor):
+    FoodItem = apps.get_model('meals', 'FoodItem')
+    FoodPurchase = apps.get_model('meals', 'FoodPurchase')
+
+    newest_purchase = FoodPurchase.objects.filter(
+        food_item=models.OuterRef('pk')
+    ).order_by('-date', '-id').values('pk')[:1]
+
+    FoodItem.objects.update(latest_purchase=models.Subquery(newest_purchase))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fooditem',
+            name='latest_purchase',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='meals.foodpurchase'),
+        ),
+        migrations.AlterField(
+            model_name='standardingredient',
+            name='unit',
+            field=models.CharField(choices=[('g', 'Grams'), ('kg', 'Kilograms'), ('ml', 'Millilitres'), ('l', 'Litres'), ('tsp', 'Teaspoons'), ('tbsp', 'Tablespoons'), ('pc', 'Pieces')], max_length=20, verbose_name='Unit'),
+        ),
+        migrations.RunPython(populate_latest_purchases, migrations.RunPython.noop),
+    ]
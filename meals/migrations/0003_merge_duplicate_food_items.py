@@ -0,0 +1,44 @@
+# Generated by Django 4.2 on 2026-10-18 15:24
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+# Food items with the same name (ignoring case) for the same user must be merged before the
+# unique constraint in the next migration can be added. The purchases and ingredients of each
+# duplicate are moved to the oldest food item with that name.
+def merge_duplicate_food_items(apps, schema_editor):
+    FoodItem = apps.get_model('meals', 'FoodItem')
+    FoodPurchase = apps.get_model('meals', 'FoodPurchase')
+    StandardIngredient = apps.get_model('meals', 'StandardIngredient')
+
+    duplicates = FoodItem.objects.annotate(
+        lower_name=django.db.models.functions.text.Lower('name')
+    ).values('user', 'lower_name').annotate(
+        num_items=models.Count('id'), keep_id=models.Min('id')
+    ).filter(num_items__gt=1)
+
+    for duplicate in duplicates:
+        duplicate_items = FoodItem.objects.filter(
+            user=duplicate['user'], name__iexact=duplicate['lower_name']
+        ).exclude(pk=duplicate['keep_id'])
+
+        FoodPurchase.objects.filter(food_item__in=duplicate_items).update(food_item=duplicate['keep_id'])
+        StandardIngredient.objects.filter(food_item__in=duplicate_items).update(food_item=duplicate['keep_id'])
+        duplicate_items.delete()
+
+        newest_purchase = FoodPurchase.objects.filter(
+            food_item=models.OuterRef('pk')
+        ).order_by('-date', '-id').values('pk')[:1]
+        FoodItem.objects.filter(pk=duplicate['keep_id']).update(latest_purchase=models.Subquery(newest_purchase))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0002_food_item_latest_purchase'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_food_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2 on 2026-10-18 15:24
+
+from django.db import DatabaseError, migrations, models, transaction
+import django.db.models.functions.text
+
+
+# These indexes serve the case-insensitive name searches of the food item select2 widget.
+# They use PostgreSQL operator classes, and the trigram index requires the pg_trgm extension,
+# so they are only created where those are available.
+def create_name_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    # name__iexact and name__istartswith
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS meals_fooditem_user_upper_pattern_idx '
+        'ON meals_fooditem (user_id, UPPER(name::text) text_pattern_ops)'
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+
+    # name__icontains
+    try:
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            schema_editor.execute(
+                'CREATE INDEX IF NOT EXISTS meals_fooditem_name_trgm_idx '
+                'ON meals_fooditem USING gin (UPPER(name::text) gin_trgm_ops)'
+            )
+    except DatabaseError:
+        # The database user is not allowed to install the extension.
+        pass
+
+
+def drop_name_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute('DROP INDEX IF EXISTS meals_fooditem_name_trgm_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS meals_fooditem_user_upper_pattern_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0003_merge_duplicate_food_items'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fooditem',
+            index=models.Index(fields=['user', 'name'], name='meals_fooditem_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='foodpurchase',
+            index=models.Index(fields=['food_item', '-date', '-id'], name='meals_purchase_item_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='meal',
+            index=models.Index(fields=['user', 'name'], name='meals_meal_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mealinstance',
+            index=models.Index(fields=['meal', '-date'], name='meals_instance_meal_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='fooditem',
+            constraint=models.UniqueConstraint(models.F('user'), django.db.models.functions.text.Lower('name'), name='meals_fooditem_user_lower_name_unique'),
+        ),
+        migrations.RunPython(create_name_search_indexes, drop_name_search_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 15:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0004_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fooditem',
+            name='density',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=8, null=True, verbose_name='Density (g/ml)'),
+        ),
+    ]
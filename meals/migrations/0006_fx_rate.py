@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0005_food_item_density'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FxRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3, verbose_name='Currency')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('rate', models.DecimalField(decimal_places=6, max_digits=16, verbose_name='Rate')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='fxrate',
+            constraint=models.UniqueConstraint(fields=('currency', 'date'), name='meals_fxrate_currency_date_unique'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2 on 2026-10-18 16:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0006_fx_rate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MealCostChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('meal_id', models.BigIntegerField(null=True)),
+                ('food_item_id', models.BigIntegerField(null=True)),
+                ('date', models.DateField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MealCostRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3, verbose_name='Currency')),
+                ('last_date', models.DateField(verbose_name='Last Date')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MealCostSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('currency', models.CharField(max_length=3, verbose_name='Currency')),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Total')),
+                ('ingredient_prices', models.JSONField(default=dict, verbose_name='Ingredient Prices')),
+                ('meal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='meals.meal')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='mealcostsnapshot',
+            constraint=models.UniqueConstraint(fields=('meal', 'date'), name='meals_mealcostsnapshot_meal_date_unique'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2 on 2026-10-18 17:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_users(apps, schema_editor):
+    FoodPurchase = apps.get_model('meals', 'FoodPurchase')
+    MealInstance = apps.get_model('meals', 'MealInstance')
+    FoodItem = apps.get_model('meals', 'FoodItem')
+    Meal = apps.get_model('meals', 'Meal')
+
+    FoodPurchase.objects.update(user=models.Subquery(
+        FoodItem.objects.filter(pk=models.OuterRef('food_item')).values('user')
+    ))
+    MealInstance.objects.update(user=models.Subquery(
+        Meal.objects.filter(pk=models.OuterRef('meal')).values('user')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('meals', '0007_meal_cost_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodpurchase',
+            name='user',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='mealinstance',
+            name='user',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(populate_users, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='foodpurchase',
+            name='user',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='mealinstance',
+            name='user',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='foodpurchase',
+            index=models.Index(fields=['user', '-date', '-id'], name='meals_purchase_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mealinstance',
+            index=models.Index(fields=['user', '-date', '-id'], name='meals_instance_user_date_idx'),
+        ),
+    ]
@@ -2,4 +2,6 @@ from .meal import Meal
 from .food_item import FoodItem
 from .food_purchase import FoodPurchase
 from .meal_instance import MealInstance
-from .standard_ingredient import StandardIngredient
\ No newline at end of file
+from .standard_ingredient import StandardIngredient
+from .fx_rate import FxRate
+from .meal_cost_snapshot import MealCostChange, MealCostRollup, MealCostSnapshot
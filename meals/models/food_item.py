@@ -1,13 +1,144 @@
-from decimal import Decimal
 from pprint import pprint
-from django.db import models
+from django.db import connections, models
+from django.db.models.functions import Coalesce, Lower
 from django.contrib.auth.models import User
 from django.forms import ValidationError
 
-from meals.helper import get_unit_conversion_factor
+from meals.cache import invalidate_food_items
+from meals.metrics import time_pricing
+from meals.pricing import calculate_price
 
 from .meal import Meal
 from .food_purchase import FoodPurchase
+from .standard_ingredient import StandardIngredient
+
+# Return the name a FoodItem is saved with, or raise a ValidationError if it is not a valid name.
+def normalise_food_item_name(name):
+	name = name.strip().title()
+
+	if not name:
+		raise ValidationError('Food Item must have a name.')
+
+	max_length = FoodItem._meta.get_field('name').max_length
+
+	if len(name) > max_length:
+		raise ValidationError(f'The name of a Food Item must be at most {max_length} characters. Got {name}.')
+
+	return name
+
+class FoodItemQuerySet(models.QuerySet):
+
+	# Return a dict mapping the lowercase version of each of the names to the user's FoodItem with that name,
+	# creating the FoodItems which do not exist yet. Each FoodItem has a created attribute, which is True if it
+	# was created by this call.
+	#
+	# On PostgreSQL this is a single query, which inserts the names with ON CONFLICT DO NOTHING, so that
+	# the unique name constraint rather than a preceding SELECT decides which names are new, and selects
+	# the FoodItems which already existed in the same statement.
+	def resolve_names(self, user, names):
+		names = {name.lower(): name for name in map(normalise_food_item_name, names)}
+
+		if not names:
+			return {}
+
+		if connections[self.db].vendor == 'postgresql':
+			food_items = self._upsert_names(user, names)
+		else:
+			food_items = self._get_or_create_names(user, names)
+
+		if any(food_item.created for food_item in food_items.values()):
+			# Imported here, as the autocomplete module imports the models.
+			from meals import autocomplete
+			autocomplete.invalidate_users([user.pk])
+
+		return food_items
+
+	def _upsert_names(self, user, names):
+		table = self.model._meta.db_table
+		columns = [field.column for field in self.model._meta.concrete_fields]
+		column_list = ', '.join(f'{table}.{column}' for column in columns)
+		lower_names = {name: lower_name for lower_name, name in names.items()}
+		food_items = {}
+
+		# The SELECT sees the table as it was before the statement, so it finds the FoodItems which already existed,
+		# and the INSERT returns the ones it created. A FoodItem created by another transaction which had not been
+		# committed when the statement started is neither, and is found by running the statement again.
+		# Each row is returned with the name it was found by, as PostgreSQL's lower() does not always agree with
+		# Python's str.lower(), so the name of an existing FoodItem may not be the name it was found by.
+		while lower_names:
+			with connections[self.db].cursor() as cursor:
+				cursor.execute(
+					f'''
+					WITH names (name) AS (SELECT unnest(%s::varchar[])),
+					inserted AS (
+						INSERT INTO {table} (name, user_id)
+						SELECT name, %s FROM names
+						ON CONFLICT DO NOTHING
+						RETURNING {', '.join(columns)}
+					)
+					SELECT inserted.*, TRUE AS created, inserted.name FROM inserted
+					UNION ALL
+					SELECT {column_list}, FALSE AS created, names.name FROM {table}
+					JOIN names ON lower({table}.name) = lower(names.name)
+					WHERE {table}.user_id = %s
+					''',
+					[list(lower_names), user.pk, user.pk]
+				)
+				rows = cursor.fetchall()
+
+			for *values, created, name in rows:
+				food_item = self.model.from_db(self.db, [field.attname for field in self.model._meta.concrete_fields], values)
+				food_item.user = user
+				food_item.created = created
+				food_items[lower_names.pop(name)] = food_item
+
+		return food_items
+
+	# The same as _upsert_names(), in three queries, for databases which cannot insert in a WITH clause.
+	def _get_or_create_names(self, user, names):
+		existing = self.annotate(lower_name=Lower('name')).filter(user=user, lower_name__in=names)
+		food_items = {food_item.lower_name: food_item for food_item in existing}
+		missing_names = {lower_name: name for lower_name, name in names.items() if lower_name not in food_items}
+
+		if missing_names:
+			self.bulk_create([FoodItem(name=name, user=user) for name in missing_names.values()], ignore_conflicts=True)
+
+			for food_item in existing.filter(lower_name__in=missing_names):
+				food_item.created = True
+				food_items[food_item.lower_name] = food_item
+
+		for food_item in food_items.values():
+			food_item.user = user
+			food_item.created = getattr(food_item, 'created', False)
+
+		return food_items
+
+	# Recalculate the newest purchase of each FoodItem in the queryset, in a single UPDATE.
+	# The cached prices of the FoodItems, and of the meals which use them, are invalidated too.
+	def refresh_latest_purchase(self):
+		food_items = list(self.values_list('pk', 'user_id'))
+
+		newest_purchase = FoodPurchase.objects.filter(
+			food_item=models.OuterRef('pk')
+		).order_by('-date', '-id').values('pk')[:1]
+
+		num_updated = self.update(latest_purchase=models.Subquery(newest_purchase))
+		invalidate_food_items(food_items)
+
+		return num_updated
+
+	# Annotate the user's food items with the figures shown in the food item list, so that the
+	# list does not need to query the meals, purchases and newest price of each food item.
+	def with_stats(self, user):
+		meals = StandardIngredient.objects.filter(food_item=models.OuterRef('pk')).values('food_item')
+		purchases = FoodPurchase.objects.filter(food_item=models.OuterRef('pk')).values('food_item')
+
+		return self.filter(user=user).select_related('latest_purchase').annotate(
+			num_meals=Coalesce(models.Subquery(meals.annotate(count=models.Count('meal', distinct=True)).values('count')), 0),
+			num_purchases=Coalesce(models.Subquery(purchases.annotate(count=models.Count('pk')).values('count')), 0),
+			latest_price=models.F('latest_purchase__price_amount'),
+			latest_currency=models.F('latest_purchase__currency'),
+		)
 
 # This describes a FoodItem that can be used in a meal.
 # A FoodItem becomes an ingredient when it is used in a meal.
@@ -15,6 +146,32 @@ class FoodItem(models.Model):
 	name = models.CharField(max_length=100)
 	user = models.ForeignKey(User, on_delete=models.CASCADE)
 
+	# The most recent purchase of this FoodItem. This is kept up to date by the FoodPurchase signals,
+	# so that the newest price can be found without sorting the FoodItem's purchase history.
+	latest_purchase = models.ForeignKey(FoodPurchase,
+										null=True,
+										blank=True,
+										editable=False,
+										on_delete=models.SET_NULL,
+										related_name='+')
+
+	# The density in g/ml, which is needed to convert between units of mass and volume.
+	density = models.DecimalField('Density (g/ml)', max_digits=8, decimal_places=4, null=True, blank=True)
+
+	objects = FoodItemQuerySet.as_manager()
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['user', 'name'], name='meals_fooditem_user_name_idx'),
+		]
+
+		# The indexes for case-insensitive name searches are PostgreSQL specific,
+		# and are created in migrations/0004_query_indexes.py.
+
+		constraints = [
+			models.UniqueConstraint(models.F('user'), Lower('name'), name='meals_fooditem_user_lower_name_unique'),
+		]
+
 	def __str__(self):
 		return self.name
 	
@@ -28,6 +185,14 @@ class FoodItem(models.Model):
 
 		self.name = self.name.title()
 
+		# The latest purchase is maintained by the FoodPurchase signals, so the value held
+		# by this instance may be out of date. Avoid overwriting it when updating.
+		if not self._state.adding and 'update_fields' not in kwargs:
+			kwargs['update_fields'] = [
+				field.name for field in self._meta.concrete_fields
+				if not field.primary_key and field.name != 'latest_purchase'
+			]
+
 		super().save(*args, **kwargs)
 
 	def check_valid_name(self):
@@ -45,15 +210,17 @@ class FoodItem(models.Model):
 			raise UserDuplicateFoodItemError(f'A Food Item with the name {self.name} already exists for the user {self.user}')
 
 	def get_newest_purchase(self):
-		purchases = FoodPurchase.objects.filter(food_item=self).order_by('-date')
+		# The latest purchase has already been loaded if the FoodItem came from FoodItem.objects.with_stats().
+		if FoodItem.latest_purchase.is_cached(self):
+			return self.latest_purchase
 
-		if not purchases:
-			return None
-		
-		return purchases[0]
+		latest_purchase_id = FoodItem.objects.filter(pk=self.pk).values('latest_purchase')
+
+		return FoodPurchase.objects.filter(pk__in=latest_purchase_id).first()
 
 	
 
+	@time_pricing('food_item_newest_price')
 	def get_newest_price(self, format='per-unit', currency=None, quantity=1, unit=None):
 		newest_purchase = self.get_newest_purchase()
 
@@ -63,21 +230,11 @@ class FoodItem(models.Model):
 			else:
 				return None
 			
-		purchase_price = newest_purchase.get_price_in_currency(currency)
-		purchase_quantity = newest_purchase.quantity
-
 		# If no unit is specified, use the SI unit of the newest purchase.
 		if not unit:
 			unit = newest_purchase.si_unit
 
-		unit_conversion_factor = get_unit_conversion_factor(newest_purchase.unit, unit)
-		unit_conversion_factor = Decimal(unit_conversion_factor)
-
-		quantity = Decimal(quantity)
-
-		price_per_purchase_unit = purchase_price / purchase_quantity
-		price_per_output_unit = price_per_purchase_unit / unit_conversion_factor
-		price_for_quantity = round(price_per_output_unit * quantity, 2)
+		price_for_quantity = calculate_price(newest_purchase, quantity=quantity, unit=unit, currency=currency, density=self.density)
 
 		if not format:
 			return price_for_quantity
@@ -87,10 +244,13 @@ class FoodItem(models.Model):
 		if format not in VALID_FORMAT_OPTIONS:
 			raise ValueError(f'format must either be one of {VALID_FORMAT_OPTIONS} or False. Got {format}.')
 
+		if not currency:
+			currency = newest_purchase.currency
+
 		if format == 'absolute':
-			return f'{price_for_quantity} {newest_purchase.currency}'
+			return f'{price_for_quantity} {currency}'
 		elif format == 'per-unit':
-			return f'{price_for_quantity} {newest_purchase.currency} / {unit}'
+			return f'{price_for_quantity} {currency} / {unit}'
 
 
 	# Return a list of all the meals that use this FoodItem.
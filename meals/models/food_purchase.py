@@ -1,18 +1,142 @@
 from decimal import Decimal
+from django.contrib.auth.models import User
 from django.db import models
 
 from ..validators import MealValidators
+from meals.currency import MissingFxRateError, convert
+
+from .meal_cost_snapshot import MealCostChange
+
+# FoodPurchases which are created or updated in bulk do not send signals,
+# so the newest purchase of each affected FoodItem is refreshed here instead,
+# and the changes to the costs of the meals which use them are recorded for the next meal cost rollup.
+# Callers which create purchases in several batches can pass refresh_latest_purchase=False to bulk_create(),
+# and refresh the FoodItems once they have finished.
+class FoodPurchaseQuerySet(models.QuerySet):
+
+	@property
+	def food_item_model(self):
+		return self.model._meta.get_field('food_item').related_model
+
+	# Return a dict mapping the id of each food item with purchases in the queryset to the date of its earliest purchase.
+	def get_earliest_dates(self):
+		return dict(self.order_by().values('food_item_id').annotate(
+			earliest_date=models.Min('date')
+		).values_list('food_item_id', 'earliest_date'))
+
+	# Set the user of each purchase which does not have one to the user of its food item.
+	def _set_users(self, purchases):
+		food_item_ids = {purchase.food_item_id for purchase in purchases if purchase.user_id is None}
+
+		if not food_item_ids:
+			return
+
+		users = dict(self.food_item_model.objects.using(self.db).filter(pk__in=food_item_ids).values_list('pk', 'user_id'))
+
+		for purchase in purchases:
+			if purchase.user_id is None:
+				purchase.user_id = users.get(purchase.food_item_id)
+
+	def bulk_create(self, objs, *args, refresh_latest_purchase=True, **kwargs):
+		objs = list(objs)
+		self._set_users(objs)
+		purchases = super().bulk_create(objs, *args, **kwargs)
+
+		earliest_dates = {}
+
+		for purchase in purchases:
+			earliest_dates[purchase.food_item_id] = min(purchase.date, earliest_dates.get(purchase.food_item_id, purchase.date))
+
+		MealCostChange.objects.record_food_items(earliest_dates)
+
+		if not refresh_latest_purchase:
+			return purchases
+
+		self.food_item_model.objects.filter(pk__in=earliest_dates).refresh_latest_purchase()
+
+		return purchases
+
+	def bulk_update(self, objs, fields, *args, **kwargs):
+		objs = list(objs)
+		earliest_dates = self.model.objects.filter(pk__in=[purchase.pk for purchase in objs]).get_earliest_dates()
+
+		# Purchases moved to another food item move to its user.
+		if {'food_item', 'food_item_id'} & set(fields):
+			for purchase in objs:
+				purchase.user_id = None
+
+			self._set_users(objs)
+			fields = [*fields, 'user']
+
+		num_updated = super().bulk_update(objs, fields, *args, **kwargs)
+
+		food_item_ids = {purchase.food_item_id for purchase in objs}
+		self.food_item_model.objects.filter(
+			models.Q(pk__in=food_item_ids) | models.Q(latest_purchase__in=objs)
+		).refresh_latest_purchase()
+
+		# The costs change from the earlier of each purchase's previous date and its new date.
+		for purchase in objs:
+			earliest_dates[purchase.food_item_id] = min(purchase.date, earliest_dates.get(purchase.food_item_id, purchase.date))
+
+		MealCostChange.objects.record_food_items(earliest_dates)
+
+		return num_updated
+
+	def update(self, **kwargs):
+		earliest_dates = self.get_earliest_dates()
+
+		# Purchases moved to another food item move to its user.
+		if 'food_item' in kwargs or 'food_item_id' in kwargs:
+			new_food_item = kwargs.get('food_item', kwargs.get('food_item_id'))
+			kwargs['user_id'] = models.Subquery(self.food_item_model.objects.filter(pk=getattr(new_food_item, 'pk', new_food_item)).values('user_id'))
+
+		num_updated = super().update(**kwargs)
+
+		# Purchases moved to another date or food item change the costs from their new dates, which may be earlier.
+		if {'date', 'food_item', 'food_item_id'} & set(kwargs):
+			earliest_dates = dict.fromkeys(earliest_dates)
+
+		if 'food_item' in kwargs or 'food_item_id' in kwargs:
+			new_food_item = kwargs.get('food_item', kwargs.get('food_item_id'))
+			earliest_dates[getattr(new_food_item, 'pk', new_food_item)] = None
+
+		self.food_item_model.objects.filter(pk__in=earliest_dates).refresh_latest_purchase()
+		MealCostChange.objects.record_food_items(earliest_dates)
+
+		return num_updated
+
+	def delete(self):
+		earliest_dates = self.get_earliest_dates()
+		deleted = super().delete()
+
+		self.food_item_model.objects.filter(pk__in=earliest_dates).refresh_latest_purchase()
+		MealCostChange.objects.record_food_items(earliest_dates)
+
+		return deleted
 
 # This describes an instance of a FoodItem being purchased.
 # We can use this to track the price of a FoodItem over time.
 class FoodPurchase(models.Model):
 
+	objects = FoodPurchaseQuerySet.as_manager()
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['food_item', '-date', '-id'], name='meals_purchase_item_date_idx'),
+			models.Index(fields=['user', '-date', '-id'], name='meals_purchase_user_date_idx'),
+		]
+
 	def __str__(self):
 		return f'{self.food_item.name}: {self.price_amount} {self.currency} for {self.quantity} {self.unit} @ {self.location} on {self.date}'		
 
 	food_item = models.ForeignKey('meals.FoodItem',
 								  on_delete=models.CASCADE)
 
+	# The user of the food item, copied here when the purchase is saved, so that the user's purchases can be listed
+	# by date from one index.
+	user = models.ForeignKey(User, on_delete=models.CASCADE, editable=False, related_name='+')
+
 	price_amount = models.DecimalField('Price',
 									   max_digits=5,
 									   decimal_places=2)
@@ -34,6 +158,10 @@ class FoodPurchase(models.Model):
 								max_length=3, 
 								validators=[MealValidators.is_valid_currency])
 	
+	def save(self, *args, **kwargs):
+		self.user_id = self.food_item.user_id
+		super().save(*args, **kwargs)
+
 	@property
 	def si_unit(self):
 		if self.unit == 'g':
@@ -51,12 +179,17 @@ class FoodPurchase(models.Model):
 	def format_quantity(self):
 		return f'{self.quantity} {self.unit}'
 	
-	# Return the price of this purchase in the specified currency.
+	# Return the price of this purchase in the specified currency, using the exchange rate on the date of the purchase.
+	# Raises MissingFxRateError if there is no exchange rate.
 	def get_price_in_currency(self, currency=None):
 		if currency in [None, self.currency]:
 			return self.price_amount
-		
-		# TODO: Implement currency conversion.
-		return self.price_amount
+
+		converted_price = convert([self.price_amount], [self.currency], [self.date], currency)[0]
+
+		if converted_price is None:
+			raise MissingFxRateError(f'Cannot convert {self.currency} to {currency} on {self.date}.')
+
+		return converted_price
 		
 		
\ No newline at end of file
@@ -0,0 +1,16 @@
+from django.db import models
+
+# The exchange rate of a currency on a particular date, as published by the European Central Bank.
+# Rates are the amount of the currency that one euro buys. They are only published on working days.
+class FxRate(models.Model):
+	currency = models.CharField('Currency', max_length=3)
+	date = models.DateField('Date')
+	rate = models.DecimalField('Rate', max_digits=16, decimal_places=6)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['currency', 'date'], name='meals_fxrate_currency_date_unique'),
+		]
+
+	def __str__(self):
+		return f'1 EUR = {self.rate} {self.currency} on {self.date}'
@@ -1,16 +1,87 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 
+from .meal_cost_snapshot import MealCostChange
 from .meal_instance import MealInstance
 from .standard_ingredient import StandardIngredient
 
+from meals.metrics import time_pricing
+from meals.pricing import format_meal_price, get_meal_prices, get_meal_prices_on
+
 from decimal import getcontext
 from pint import UnitRegistry
 
+class MealQuerySet(models.QuerySet):
+
+	# Annotate the user's meals with the figures shown in the meal list, so that the
+	# list does not need to query the instances and ingredients of each meal.
+	def with_stats(self, user):
+		meal_instances = MealInstance.objects.filter(meal=models.OuterRef('pk')).values('meal')
+		standard_ingredients = StandardIngredient.objects.filter(meal=models.OuterRef('pk')).values('meal')
+
+		return self.filter(user=user).annotate(
+			times_cooked=Coalesce(models.Subquery(meal_instances.annotate(count=models.Count('pk')).values('count')), 0),
+			avg_cook_time=models.Subquery(meal_instances.annotate(avg=models.Avg('cook_time')).values('avg')),
+			num_ingredients=Coalesce(models.Subquery(standard_ingredients.annotate(count=models.Count('pk')).values('count')), 0),
+		)
+
+	# Save new meals and their ingredients in one transaction, with one INSERT for the meals and one for all of the ingredients.
+	# meals is a list of (meal, ingredients) pairs of unsaved Meals and StandardIngredients, which must already have been
+	# validated, as the ingredients are not cleaned by StandardIngredient.save(). Returns the meals, with their num_ingredients.
+	def bulk_create_with_ingredients(self, meals):
+		with transaction.atomic(using=self.db):
+			created_meals = self.bulk_create([meal for meal, _ in meals])
+			ingredients = []
+
+			for meal, meal_ingredients in meals:
+				meal.num_ingredients = len(meal_ingredients)
+
+				for ingredient in meal_ingredients:
+					ingredient.meal = meal
+					ingredients.append(ingredient)
+
+			StandardIngredient.objects.using(self.db).bulk_create(ingredients)
+
+			# The meals are new, so none of their prices have been cached, but they still need costing by the next rollup.
+			MealCostChange.objects.using(self.db).record_meals([meal.pk for meal in created_meals])
+
+		return created_meals
+
+	# Copy the meals in the queryset, with their ingredients, in five queries.
+	# copies is a list of (meal id, name) pairs, one for each copy to make, so a meal can be copied more than once.
+	# A copy without a name is named after its meal. By default, each meal is copied once.
+	def clone(self, copies=None):
+		max_length = self.model._meta.get_field('name').max_length
+		meals = {meal.pk: meal for meal in self.order_by('pk').prefetch_related('standardingredient_set')}
+		new_meals = []
+
+		if copies is None:
+			copies = [(meal_id, None) for meal_id in meals]
+
+		for meal_id, name in copies:
+			meal = meals[meal_id]
+			copy = self.model(name=name or f'{meal.name} (copy)'[:max_length], user_id=meal.user_id)
+			ingredients = [
+				StandardIngredient(food_item_id=ingredient.food_item_id, quantity=ingredient.quantity, unit=ingredient.unit)
+				for ingredient in meal.standardingredient_set.all()
+			]
+			new_meals.append((copy, ingredients))
+
+		return self.bulk_create_with_ingredients(new_meals)
+
 class Meal(models.Model):
 	name = models.CharField(max_length=200)
 	user = models.ForeignKey(User, on_delete=models.CASCADE)
 
+	objects = MealQuerySet.as_manager()
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['user', 'name'], name='meals_meal_user_name_idx'),
+		]
+
 	def __str__(self):
 		return self.name
 
@@ -27,27 +98,37 @@ class Meal(models.Model):
 	def standard_ingredients(self):
 		return StandardIngredient.objects.filter(meal=self)
 
+	# The average cook time is annotated by Meal.objects.with_stats().
+	def format_avg_cook_time(self):
+		if self.avg_cook_time is None:
+			return 'N/A'
+
+		return f'{round(self.avg_cook_time)} minutes'
+
 	def get_food_items(self):
 		return [ingredient.food_item for ingredient in self.standard_ingredients ]
 	
-	def get_newest_price(self, format=True):
-		if len(self.standard_ingredients) == 0:
-			return 0
+	@time_pricing('meal_newest_price')
+	def get_newest_price(self, format=True, currency=None):
+		if currency is None:
+			currency = settings.DEFAULT_CURRENCY
 
-		ingredient_prices = [ingredient.get_newest_price(format=False) for ingredient in self.standard_ingredients]
-		ingredient_prices = [price for price in ingredient_prices if price is not None]
+		meal_price = get_meal_prices([self], currency=currency)[self.id]
 
-		meal_price = sum(ingredient_prices)
+		if meal_price is None:
+			return 0
 
 		if not format:
 			return meal_price
 		
-		meal_price = round(meal_price, 2)
+		return format_meal_price(meal_price, currency)
 
-		# TODO: Properly handle currency.
-		currency = 'EUR'
-		
-		return f'{meal_price} {currency}'
+	# Return the price of the meal on a date, using the newest purchase of each ingredient on or before that date.
+	def get_price_on(self, date, currency=None):
+		if currency is None:
+			currency = settings.DEFAULT_CURRENCY
+
+		return get_meal_prices_on([(self.id, date)], currency=currency)[0]
 
 	# Return the cost of the required amounts of an ingredient for the meal.
 	def get_newest_ingredient_price(self, ingredient):
@@ -0,0 +1,61 @@
+from django.db import models
+
+# The cost of a meal on a particular day, precalculated by `manage.py rollup_meal_costs` (see meals/rollup.py),
+# so that a meal's cost trend can be read without pricing its ingredients on every day.
+# The ingredient prices map the id of each of the meal's ingredients to its price on the day, or None if it had none.
+class MealCostSnapshot(models.Model):
+	meal = models.ForeignKey('meals.Meal',
+							 on_delete=models.CASCADE)
+	date = models.DateField('Date')
+	currency = models.CharField('Currency', max_length=3)
+	total = models.DecimalField('Total', max_digits=10, decimal_places=2)
+	ingredient_prices = models.JSONField('Ingredient Prices', default=dict)
+
+	class Meta:
+		# The unique constraint's index serves reads of a meal's snapshots over a range of dates.
+		constraints = [
+			models.UniqueConstraint(fields=['meal', 'date'], name='meals_mealcostsnapshot_meal_date_unique'),
+		]
+
+	def __str__(self):
+		return f'{self.meal_id} on {self.date}: {self.total} {self.currency}'
+
+class MealCostChangeQuerySet(models.QuerySet):
+
+	# Record that the costs of the meals have changed from a date onwards, or on every date if the date is None.
+	def record_meals(self, meal_ids, date=None):
+		return self.bulk_create([self.model(meal_id=meal_id, date=date) for meal_id in set(meal_ids)])
+
+	# Record that the prices of food items have changed. food_item_dates maps the id of each food item
+	# to the earliest date from which its price changed, or None if it changed on every date.
+	def record_food_items(self, food_item_dates):
+		return self.bulk_create([
+			self.model(food_item_id=food_item_id, date=date)
+			for food_item_id, date in food_item_dates.items()
+		])
+
+	# Record that the costs of every meal have changed, e.g. because the exchange rates have changed.
+	def record_all(self, date=None):
+		return self.create(date=date)
+
+# A change which affects the cost of meals, waiting to be processed by the next rollup.
+# Changes hold the ids of the meal or food item changed, rather than foreign keys, so that they can be
+# recorded while the meal or food item is being deleted. A change with neither affects every meal.
+class MealCostChange(models.Model):
+	meal_id = models.BigIntegerField(null=True)
+	food_item_id = models.BigIntegerField(null=True)
+	date = models.DateField(null=True)
+
+	objects = MealCostChangeQuerySet.as_manager()
+
+	def __str__(self):
+		return f'Meal {self.meal_id}, food item {self.food_item_id}, from {self.date}'
+
+# The progress of the rollups. There is only one row.
+# Snapshots exist for every day up to and including the high-water mark, in the currency of the rollup.
+class MealCostRollup(models.Model):
+	currency = models.CharField('Currency', max_length=3)
+	last_date = models.DateField('Last Date')
+
+	def __str__(self):
+		return f'Meal costs in {self.currency} up to {self.last_date}'
@@ -1,20 +1,56 @@
+from django.contrib.auth.models import User
 from django.db import models
 
 from ..validators import MealValidators
 
+class MealInstanceQuerySet(models.QuerySet):
+
+	# Meal instances created in bulk are not saved one by one, so their users are set here instead.
+	def bulk_create(self, objs, *args, **kwargs):
+		objs = list(objs)
+		meal_ids = {meal_instance.meal_id for meal_instance in objs if meal_instance.user_id is None}
+
+		if meal_ids:
+			meal_model = self.model._meta.get_field('meal').related_model
+			users = dict(meal_model.objects.using(self.db).filter(pk__in=meal_ids).values_list('pk', 'user_id'))
+
+			for meal_instance in objs:
+				if meal_instance.user_id is None:
+					meal_instance.user_id = users.get(meal_instance.meal_id)
+
+		return super().bulk_create(objs, *args, **kwargs)
+
 # This describes a particular time when a Meal was made.
 class MealInstance(models.Model):
+
+	objects = MealInstanceQuerySet.as_manager()
+
 	meal = models.ForeignKey('meals.Meal',
 							 on_delete=models.CASCADE)
+
+	# The user of the meal, copied here when the instance is saved, so that the user's meal instances can be listed
+	# by date from one index.
+	user = models.ForeignKey(User, on_delete=models.CASCADE, editable=False, related_name='+')
+
 	date = models.DateField('Date')
 	num_servings = models.PositiveIntegerField('Number of Servings')
 	rating = models.PositiveIntegerField('Rating', validators=[MealValidators.is_valid_rating])
 	cook_time = models.PositiveIntegerField('Cooking Time')
 
+	class Meta:
+		indexes = [
+			models.Index(fields=['meal', '-date'], name='meals_instance_meal_date_idx'),
+			models.Index(fields=['user', '-date', '-id'], name='meals_instance_user_date_idx'),
+		]
+
 	def __str__(self):
 		date_string = self.date.strftime('%m/%d/%Y')
 		return f'{self.meal.name} on {date_string}: {self.rating}/5 stars'
 	
+	def save(self, *args, **kwargs):
+		self.user_id = self.meal.user_id
+		super().save(*args, **kwargs)
+
 	def list_format(self):
 		date_string = self.date.strftime('%m/%d/%Y')
 		return f'{date_string} | {self.rating}/5 stars | {self.cook_time} minutes cooking time'
@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.db import models
 from django.forms import ValidationError
 
+from ..currency import MissingFxRateError
+from ..helper import UnitConversionError
 from ..validators import MealValidators
 
 # from ..helper import get_unit_conversion_factor
@@ -65,9 +68,14 @@ class StandardIngredient(models.Model):
 	def format_quantity(self):
 		return f'{self.quantity} {self.unit}'
 	
+	# Ingredients which cannot be priced, because their unit cannot be converted to the unit of the newest purchase
+	# or there is no exchange rate for it, have no price, as in meals.pricing.get_fixed_point_ingredient_prices().
 	def get_newest_price(self, format='absolute'):
-		return self.food_item.get_newest_price(format,
-					 						   currency='EUR',
-											   quantity=self.quantity, 
-											   unit=self.unit
-											   )
\ No newline at end of file
+		try:
+			return self.food_item.get_newest_price(format,
+												   currency=settings.DEFAULT_CURRENCY,
+												   quantity=self.quantity,
+												   unit=self.unit
+												   )
+		except (UnitConversionError, MissingFxRateError):
+			return 'N/A' if format else None
\ No newline at end of file
@@ -0,0 +1,106 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+# Keyset (or seek) pagination of the list views.
+#
+# A page is the first rows after the last row of the previous page, in an order which ends with a unique field,
+# such as ('-date', '-id'). The rows are found by filtering on the values of the last row rather than by skipping
+# the rows before them, as OFFSET would, so that a page costs the same however far into the list it is, and rows
+# added or removed between requests do not shift the pages. The values of the last row are sent to the client as
+# an opaque cursor token, which is passed back in the cursor query parameter to get the next page.
+
+# Error to be raised when the cursor or page size of a request is invalid.
+class PaginationError(ValueError):
+	pass
+
+class Page:
+
+	def __init__(self, items, next_cursor):
+		self.items = items
+		self.next_cursor = next_cursor
+
+	# Return the URL of the next page, with the same query parameters as the request, or None if this is the last page.
+	def get_next_url(self, request):
+		if self.next_cursor is None:
+			return None
+
+		params = request.GET.copy()
+		params['cursor'] = self.next_cursor
+
+		return f'{request.path}?{params.urlencode()}'
+
+def encode_cursor(values):
+	return base64.urlsafe_b64encode(json.dumps(values, cls=DjangoJSONEncoder).encode()).decode().rstrip('=')
+
+# Return the values of the ordering fields in a cursor, converted to the types of the fields.
+def decode_cursor(cursor, model, ordering):
+	try:
+		values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+	except (binascii.Error, UnicodeDecodeError, ValueError):
+		raise PaginationError('Invalid cursor.')
+
+	if not isinstance(values, list) or len(values) != len(ordering):
+		raise PaginationError('Invalid cursor.')
+
+	try:
+		return [model._meta.get_field(field.lstrip('-')).to_python(value) for field, value in zip(ordering, values)]
+	except ValidationError:
+		raise PaginationError('Invalid cursor.')
+
+def get_page_size(params):
+	try:
+		page_size = int(params.get('page_size') or settings.PAGE_SIZE)
+	except ValueError:
+		raise PaginationError(f'page_size must be a whole number. Got {params["page_size"]}.')
+
+	if not 1 <= page_size <= settings.MAX_PAGE_SIZE:
+		raise PaginationError(f'page_size must be between 1 and {settings.MAX_PAGE_SIZE}. Got {page_size}.')
+
+	return page_size
+
+# Return a filter for the rows after the given values of the ordering fields:
+# those after the first value, or equal to it and after the rest of the values.
+def _get_seek_filter(ordering, values):
+	seek_filter = None
+
+	for field, value in reversed(list(zip(ordering, values))):
+		name = field.lstrip('-')
+		after = Q(**{f'{name}__lt' if field.startswith('-') else f'{name}__gt': value})
+		seek_filter = after if seek_filter is None else after | (Q(**{name: value}) & seek_filter)
+
+	return seek_filter
+
+# Return the query for the page of the queryset requested by the query parameters (cursor and page_size),
+# with one extra row to tell whether there is a next page, and the page size.
+def get_page_queryset(queryset, ordering, params):
+	page_size = get_page_size(params)
+	queryset = queryset.order_by(*ordering)
+
+	if params.get('cursor'):
+		queryset = queryset.filter(_get_seek_filter(ordering, decode_cursor(params['cursor'], queryset.model, ordering)))
+
+	return queryset[:page_size + 1], page_size
+
+def _get_page(rows, ordering, page_size):
+	if len(rows) <= page_size:
+		return Page(rows, None)
+
+	rows = rows[:page_size]
+
+	return Page(rows, encode_cursor([getattr(rows[-1], field.lstrip('-')) for field in ordering]))
+
+def paginate(queryset, ordering, params):
+	queryset, page_size = get_page_queryset(queryset, ordering, params)
+
+	return _get_page(list(queryset), ordering, page_size)
+
+async def apaginate(queryset, ordering, params):
+	queryset, page_size = get_page_queryset(queryset, ordering, params)
+
+	return _get_page([row async for row in queryset], ordering, page_size)
@@ -0,0 +1,408 @@
+import heapq
+import math
+import time
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from django.conf import settings
+from django.db import models
+
+from meals import cache, fixed_point
+from meals.models import Meal
+from meals.validators import MealValidators
+
+try:
+	from scipy.optimize import Bounds, LinearConstraint, milp
+except ImportError:
+	milp = None
+
+# The meal planner, which picks the cheapest meal for each day of a plan which meets the user's constraints.
+#
+# Each of the user's priced meals is a candidate, with the cost of cooking it for the servings needed each day
+# (its price for every batch it must be cooked in), its average rating and its average cook time. These are
+# loaded in a fixed number of queries, and held in arrays, with the costs in fixed point (see meals/fixed_point.py).
+#
+# A plan is a number of days, each with one meal. No meal can be repeated within no_repeat_days days, so over
+# the plan each meal can be used at most q = ceil(days / no_repeat_days) times, and, as the days are split into
+# blocks of no_repeat_days with a shorter last block of r days, at most r meals can be used q times. Any choice
+# of meals within those limits can be put in an order without repeats, so the planner first chooses how many
+# times to use each meal, which costs the least, has an average rating of at least min_rating and is within the
+# budget, and then orders them. The choice is an integer linear program, which is solved by scipy's MILP solver
+# when scipy is installed, and otherwise by branch and bound, with a Lagrangian relaxation of the rating constraint
+# as its bound. Either stops after PLANNER_TIME_LIMIT seconds, with the best plan found so far.
+
+SOLVERS = ['auto', 'milp', 'branch_and_bound']
+
+# Ratings are compared with this tolerance, as the average ratings are not exact.
+RATING_TOLERANCE = 1e-9
+
+# Error to be raised when the query parameters of a plan are invalid.
+class PlanParameterError(ValueError):
+	pass
+
+class PlanParameters:
+
+	def __init__(self, days=7, servings=1, budget=None, max_cook_time=None, min_rating=None, no_repeat_days=7,
+				 currency=None, solver='auto'):
+		self.days = days
+		self.servings = servings
+		self.budget = budget
+		self.max_cook_time = max_cook_time
+		self.min_rating = min_rating
+		self.no_repeat_days = no_repeat_days
+		self.currency = currency or settings.DEFAULT_CURRENCY
+		self.solver = solver
+
+def _parse_int(params, name, default, minimum, maximum):
+	value = params.get(name)
+
+	if not value:
+		return default
+
+	try:
+		value = int(value)
+	except ValueError:
+		raise PlanParameterError(f'{name} must be a whole number. Got {params[name]}.')
+
+	if not minimum <= value <= maximum:
+		raise PlanParameterError(f'{name} must be between {minimum} and {maximum}. Got {value}.')
+
+	return value
+
+def _parse_decimal(params, name, minimum, maximum=None):
+	value = params.get(name)
+
+	if not value:
+		return None
+
+	try:
+		value = Decimal(value)
+	except InvalidOperation:
+		raise PlanParameterError(f'{name} must be a number. Got {params[name]}.')
+
+	if not value.is_finite() or value < minimum or (maximum is not None and value > maximum):
+		raise PlanParameterError(f'{name} must be at least {minimum}' + (f' and at most {maximum}' if maximum is not None else '') + f'. Got {value}.')
+
+	return value
+
+# Return the PlanParameters of the query parameters of a plan.
+def parse_parameters(params):
+	currency = (params.get('currency') or settings.DEFAULT_CURRENCY).upper()
+
+	if not MealValidators.is_valid_currency(currency):
+		raise PlanParameterError(f'Unsupported currency: {currency}.')
+
+	solver = params.get('solver') or 'auto'
+
+	if solver not in SOLVERS:
+		raise PlanParameterError(f'solver must be one of {", ".join(SOLVERS)}. Got {solver}.')
+
+	return PlanParameters(
+		days=_parse_int(params, 'days', 7, 1, settings.PLANNER_MAX_DAYS),
+		servings=_parse_int(params, 'servings', 1, 1, 100),
+		budget=_parse_decimal(params, 'budget', 0),
+		max_cook_time=_parse_int(params, 'max_cook_time', None, 0, 24 * 60),
+		min_rating=_parse_decimal(params, 'min_rating', 0, 5),
+		no_repeat_days=_parse_int(params, 'no_repeat_days', 7, 1, settings.PLANNER_MAX_DAYS),
+		currency=currency,
+		solver=solver,
+	)
+
+# The meals which can be planned, with their costs, ratings and cook times in arrays.
+class Candidates:
+
+	def __init__(self, meals, costs, ratings, cook_times, batches):
+		self.meals = meals
+		self.costs = costs
+		self.ratings = ratings
+		self.cook_times = cook_times
+		self.batches = batches
+
+	def __len__(self):
+		return len(self.meals)
+
+# Return the user's meals which meet the constraints on each meal, with the cost of cooking each of them for a day.
+# A meal is cooked in enough batches for the servings, and makes the average number of servings it has been
+# cooked for, or all of the servings if it has never been cooked. Meals which cannot be priced are left out,
+# as are meals without ratings or cook times, when those are constrained.
+def get_candidates(user, parameters):
+	meals = list(Meal.objects.filter(user=user).annotate(
+		avg_rating=models.Avg('mealinstance__rating'),
+		avg_servings=models.Avg('mealinstance__num_servings'),
+		avg_cook_time=models.Avg('mealinstance__cook_time'),
+	).order_by('pk'))
+
+	prices = cache.get_meal_prices(user, meals, currency=parameters.currency)
+	candidates = []
+
+	for meal in meals:
+		if prices[meal.id] is None:
+			continue
+
+		if parameters.max_cook_time is not None and (meal.avg_cook_time is None or meal.avg_cook_time > parameters.max_cook_time):
+			continue
+
+		if parameters.min_rating is not None and meal.avg_rating is None:
+			continue
+
+		meal.batches = math.ceil(parameters.servings / (meal.avg_servings or parameters.servings))
+		meal.price = prices[meal.id]
+		candidates.append(meal)
+
+	return Candidates(
+		candidates,
+		fixed_point.to_fixed_point(meal.price for meal in candidates) * np.array([meal.batches for meal in candidates], dtype=np.int64),
+		np.array([np.nan if meal.avg_rating is None else float(meal.avg_rating) for meal in candidates], dtype=np.float64),
+		np.array([np.nan if meal.avg_cook_time is None else float(meal.avg_cook_time) for meal in candidates], dtype=np.float64),
+		np.array([meal.batches for meal in candidates], dtype=np.int64),
+	)
+
+# The limits on the number of times each meal is used: at most max_uses times, and at most num_max_uses meals that often.
+def get_use_limits(days, no_repeat_days):
+	window = min(no_repeat_days, days)
+	max_uses = math.ceil(days / window)
+
+	return max_uses, days - (max_uses - 1) * window
+
+# The sum of the cheapest days uses of the candidates, at most max_uses of each, with the costs reduced by multiplier times
+# their excess ratings. As the excess ratings of a plan sum to at least 0, this is a lower bound of the cost of any plan.
+def _get_lagrangian_bound(costs, excesses, days, max_uses, multiplier):
+	reduced_costs = np.repeat(costs - multiplier * excesses, max_uses)
+
+	return np.partition(reduced_costs, days - 1)[:days].sum()
+
+# Return the multiplier which gives the highest lower bound of the cost of a plan (see _get_lagrangian_bound()),
+# found by a ternary search, as the bound is a concave function of the multiplier.
+def get_multiplier(costs, excesses, days, max_uses):
+	if len(costs) * max_uses < days or not (excesses < -RATING_TOLERANCE).any():
+		return 0.0
+
+	nonzero_excesses = np.abs(excesses[np.abs(excesses) > RATING_TOLERANCE])
+	low, high = 0.0, float(costs.max() - costs.min() + 1) / max(nonzero_excesses.min(), 1e-3)
+
+	for _ in range(100):
+		third = (high - low) / 3
+
+		if _get_lagrangian_bound(costs, excesses, days, max_uses, low + third) < _get_lagrangian_bound(costs, excesses, days, max_uses, high - third):
+			low += third
+		else:
+			high -= third
+
+	return low
+
+# Return the number of times to use each candidate, the cheapest which meets the constraints, found by branch and bound,
+# and whether it is known to be the cheapest. Returns None if no choice meets the constraints.
+#
+# The cost of each candidate is reduced by a multiple of its excess rating (see get_multiplier()), so that candidates
+# which are cheap but badly rated are not favoured by the search, and the candidates are searched in order of their
+# reduced costs. Each node of the search chooses the next candidate to use and how many times to use it, and is pruned
+# when even the cheapest way of filling the remaining days, by reduced cost, would cost more than the best choice found
+# so far or the budget, or when the highest rated way would not reach min_rating.
+def solve_branch_and_bound(costs, excesses, days, max_uses, num_max_uses, budget=None, time_limit=None):
+	num_candidates = len(costs)
+	multiplier = get_multiplier(costs, excesses, days, max_uses)
+	reduced_costs = costs - multiplier * excesses
+
+	order = np.lexsort((-excesses, reduced_costs))
+	costs = costs[order].tolist()
+	excesses = excesses[order].tolist()
+	reduced_costs = reduced_costs[order]
+
+	# The reduced cost of the cheapest k uses of the candidates from i onwards is
+	# cumulative_costs[i * max_uses + k] - cumulative_costs[i * max_uses].
+	cumulative_costs = np.concatenate([[0], np.cumsum(np.repeat(reduced_costs, max_uses))]).tolist()
+	cumulative_costs += [math.inf] * (days + 1)
+	reduced_costs = reduced_costs.tolist()
+
+	# The highest excess rating of a use of any of the candidates from i onwards.
+	max_excesses = np.maximum.accumulate(np.array(excesses + [-math.inf])[::-1])[::-1].tolist()
+
+	# The costs are whole numbers, so a better choice costs at least 1 less than the best. The bounds are not exact.
+	slack = 1 - 1e-6 - multiplier * RATING_TOLERANCE * days
+
+	deadline = None if time_limit is None else time.monotonic() + time_limit
+	best_cost = math.inf if budget is None else budget + 1
+	best_uses = None
+	uses = [0] * num_candidates
+	timed_out = False
+	num_nodes = 0
+
+	def search(start, remaining, cost, reduced_cost, excess, num_at_max):
+		nonlocal best_cost, best_uses, timed_out, num_nodes
+
+		if remaining == 0:
+			if excess >= -RATING_TOLERANCE and cost < best_cost:
+				best_cost = cost
+				best_uses = uses.copy()
+
+			return
+
+		num_nodes += 1
+
+		if deadline is not None and num_nodes % 1000 == 0 and time.monotonic() > deadline:
+			timed_out = True
+
+		for index in range(start, num_candidates):
+			if timed_out:
+				return
+
+			# The bounds only get worse for later candidates, so none of them need to be searched either.
+			if reduced_cost + cumulative_costs[index * max_uses + remaining] - cumulative_costs[index * max_uses] > best_cost - slack:
+				return
+
+			if excess + remaining * max_excesses[index] < -RATING_TOLERANCE:
+				return
+
+			for count in range(min(max_uses, remaining), 0, -1):
+				if count == max_uses and num_at_max == num_max_uses:
+					continue
+
+				uses[index] = count
+				search(
+					index + 1,
+					remaining - count,
+					cost + count * costs[index],
+					reduced_cost + count * reduced_costs[index],
+					excess + count * excesses[index],
+					num_at_max + (count == max_uses)
+				)
+				uses[index] = 0
+
+	search(0, days, 0, 0.0, 0.0, 0)
+
+	if best_uses is None:
+		return None, not timed_out
+
+	result = np.zeros(num_candidates, dtype=np.int64)
+	result[order] = best_uses
+
+	return result, not timed_out
+
+# The same as solve_branch_and_bound(), with scipy's MILP solver. Each candidate has an integer variable for the
+# number of times it is used, and a binary variable which must be 1 for it to be used max_uses times.
+def solve_milp(costs, excesses, days, max_uses, num_max_uses, budget=None, time_limit=None):
+	num_candidates = len(costs)
+	identity = np.identity(num_candidates)
+	zeros = np.zeros(num_candidates)
+
+	constraints = [
+		LinearConstraint(np.concatenate([np.ones(num_candidates), zeros]), days, days),
+		LinearConstraint(np.hstack([identity, -identity]), -np.inf, max_uses - 1),
+		LinearConstraint(np.concatenate([zeros, np.ones(num_candidates)]), 0, num_max_uses),
+		LinearConstraint(np.concatenate([excesses, zeros]), -RATING_TOLERANCE, np.inf),
+	]
+
+	if budget is not None:
+		constraints.append(LinearConstraint(np.concatenate([costs, zeros]), 0, budget))
+
+	options = {} if time_limit is None else {'time_limit': time_limit}
+	result = milp(
+		np.concatenate([costs, zeros]).astype(np.float64),
+		integrality=np.ones(2 * num_candidates),
+		bounds=Bounds(0, np.concatenate([np.full(num_candidates, max_uses), np.ones(num_candidates)])),
+		constraints=constraints,
+		options=options,
+	)
+
+	if result.x is None:
+		return None, result.status == 2
+
+	return np.rint(result.x[:num_candidates]).astype(np.int64), result.status == 0
+
+# Order the uses of the candidates so that no candidate is used twice within no_repeat_days days.
+# Each day has the available candidate with the most uses remaining, which finds an order whenever there is one.
+def schedule(uses, no_repeat_days):
+	heap = [(-count, index) for index, count in enumerate(uses.tolist()) if count > 0]
+	heapq.heapify(heap)
+	waiting = []
+	order = []
+
+	while heap or waiting:
+		# Candidates used no_repeat_days days ago become available again.
+		while waiting and waiting[0][0] <= len(order):
+			_, count, index = heapq.heappop(waiting)
+			heapq.heappush(heap, (count, index))
+
+		if not heap:
+			raise ValueError('The uses cannot be ordered without repeats.')
+
+		count, index = heapq.heappop(heap)
+		order.append(index)
+
+		if count + 1 < 0:
+			heapq.heappush(waiting, (len(order) - 1 + no_repeat_days, count + 1, index))
+
+	return order
+
+class Plan:
+
+	def __init__(self, meals, currency, solver, optimal):
+		self.meals = meals
+		self.currency = currency
+		self.solver = solver
+		self.optimal = optimal
+
+	@property
+	def feasible(self):
+		return bool(self.meals)
+
+	@property
+	def total(self):
+		return sum((meal.price * meal.batches for meal in self.meals), Decimal('0.00'))
+
+	def as_dict(self):
+		ratings = [meal.avg_rating for meal in self.meals if meal.avg_rating is not None]
+
+		return {
+			'feasible': self.feasible,
+			'optimal': self.optimal,
+			'solver': self.solver,
+			'currency': self.currency,
+			'total': str(self.total) if self.feasible else None,
+			'average_rating': round(sum(ratings) / len(ratings), 2) if ratings else None,
+			'days': [
+				{
+					'day': day,
+					'meal_id': meal.id,
+					'name': meal.name,
+					'cost': str(meal.price * meal.batches),
+					'batches': meal.batches,
+					'rating': None if meal.avg_rating is None else round(meal.avg_rating, 2),
+					'cook_time': None if meal.avg_cook_time is None else round(meal.avg_cook_time),
+				}
+				for day, meal in enumerate(self.meals, start=1)
+			],
+		}
+
+# Return the cheapest Plan of the user's meals which meets the constraints of the PlanParameters,
+# or a Plan without meals if there is none.
+def plan_meals(user, parameters):
+	candidates = get_candidates(user, parameters)
+	solver = parameters.solver
+
+	if solver == 'auto':
+		solver = 'milp' if milp is not None else 'branch_and_bound'
+
+	if solver == 'milp' and milp is None:
+		raise PlanParameterError('The milp solver needs scipy, which is not installed.')
+
+	max_uses, num_max_uses = get_use_limits(parameters.days, parameters.no_repeat_days)
+
+	if len(candidates) * max_uses < parameters.days:
+		return Plan([], parameters.currency, solver, True)
+
+	if parameters.min_rating is None:
+		excesses = np.zeros(len(candidates))
+	else:
+		excesses = candidates.ratings - float(parameters.min_rating)
+
+	budget = None if parameters.budget is None else int(fixed_point.to_fixed_point([parameters.budget])[0])
+	solve = solve_milp if solver == 'milp' else solve_branch_and_bound
+	uses, optimal = solve(candidates.costs, excesses, parameters.days, max_uses, num_max_uses, budget=budget, time_limit=settings.PLANNER_TIME_LIMIT)
+
+	if uses is None:
+		return Plan([], parameters.currency, solver, optimal)
+
+	order = schedule(uses, min(parameters.no_repeat_days, parameters.days))
+
+	return Plan([candidates.meals[index] for index in order], parameters.currency, solver, optimal)
@@ -0,0 +1,410 @@
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import models
+
+from meals import fixed_point
+from meals.currency import convert
+from meals.helper import UnitConversionError, get_unit_conversion_ratio, get_unit_id
+from meals.metrics import time_pricing
+from meals.models.food_purchase import FoodPurchase
+from meals.models.standard_ingredient import StandardIngredient
+
+# The pricing engine calculates the prices of many meals at once.
+# Rather than looking up the newest purchase of every ingredient separately,
+# all the ingredients and newest purchases required are loaded in a fixed number of queries.
+# The prices are then calculated together in fixed point (see meals/fixed_point.py).
+# Prices are given in the currency requested, or in settings.DEFAULT_CURRENCY if none is.
+
+# Return the price of a quantity of a food item, based upon one of its purchases.
+# If no unit is specified, the SI unit of the purchase is used.
+# The density of the food item, in g/ml, is needed to convert between mass and volume.
+def calculate_price(purchase, quantity=1, unit=None, currency=None, density=None):
+	purchase_price = purchase.get_price_in_currency(currency)
+	purchase_quantity = purchase.quantity
+
+	if not unit:
+		unit = purchase.si_unit
+
+	unit_conversion_ratio = get_unit_conversion_ratio(purchase.unit, unit, density=density)
+
+	quantity = Decimal(quantity)
+
+	# Dividing once, at the end, means that the price is only rounded once.
+	price = purchase_price * quantity * unit_conversion_ratio.denominator
+	price /= purchase_quantity * unit_conversion_ratio.numerator
+
+	return round(price, 2)
+
+# Return a dict mapping each of the given food item ids to its newest FoodPurchase.
+# Food items which have never been purchased are not included.
+def get_newest_purchases(food_item_ids):
+	food_item_ids = set(food_item_ids)
+
+	if not food_item_ids:
+		return {}
+
+	# The newest purchase of each food item is stored on the food item itself,
+	# so this is a primary key lookup rather than a sort of the purchase history.
+	food_item_model = FoodPurchase._meta.get_field('food_item').related_model
+	latest_purchase_ids = food_item_model.objects.filter(pk__in=food_item_ids).values('latest_purchase')
+
+	purchases = FoodPurchase.objects.filter(pk__in=latest_purchase_ids).select_related('food_item')
+
+	return {purchase.food_item_id: purchase for purchase in purchases}
+
+# Return the prices of the ingredients' quantities in fixed point, as an int64 array in the same order as the ingredients,
+# along with a boolean array of which ingredients have a price.
+# An ingredient has no price if its food item has never been purchased, if the ingredient's unit
+# cannot be converted to the unit of the purchase, or if there is no exchange rate for the purchase.
+def get_fixed_point_ingredient_prices(ingredients, currency=None):
+	newest_purchases = get_newest_purchases(ingredient.food_item_id for ingredient in ingredients)
+
+	prices = np.zeros(len(ingredients), dtype=np.int64)
+	priced = np.zeros(len(ingredients), dtype=bool)
+
+	indexes = []
+	purchases = []
+	purchase_unit_ids = []
+	unit_ids = []
+
+	for index, ingredient in enumerate(ingredients):
+		purchase = newest_purchases.get(ingredient.food_item_id)
+
+		if purchase is None:
+			continue
+
+		try:
+			purchase_unit_id = get_unit_id(purchase.unit)
+			unit_id = get_unit_id(ingredient.unit)
+		except UnitConversionError:
+			continue
+
+		indexes.append(index)
+		purchases.append(purchase)
+		purchase_unit_ids.append(purchase_unit_id)
+		unit_ids.append(unit_id)
+
+	if not indexes:
+		return prices, priced
+
+	# All the purchase prices are converted into the currency together.
+	purchase_prices = convert(
+		[purchase.price_amount for purchase in purchases],
+		[purchase.currency for purchase in purchases],
+		[purchase.date for purchase in purchases],
+		currency
+	)
+
+	converted = np.array([price is not None for price in purchase_prices], dtype=bool)
+
+	prices[indexes], priced[indexes] = fixed_point.calculate_prices(
+		fixed_point.to_fixed_point(price or 0 for price in purchase_prices),
+		fixed_point.to_fixed_point(purchase.quantity for purchase in purchases),
+		purchase_unit_ids,
+		fixed_point.to_fixed_point(ingredients[index].quantity for index in indexes),
+		unit_ids,
+		densities=[purchase.food_item.density for purchase in purchases]
+	)
+
+	priced[indexes] &= converted
+
+	return prices, priced
+
+# Return a dict mapping each ingredient id to the price of the ingredient's quantity.
+# The price is None if the ingredient has no price (see get_fixed_point_ingredient_prices).
+@time_pricing('ingredient_prices')
+def get_ingredient_prices(ingredients, currency=None):
+	ingredients = list(ingredients)
+	prices, priced = get_fixed_point_ingredient_prices(ingredients, currency=currency)
+
+	return {
+		ingredient.id: fixed_point.from_fixed_point(price) if is_priced else None
+		for ingredient, price, is_priced in zip(ingredients, prices, priced)
+	}
+
+# Return a dict mapping each meal id to the newest total price of its ingredients.
+# Ingredients which have no price are left out of the total.
+# Meals without any ingredients have a price of None.
+# If the meals' ingredients (or their prices) have already been loaded, they can be passed in to avoid fetching them again.
+@time_pricing('meal_prices')
+def get_meal_prices(meals, currency=None, ingredients=None, ingredient_prices=None):
+	meal_ids = [meal.id if hasattr(meal, 'id') else meal for meal in meals]
+	meal_indexes = {meal_id: index for index, meal_id in enumerate(dict.fromkeys(meal_ids))}
+
+	if ingredients is None:
+		ingredients = StandardIngredient.objects.filter(meal_id__in=meal_ids)
+
+	ingredients = list(ingredients)
+
+	if ingredient_prices is None:
+		prices, priced = get_fixed_point_ingredient_prices(ingredients, currency=currency)
+	else:
+		priced = np.array([ingredient_prices[ingredient.id] is not None for ingredient in ingredients], dtype=bool)
+		prices = fixed_point.to_fixed_point(ingredient_prices[ingredient.id] or 0 for ingredient in ingredients)
+
+	groups = np.array([meal_indexes[ingredient.meal_id] for ingredient in ingredients], dtype=np.intp)
+
+	totals = fixed_point.sum_groups(np.where(priced, prices, 0), groups, len(meal_indexes))
+	has_ingredients = np.zeros(len(meal_indexes), dtype=bool)
+	has_ingredients[groups] = True
+
+	return {
+		meal_id: fixed_point.from_fixed_point(totals[index]) if has_ingredients[index] else None
+		for meal_id, index in meal_indexes.items()
+	}
+
+# Historical prices.
+#
+# The price of a meal on a date uses the newest purchase of each of its ingredients on or before that date.
+# The purchases which may be in effect on the dates are loaded in one query, sorted by food item and date,
+# and each (ingredient, date) pair is matched to its purchase with a binary search of the sorted purchases.
+# So pricing every meal a user has ever cooked takes a fixed number of queries, rather than one per ingredient and date.
+
+# Dates are combined with food item ids into a single sort key, as food_item_id * DATE_KEY_RANGE + date ordinal.
+DATE_KEY_RANGE = date.max.toordinal() + 1
+
+# Meals priced with up to MAX_AS_OF_PAIRS different (food item, date) pairs, such as a page of meal instances, only load
+# the newest purchase of each food item on or before each date. Meals priced with more pairs, such as by a rollup, load
+# every purchase of the food items between the first and last dates instead, as that takes fewer index seeks.
+# The limit also keeps the query within SQLite's limit of 500 SELECTs in a UNION.
+MAX_AS_OF_PAIRS = 500
+
+PURCHASE_FIELDS = ['food_item_id', 'date', 'price_amount', 'currency', 'quantity', 'unit']
+
+def _get_newest_purchase_on(date_filter):
+	return FoodPurchase.objects.filter(food_item=models.OuterRef('pk'), **date_filter).order_by('-date', '-id').values('pk')[:1]
+
+# Return the newest purchase of each food item on or before each date, for the food items and dates of the pairs,
+# which are food_item_id * DATE_KEY_RANGE + date ordinal keys. Each purchase is found with one seek of
+# meals_purchase_item_date_idx, in a single query with a SELECT for each date.
+def _get_purchases_as_of(pair_keys):
+	keys = np.unique(pair_keys)
+	food_item_ids = keys // DATE_KEY_RANGE
+	dates = keys % DATE_KEY_RANGE
+
+	food_item_model = FoodPurchase._meta.get_field('food_item').related_model
+	newest_purchases = [
+		food_item_model.objects.filter(
+			pk__in=food_item_ids[dates == ordinal].tolist()
+		).values_list(models.Subquery(_get_newest_purchase_on({'date__lte': date.fromordinal(ordinal)})), flat=True)
+		for ordinal in np.unique(dates).tolist()
+	]
+
+	return FoodPurchase.objects.filter(
+		pk__in=newest_purchases[0].union(*newest_purchases[1:], all=True)
+	).order_by('food_item_id', 'date', 'id').values_list(*PURCHASE_FIELDS)
+
+# Return every purchase of the food items between the first and last dates, along with the newest purchase of each
+# before the first date, which is in effect on the first date.
+def _get_purchases_between(food_item_ids, first_date, last_date):
+	food_item_model = FoodPurchase._meta.get_field('food_item').related_model
+	newest_purchases_before = food_item_model.objects.filter(
+		pk__in=food_item_ids
+	).values_list(models.Subquery(_get_newest_purchase_on({'date__lt': first_date})), flat=True)
+
+	return FoodPurchase.objects.filter(
+		models.Q(food_item_id__in=food_item_ids, date__gte=first_date, date__lte=last_date) |
+		models.Q(pk__in=newest_purchases_before)
+	).order_by('food_item_id', 'date', 'id').values_list(*PURCHASE_FIELDS)
+
+# Return an array of the IDs of the units, with -1 for any units which are unknown.
+def _get_unit_ids_or_missing(units):
+	unit_ids = []
+
+	for unit in units:
+		try:
+			unit_ids.append(get_unit_id(unit))
+		except UnitConversionError:
+			unit_ids.append(-1)
+
+	return np.array(unit_ids, dtype=np.intp)
+
+# The prices of the ingredients of meals on dates, as calculated by get_ingredient_prices_on().
+# The ingredients are (meal id, food item id, quantity, unit, density, id) tuples, sorted by meal.
+# The ingredients of the meal of date i are ingredients[starts[i]:starts[i] + counts[i]].
+# Each priced (ingredient, date) pair has an entry in pair_groups (the index of the date),
+# pair_ingredients (the index of the ingredient) and prices (the price in fixed point).
+class IngredientPricesOn:
+
+	def __init__(self, ingredients, starts, counts, pair_groups, pair_ingredients, prices):
+		self.ingredients = ingredients
+		self.starts = starts
+		self.counts = counts
+		self.pair_groups = pair_groups
+		self.pair_ingredients = pair_ingredients
+		self.prices = prices
+
+	@property
+	def has_ingredients(self):
+		return self.counts > 0
+
+	# Return the total price of the meal of each date, in fixed point.
+	def get_totals(self):
+		return fixed_point.sum_groups(self.prices, self.pair_groups, len(self.counts))
+
+# Return the prices of the ingredients of the meals on the dates, which are (meal id, date) pairs, as IngredientPricesOn.
+# Ingredients which have no price on a date, because their food item had not been purchased by then,
+# or their units cannot be converted, or there is no exchange rate, have no pair.
+@time_pricing('ingredient_prices_on')
+def get_ingredient_prices_on(meal_dates, currency=None):
+	meal_dates = list(meal_dates)
+
+	meal_ids = np.array([meal_id for meal_id, _ in meal_dates], dtype=np.int64)
+	dates = np.array([meal_date.toordinal() for _, meal_date in meal_dates], dtype=np.int64)
+
+	ingredients = []
+
+	if meal_dates:
+		ingredients = list(StandardIngredient.objects.filter(
+			meal_id__in=set(meal_ids.tolist())
+		).order_by('meal_id', 'id').values_list('meal_id', 'food_item_id', 'quantity', 'unit', 'food_item__density', 'id'))
+
+	ingredient_meal_ids = np.array([ingredient[0] for ingredient in ingredients], dtype=np.int64)
+	ingredient_food_item_ids = np.array([ingredient[1] for ingredient in ingredients], dtype=np.int64)
+
+	# Pair each date with each of its meal's ingredients. The ingredients of each meal are contiguous,
+	# as they are sorted by meal, so the pairs are made from the range of ingredients of each meal.
+	starts = np.searchsorted(ingredient_meal_ids, meal_ids, side='left')
+	counts = np.searchsorted(ingredient_meal_ids, meal_ids, side='right') - starts
+
+	pair_groups = np.repeat(np.arange(len(meal_dates)), counts)
+	pair_ingredients = np.repeat(starts, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+	no_prices = IngredientPricesOn(ingredients, starts, counts, pair_groups[:0], pair_ingredients[:0], np.zeros(0, dtype=np.int64))
+
+	if not len(pair_groups):
+		return no_prices
+
+	pair_food_item_ids = ingredient_food_item_ids[pair_ingredients]
+	pair_keys = pair_food_item_ids * DATE_KEY_RANGE + dates[pair_groups]
+
+	if len(np.unique(pair_keys)) <= MAX_AS_OF_PAIRS:
+		purchases = list(_get_purchases_as_of(pair_keys))
+	else:
+		purchases = list(_get_purchases_between(
+			set(pair_food_item_ids.tolist()),
+			date.fromordinal(int(dates[pair_groups].min())),
+			date.fromordinal(int(dates[pair_groups].max()))
+		))
+
+	if not purchases:
+		return no_prices
+
+	purchase_food_item_ids = np.array([purchase[0] for purchase in purchases], dtype=np.int64)
+	purchase_keys = purchase_food_item_ids * DATE_KEY_RANGE + np.array([purchase[1].toordinal() for purchase in purchases], dtype=np.int64)
+
+	# The newest purchase of each pair's food item on or before its date is the last purchase with a key no greater than the pair's.
+	# Purchases on the same date are sorted by id, so the newest of them is chosen, as in FoodItem.latest_purchase.
+	# The purchases loaded include each pair's purchase and no newer purchase of its food item on or before its date,
+	# so the same search finds it whichever purchases were loaded.
+	pair_purchases = np.searchsorted(purchase_keys, pair_keys, side='right') - 1
+	found = pair_purchases >= 0
+	found[found] = purchase_food_item_ids[pair_purchases[found]] == pair_food_item_ids[found]
+
+	pair_groups = pair_groups[found]
+	pair_ingredients = pair_ingredients[found]
+	pair_purchases = pair_purchases[found]
+
+	# Only the purchases which are used are converted into the currency, and into fixed point.
+	used_purchases, pair_purchases = np.unique(pair_purchases, return_inverse=True)
+	used_purchases = [purchases[index] for index in used_purchases]
+
+	purchase_prices = convert(
+		[purchase[2] for purchase in used_purchases],
+		[purchase[3] for purchase in used_purchases],
+		[purchase[1] for purchase in used_purchases],
+		currency
+	)
+
+	purchase_unit_ids = _get_unit_ids_or_missing(purchase[5] for purchase in used_purchases)
+	ingredient_unit_ids = _get_unit_ids_or_missing(ingredient[3] for ingredient in ingredients)
+
+	valid = (
+		np.array([price is not None for price in purchase_prices], dtype=bool)[pair_purchases] &
+		(purchase_unit_ids[pair_purchases] >= 0) &
+		(ingredient_unit_ids[pair_ingredients] >= 0)
+	)
+
+	prices, priced = fixed_point.calculate_prices(
+		fixed_point.to_fixed_point(price or 0 for price in purchase_prices)[pair_purchases],
+		fixed_point.to_fixed_point(purchase[4] for purchase in used_purchases)[pair_purchases],
+		np.maximum(purchase_unit_ids[pair_purchases], 0),
+		fixed_point.to_fixed_point(ingredient[2] for ingredient in ingredients)[pair_ingredients],
+		np.maximum(ingredient_unit_ids[pair_ingredients], 0),
+		densities=[ingredients[index][4] for index in pair_ingredients]
+	)
+
+	priced &= valid
+
+	return IngredientPricesOn(ingredients, starts, counts, pair_groups[priced], pair_ingredients[priced], prices[priced])
+
+# Return the prices of the meals on the dates, which are (meal id, date) pairs, in fixed point as an int64 array
+# in the same order, along with a boolean array of which meals have any ingredients.
+# Ingredients which have no price on a date are left out of the total, as in get_meal_prices().
+def get_fixed_point_meal_prices_on(meal_dates, currency=None):
+	ingredient_prices = get_ingredient_prices_on(meal_dates, currency=currency)
+
+	return ingredient_prices.get_totals(), ingredient_prices.has_ingredients
+
+# Return the prices of the meals on the dates, which are (meal id, date) pairs, as a list in the same order.
+# Meals without any ingredients have a price of None.
+def get_meal_prices_on(meal_dates, currency=None):
+	totals, has_ingredients = get_fixed_point_meal_prices_on(meal_dates, currency=currency)
+
+	return [
+		fixed_point.from_fixed_point(total) if meal_has_ingredients else None
+		for total, meal_has_ingredients in zip(totals, has_ingredients)
+	]
+
+# Return a dict mapping the id of each meal instance to the cost of the meal on the day it was made,
+# and the cost per serving. Both are None if the meal has no ingredients, and the cost per serving is None
+# if the meal instance has no servings.
+def get_meal_instance_costs(meal_instances, currency=None):
+	meal_instances = list(meal_instances)
+
+	totals, has_ingredients = get_fixed_point_meal_prices_on(
+		[(meal_instance.meal_id, meal_instance.date) for meal_instance in meal_instances],
+		currency=currency
+	)
+
+	num_servings = np.array([meal_instance.num_servings for meal_instance in meal_instances], dtype=np.int64)
+	per_serving = fixed_point.divide_round_half_even(totals, np.maximum(num_servings, 1))
+
+	costs = {}
+
+	for index, meal_instance in enumerate(meal_instances):
+		if not has_ingredients[index]:
+			costs[meal_instance.id] = (None, None)
+			continue
+
+		costs[meal_instance.id] = (
+			fixed_point.from_fixed_point(totals[index]),
+			fixed_point.from_fixed_point(per_serving[index]) if num_servings[index] > 0 else None
+		)
+
+	return costs
+
+# Format a meal price as returned by get_meal_prices for display.
+def format_meal_price(meal_price, currency=None):
+	if meal_price is None:
+		return 0
+
+	if currency is None:
+		currency = settings.DEFAULT_CURRENCY
+
+	meal_price = round(meal_price, 2)
+
+	return f'{meal_price} {currency}'
+
+# Format an ingredient price as returned by get_ingredient_prices for display.
+def format_ingredient_price(ingredient_price, currency=None):
+	if ingredient_price is None:
+		return 'N/A'
+
+	if currency is None:
+		currency = settings.DEFAULT_CURRENCY
+
+	return f'{ingredient_price} {currency}'
@@ -0,0 +1,260 @@
+import sys
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+from threading import Lock
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Node, Template
+
+# Opt-in profiling of each request, enabled by settings.PROFILING_ENABLED.
+#
+# ProfilingMiddleware records the wall time of each request, the number and duration of its SQL queries
+# (through connection.execute_wrapper()), and the time spent rendering templates. Queries which are run
+# more than once in a request, usually by a loop calling a method for each row, are reported along with
+# where they were run from: the first frame in the project's code, and the template tag or variable
+# being rendered, if any. The figures are sent in a Server-Timing header, so they show up in the
+# browser's developer tools, and recent figures for each view are kept in memory for the /_perf/ page.
+
+# The timings of the request being profiled, in this thread or task.
+current_profile = ContextVar('current_profile', default=None)
+
+PROJECT_DIR = str(settings.BASE_DIR)
+
+# Upper bounds of the buckets of the latency histograms, in milliseconds.
+HISTOGRAM_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, float('inf')]
+
+class RequestProfile:
+
+	def __init__(self):
+		self.start = time.perf_counter()
+		self.duration = None
+		self.num_queries = 0
+		self.query_duration = 0
+		self.template_duration = 0
+		self.template_depth = 0
+		self.query_counts = Counter()
+		self.query_origins = {}
+
+	def record_query(self, sql, duration):
+		self.num_queries += 1
+		self.query_duration += duration
+		self.query_counts[sql] += 1
+
+		if sql not in self.query_origins:
+			self.query_origins[sql] = get_query_origin()
+
+	def finish(self):
+		self.duration = time.perf_counter() - self.start
+
+	# Return the queries which were run more than once, with the number of times each was run and where it was first run from.
+	def get_duplicate_queries(self):
+		return [
+			{'sql': sql, 'count': count, 'origin': self.query_origins[sql]}
+			for sql, count in self.query_counts.most_common()
+			if count > 1
+		]
+
+	def get_server_timing(self):
+		num_duplicates = sum(count - 1 for count in self.query_counts.values() if count > 1)
+
+		return ', '.join([
+			f'total;dur={self.duration * 1000:.1f}',
+			f'db;dur={self.query_duration * 1000:.1f};desc="{self.num_queries} queries"',
+			f'tpl;dur={self.template_duration * 1000:.1f}',
+			f'dup;desc="{num_duplicates} duplicate queries"',
+		])
+
+# Return where the current query was run from: the innermost frame in the project's own code,
+# and the template tag or variable being rendered, if a template is being rendered.
+def get_query_origin():
+	code_origin = None
+	template_origin = None
+	frame = sys._getframe(1)
+
+	while frame is not None and (code_origin is None or template_origin is None):
+		filename = frame.f_code.co_filename
+
+		if code_origin is None and filename.startswith(PROJECT_DIR) and filename != __file__ and 'site-packages' not in filename:
+			code_origin = f'{filename[len(PROJECT_DIR) + 1:]}:{frame.f_lineno} in {frame.f_code.co_name}'
+
+		if template_origin is None:
+			node = frame.f_locals.get('self')
+
+			# type() is used rather than isinstance(), which would evaluate lazy objects such as request.user.
+			if issubclass(type(node), Node) and getattr(node, 'origin', None) is not None and getattr(node, 'token', None) is not None:
+				template_origin = f'{node.origin.template_name}:{node.token.lineno} {node.token.contents}'
+
+		frame = frame.f_back
+
+	return {'code': code_origin, 'template': template_origin}
+
+# An execute wrapper which times each query of the current request.
+def time_query(execute, sql, params, many, context):
+	profile = current_profile.get()
+
+	if profile is None:
+		return execute(sql, params, many, context)
+
+	start = time.perf_counter()
+
+	try:
+		return execute(sql, params, many, context)
+	finally:
+		profile.record_query(sql, time.perf_counter() - start)
+
+_original_template_render = Template.render
+
+# Time the rendering of each template. Templates included by other templates are timed as part of the outermost template.
+def _render_template(self, context):
+	profile = current_profile.get()
+
+	if profile is None:
+		return _original_template_render(self, context)
+
+	start = time.perf_counter()
+	profile.template_depth += 1
+
+	try:
+		return _original_template_render(self, context)
+	finally:
+		profile.template_depth -= 1
+
+		if profile.template_depth == 0:
+			profile.template_duration += time.perf_counter() - start
+
+# Recent timings of each view, kept in memory in each process.
+class ProfileStats:
+
+	def __init__(self, window_size):
+		self.window_size = window_size
+		self._lock = Lock()
+		self.reset()
+
+	def reset(self):
+		self._views = {}
+
+	def record(self, view_name, profile):
+		with self._lock:
+			view = self._views.setdefault(view_name, {
+				'count': 0,
+				'samples': deque(maxlen=self.window_size),
+				'duplicate_queries': [],
+			})
+
+			view['count'] += 1
+			view['samples'].append((profile.duration, profile.num_queries, profile.query_duration, profile.template_duration))
+
+			duplicate_queries = profile.get_duplicate_queries()
+
+			if duplicate_queries:
+				view['duplicate_queries'] = duplicate_queries
+
+	def as_dict(self):
+		with self._lock:
+			views = {view_name: (view['count'], list(view['samples']), view['duplicate_queries']) for view_name, view in self._views.items()}
+
+		return {
+			view_name: {
+				'count': count,
+				'window': len(samples),
+				'latency_ms': _summarise([sample[0] * 1000 for sample in samples]),
+				'histogram_ms': _get_histogram([sample[0] * 1000 for sample in samples]),
+				'queries': _summarise([sample[1] for sample in samples]),
+				'query_ms': _summarise([sample[2] * 1000 for sample in samples]),
+				'template_ms': _summarise([sample[3] * 1000 for sample in samples]),
+				'duplicate_queries': duplicate_queries,
+			}
+			for view_name, (count, samples, duplicate_queries) in sorted(views.items())
+		}
+
+def _percentile(sorted_values, percentile):
+	return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percentile / 100))]
+
+def _summarise(values):
+	values = sorted(values)
+
+	if not values:
+		return {}
+
+	return {
+		'mean': round(sum(values) / len(values), 2),
+		'p50': round(_percentile(values, 50), 2),
+		'p95': round(_percentile(values, 95), 2),
+		'p99': round(_percentile(values, 99), 2),
+		'max': round(values[-1], 2),
+	}
+
+def _get_histogram(values):
+	counts = Counter()
+
+	for value in values:
+		counts[next(bucket for bucket in HISTOGRAM_BUCKETS if value <= bucket)] += 1
+
+	return {('+Inf' if bucket == float('inf') else str(bucket)): counts[bucket] for bucket in HISTOGRAM_BUCKETS}
+
+stats = ProfileStats(settings.PROFILING_WINDOW_SIZE)
+
+# Under ASGI the middleware is async, so that async views are not run in a thread for it.
+# The profile is kept in a context variable, which sync_to_async() copies to the thread the view's queries and templates are run in.
+class ProfilingMiddleware:
+	sync_capable = True
+	async_capable = True
+
+	def __init__(self, get_response):
+		if not settings.PROFILING_ENABLED:
+			raise MiddlewareNotUsed()
+
+		self.get_response = get_response
+		Template.render = _render_template
+
+		if iscoroutinefunction(get_response):
+			markcoroutinefunction(self)
+
+	def __call__(self, request):
+		if iscoroutinefunction(self):
+			return self.__acall__(request)
+
+		profile = RequestProfile()
+		token = current_profile.set(profile)
+
+		try:
+			with ExitStack() as stack:
+				for connection in connections.all():
+					stack.enter_context(connection.execute_wrapper(time_query))
+
+				response = self.get_response(request)
+		finally:
+			current_profile.reset(token)
+
+		return self.record(request, response, profile)
+
+	async def __acall__(self, request):
+		profile = RequestProfile()
+		token = current_profile.set(profile)
+
+		try:
+			with ExitStack() as stack:
+				for connection in await sync_to_async(connections.all)():
+					stack.enter_context(connection.execute_wrapper(time_query))
+
+				response = await self.get_response(request)
+		finally:
+			current_profile.reset(token)
+
+		return self.record(request, response, profile)
+
+	def record(self, request, response, profile):
+		profile.finish()
+
+		response['Server-Timing'] = profile.get_server_timing()
+
+		# Requests which do not match a URL are recorded together, so that the number of views recorded is bounded.
+		match = request.resolver_match
+		stats.record(match.view_name if match else '<unresolved>', profile)
+
+		return response
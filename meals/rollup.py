@@ -0,0 +1,163 @@
+from datetime import date, timedelta
+from functools import reduce
+from itertools import islice
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from meals import fixed_point
+from meals.models import MealCostChange, MealCostRollup, MealCostSnapshot, StandardIngredient
+from meals.pricing import get_ingredient_prices_on
+
+# Incremental rollups of the daily cost of every meal into MealCostSnapshots.
+#
+# Changes to purchases, ingredients, densities and exchange rates are recorded as MealCostChanges (see meals/signals.py
+# and FoodPurchaseQuerySet). Each rollup processes the changes recorded since the last one, recalculating only the
+# snapshots of the meals and days they affect, and adds snapshots for the days since the last rollup's high-water mark.
+# Snapshots are kept for settings.MEAL_COST_SNAPSHOT_DAYS days. Older snapshots are left as they are.
+
+class RollupResult:
+
+	def __init__(self):
+		self.num_changes = 0
+		self.num_meals = 0
+		self.num_snapshots = 0
+
+# Return a dict mapping the id of each affected meal to the first date from which its snapshots must be recalculated.
+def _get_affected_meals(state, changes, first_date, last_date):
+	all_meal_ids = StandardIngredient.objects.values_list('meal_id', flat=True).distinct()
+	affected_meals = {}
+
+	def affect(meal_ids, from_date):
+		from_date = max(from_date or first_date, first_date)
+
+		for meal_id in meal_ids:
+			affected_meals[meal_id] = min(from_date, affected_meals.get(meal_id, from_date))
+
+	# Every meal needs snapshots of the days since the high-water mark.
+	if state.last_date < last_date:
+		affect(all_meal_ids, state.last_date + timedelta(days=1))
+
+	food_item_dates = {}
+
+	for _, meal_id, food_item_id, change_date in changes:
+		if meal_id is not None:
+			affect([meal_id], change_date)
+		elif food_item_id is not None:
+			food_item_dates.setdefault(food_item_id, []).append(change_date or first_date)
+		else:
+			affect(all_meal_ids, change_date)
+
+	if food_item_dates:
+		ingredients = StandardIngredient.objects.filter(food_item_id__in=food_item_dates).values_list('meal_id', 'food_item_id')
+
+		for meal_id, food_item_id in ingredients:
+			affect([meal_id], min(food_item_dates[food_item_id]))
+
+	# Changes from after the last date do not affect any snapshots yet.
+	return {meal_id: from_date for meal_id, from_date in affected_meals.items() if from_date <= last_date}
+
+def _get_batches(items, batch_size):
+	items = iter(items)
+
+	while batch := list(islice(items, batch_size)):
+		yield batch
+
+# Calculate and save the snapshots of the meals, from their first dates to the last date.
+# Returns the number of snapshots saved.
+def _save_snapshots(meal_dates, last_date, currency):
+	pairs = [
+		(meal_id, from_date + timedelta(days=day))
+		for meal_id, from_date in meal_dates.items()
+		for day in range((last_date - from_date).days + 1)
+	]
+
+	ingredient_prices = get_ingredient_prices_on(pairs, currency=currency)
+	totals = ingredient_prices.get_totals()
+
+	breakdowns = [{} for _ in pairs]
+
+	for group, ingredient_index, price in zip(ingredient_prices.pair_groups, ingredient_prices.pair_ingredients, ingredient_prices.prices):
+		breakdowns[group][str(ingredient_prices.ingredients[ingredient_index][5])] = str(fixed_point.from_fixed_point(price))
+
+	snapshots = []
+
+	for index, (meal_id, snapshot_date) in enumerate(pairs):
+		if not ingredient_prices.has_ingredients[index]:
+			continue
+
+		start = ingredient_prices.starts[index]
+		ingredient_ids = [str(ingredient[5]) for ingredient in ingredient_prices.ingredients[start:start + ingredient_prices.counts[index]]]
+
+		snapshots.append(MealCostSnapshot(
+			meal_id=meal_id,
+			date=snapshot_date,
+			currency=currency,
+			total=fixed_point.from_fixed_point(totals[index]),
+			ingredient_prices={ingredient_id: breakdowns[index].get(ingredient_id) for ingredient_id in ingredient_ids}
+		))
+
+	MealCostSnapshot.objects.bulk_create(
+		snapshots,
+		batch_size=1000,
+		update_conflicts=True,
+		unique_fields=['meal', 'date'],
+		update_fields=['currency', 'total', 'ingredient_prices']
+	)
+
+	# Meals which no longer have any ingredients have no cost.
+	meals_without_ingredients = {meal_id for index, (meal_id, _) in enumerate(pairs) if not ingredient_prices.has_ingredients[index]}
+
+	if meals_without_ingredients:
+		MealCostSnapshot.objects.filter(
+			reduce(or_, [Q(meal_id=meal_id, date__gte=meal_dates[meal_id]) for meal_id in meals_without_ingredients])
+		).delete()
+
+	return len(snapshots)
+
+# Bring the meal cost snapshots up to date, up to and including the last date (today by default).
+# The first rollup, or a rollup in a different currency to the last, calculates every snapshot in the period.
+def rollup_meal_costs(last_date=None, currency=None, days=None, batch_size=None):
+	last_date = last_date or date.today()
+	currency = currency or settings.DEFAULT_CURRENCY
+	days = days or settings.MEAL_COST_SNAPSHOT_DAYS
+	batch_size = batch_size or settings.MEAL_COST_ROLLUP_BATCH_SIZE
+
+	first_date = last_date - timedelta(days=days - 1)
+	result = RollupResult()
+
+	with transaction.atomic():
+		# Locking the high-water mark stops rollups from running at the same time.
+		state = MealCostRollup.objects.select_for_update().first()
+
+		# Changes are read and deleted by id, so changes committed while the rollup is running are left for the next one.
+		changes = list(MealCostChange.objects.order_by('id').values_list('id', 'meal_id', 'food_item_id', 'date'))
+		result.num_changes = len(changes)
+
+		if state is None or state.currency != currency:
+			MealCostSnapshot.objects.all().delete()
+
+			state = state or MealCostRollup()
+			state.currency = currency
+			state.last_date = first_date - timedelta(days=1)
+
+		# The changes are deleted once they have been applied, so a rollup of a date before the high-water mark
+		# still recalculates the snapshots they affect up to the high-water mark. Changes to later days need
+		# no recording, as every snapshot after the high-water mark is calculated when it moves on.
+		last_date = max(state.last_date, last_date)
+
+		affected_meals = _get_affected_meals(state, changes, first_date, last_date)
+		result.num_meals = len(affected_meals)
+
+		for meal_ids in _get_batches(sorted(affected_meals), batch_size):
+			result.num_snapshots += _save_snapshots({meal_id: affected_meals[meal_id] for meal_id in meal_ids}, last_date, currency)
+
+		for change_ids in _get_batches([change[0] for change in changes], 1000):
+			MealCostChange.objects.filter(id__in=change_ids).delete()
+
+		state.last_date = last_date
+		state.save()
+
+	return result
@@ -0,0 +1,267 @@
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import models
+from django.db.models.functions import RowNumber
+
+from meals import fixed_point
+from meals.currency import convert
+from meals.helper import COUNT, MASS, UNITS, VOLUME, UnitConversionError, get_unit_id
+from meals.models import FoodPurchase, MealInstance, StandardIngredient
+from meals.validators import MealValidators
+
+# The shopping list for cooking a set of meals, each for a number of servings.
+#
+# The ingredients of all the meals are loaded in one query, with the number of servings each meal makes, which is
+# the average number it has been cooked for. Each ingredient's quantity is scaled to the servings wanted, converted
+# to the base unit of its dimension (see meals/helper.py), and summed per food item and dimension with NumPy.
+# Volumes are added to masses when the food item's density is known. Each total is given in a metric unit:
+# kg or g, l or ml, or tsp or tbsp when the food item is only measured in spoons.
+#
+# The newest purchase of each food item at each location is loaded in a second query. The cost of each line is
+# calculated at every location at once in fixed point (see meals/fixed_point.py), and the cheapest is chosen.
+
+# The units which volumes only measured in spoons are given in.
+SPOON_UNITS = ['tsp', 'tbsp']
+
+DIMENSIONS = [MASS, VOLUME, COUNT]
+
+QUANTITY_PLACES = Decimal('0.01')
+
+# Error to be raised when the query parameters of a shopping list are invalid.
+class ShoppingListParameterError(ValueError):
+	pass
+
+# Return a dict mapping the ids of the meals in a query parameter such as '1:4,2' to their servings,
+# or None for meals without servings, which are cooked for the servings they usually make.
+def parse_meals(value):
+	meal_servings = {}
+
+	for item in (value or '').split(','):
+		if not item.strip():
+			continue
+
+		meal_id, _, servings = item.partition(':')
+
+		try:
+			meal_id = int(meal_id)
+			servings = int(servings) if servings else None
+		except ValueError:
+			raise ShoppingListParameterError(f'meals must be a list of meal ids, each optionally followed by :servings. Got {value}.')
+
+		if servings is not None and servings < 1:
+			raise ShoppingListParameterError(f'The servings of meal {meal_id} must be at least 1. Got {servings}.')
+
+		meal_servings[meal_id] = servings
+
+	if not meal_servings:
+		raise ShoppingListParameterError('At least one meal must be given.')
+
+	return meal_servings
+
+def parse_currency(params):
+	currency = (params.get('currency') or settings.DEFAULT_CURRENCY).upper()
+
+	if not MealValidators.is_valid_currency(currency):
+		raise ShoppingListParameterError(f'Unsupported currency: {currency}.')
+
+	return currency
+
+class ShoppingListLine:
+
+	def __init__(self, food_item_id, name, quantity, unit, cost=None, location=None):
+		self.food_item_id = food_item_id
+		self.name = name
+		self.quantity = quantity
+		self.unit = unit
+		self.cost = cost
+		self.location = location
+
+	def as_dict(self):
+		return {
+			'food_item_id': self.food_item_id,
+			'name': self.name,
+			'quantity': str(self.quantity),
+			'unit': self.unit,
+			'cost': None if self.cost is None else str(self.cost),
+			'location': self.location,
+		}
+
+class ShoppingList:
+
+	def __init__(self, lines, currency):
+		self.lines = lines
+		self.currency = currency
+
+	# The total cost of the lines which could be priced.
+	@property
+	def total(self):
+		return sum((line.cost for line in self.lines if line.cost is not None), Decimal('0.00'))
+
+	def as_dict(self):
+		return {
+			'currency': self.currency,
+			'total': str(self.total),
+			'num_unpriced': sum(line.cost is None for line in self.lines),
+			'lines': [line.as_dict() for line in self.lines],
+		}
+
+# Return the ingredients of the user's meals, as (meal id, food item id, food item name, density, quantity, unit,
+# the number of servings the meal makes) tuples.
+def get_ingredients(user, meal_ids):
+	meal_servings = MealInstance.objects.filter(meal=models.OuterRef('meal')).values('meal').annotate(
+		avg=models.Avg('num_servings')
+	).values('avg')
+
+	return list(StandardIngredient.objects.filter(meal__user=user, meal_id__in=meal_ids).annotate(
+		meal_servings=models.Subquery(meal_servings, output_field=models.FloatField())
+	).order_by('pk').values_list('meal_id', 'food_item_id', 'food_item__name', 'food_item__density', 'quantity', 'unit', 'meal_servings'))
+
+# Return the newest purchase of each of the food items at each location, as lists of dicts by food item id.
+def get_location_purchases(food_item_ids):
+	purchases = FoodPurchase.objects.filter(food_item_id__in=food_item_ids).annotate(
+		row_number=models.Window(
+			RowNumber(),
+			partition_by=[models.F('food_item_id'), models.F('location')],
+			order_by=[models.F('date').desc(), models.F('id').desc()],
+		)
+	).filter(row_number=1).order_by('food_item_id', 'location').values('food_item_id', 'location', 'price_amount', 'currency', 'quantity', 'unit', 'date')
+
+	location_purchases = {}
+
+	for purchase in purchases:
+		location_purchases.setdefault(purchase['food_item_id'], []).append(purchase)
+
+	return location_purchases
+
+# Sum the ingredients' quantities per food item and dimension. Returns the lines, without costs, sorted by name.
+def merge_ingredients(ingredients, meal_servings):
+	if not ingredients:
+		return []
+
+	meal_ids, food_item_ids, names, densities, quantities, units, usual_servings = zip(*ingredients)
+
+	known = np.array([unit.lower() in UNITS for unit in units], dtype=bool)
+	units = [unit.lower() if unit.lower() in UNITS else 'pc' for unit in units]
+	dimensions = np.array([DIMENSIONS.index(UNITS[unit][0]) for unit in units], dtype=np.intp)
+	unit_sizes = np.array([UNITS[unit][1] for unit in units], dtype=np.float64)
+
+	# Meals are scaled from the servings they usually make, or not at all if they have never been cooked.
+	wanted = np.array([meal_servings.get(meal_id) or np.nan for meal_id in meal_ids], dtype=np.float64)
+	usual = np.array([np.nan if servings is None else servings for servings in usual_servings], dtype=np.float64)
+	factors = np.where(np.isnan(wanted) | np.isnan(usual) | (usual == 0), 1.0, wanted / usual)
+
+	amounts = np.array([float(quantity) for quantity in quantities], dtype=np.float64) * factors * unit_sizes
+
+	# Volumes of food items with a density are converted to masses: 1 µl is density / 1000 g, which is density * 10 base units.
+	densities = np.array([np.nan if density is None else float(density) for density in densities], dtype=np.float64)
+	to_mass = (dimensions == DIMENSIONS.index(VOLUME)) & (densities > 0)
+	amounts = np.where(to_mass, amounts * densities * 10, amounts)
+	dimensions = np.where(to_mass, DIMENSIONS.index(MASS), dimensions)
+
+	# Ingredients in units which are not known cannot be added to others, so they have lines of their own.
+	keys = np.array(food_item_ids, dtype=np.int64) * (len(DIMENSIONS) + 1) + np.where(known, dimensions, len(DIMENSIONS))
+	keys = np.where(known, keys, -np.arange(1, len(keys) + 1))
+
+	groups, first_indexes, inverse = np.unique(keys, return_index=True, return_inverse=True)
+	totals = np.bincount(inverse, weights=amounts, minlength=len(groups))
+	num_spoons = np.bincount(inverse, weights=np.isin(units, SPOON_UNITS) & ~to_mass, minlength=len(groups))
+	num_ingredients = np.bincount(inverse, minlength=len(groups))
+
+	lines = []
+
+	for group, index in enumerate(first_indexes):
+		if not known[index]:
+			lines.append(ShoppingListLine(food_item_ids[index], names[index], Decimal(str(round(float(quantities[index]) * factors[index], 2))).quantize(QUANTITY_PLACES), ingredients[index][5]))
+			continue
+
+		unit = _get_display_unit(DIMENSIONS[dimensions[index]], totals[group], num_spoons[group] == num_ingredients[group])
+		quantity = Decimal(str(round(totals[group] / UNITS[unit][1], 2))).quantize(QUANTITY_PLACES)
+
+		lines.append(ShoppingListLine(food_item_ids[index], names[index], quantity, unit))
+
+	return sorted(lines, key=lambda line: (line.name, line.unit))
+
+# The unit to give a total amount in base units in.
+def _get_display_unit(dimension, amount, only_spoons):
+	if dimension == MASS:
+		return 'kg' if amount >= UNITS['kg'][1] else 'g'
+
+	if dimension == VOLUME and only_spoons:
+		return 'tbsp' if amount >= UNITS['tbsp'][1] else 'tsp'
+
+	if dimension == VOLUME:
+		return 'l' if amount >= UNITS['l'][1] else 'ml'
+
+	return 'pc'
+
+# Set the cost and location of each line, from the cheapest of its food item's newest purchases at each location.
+# Lines which cannot be priced at any location, because the units cannot be converted or there is no exchange rate,
+# are left without a cost.
+def price_lines(lines, location_purchases, densities, currency):
+	line_indexes = []
+	purchases = []
+	purchase_unit_ids = []
+	unit_ids = []
+
+	for index, line in enumerate(lines):
+		try:
+			unit_id = get_unit_id(line.unit)
+		except UnitConversionError:
+			continue
+
+		for purchase in location_purchases.get(line.food_item_id, []):
+			try:
+				purchase_unit_ids.append(get_unit_id(purchase['unit']))
+			except UnitConversionError:
+				continue
+
+			line_indexes.append(index)
+			purchases.append(purchase)
+			unit_ids.append(unit_id)
+
+	if not purchases:
+		return
+
+	purchase_prices = convert(
+		[purchase['price_amount'] for purchase in purchases],
+		[purchase['currency'] for purchase in purchases],
+		[purchase['date'] for purchase in purchases],
+		currency
+	)
+
+	prices, priced = fixed_point.calculate_prices(
+		fixed_point.to_fixed_point(price or 0 for price in purchase_prices),
+		fixed_point.to_fixed_point(purchase['quantity'] for purchase in purchases),
+		purchase_unit_ids,
+		fixed_point.to_fixed_point(lines[index].quantity for index in line_indexes),
+		unit_ids,
+		densities=[densities.get(lines[index].food_item_id) for index in line_indexes]
+	)
+
+	priced &= np.array([price is not None for price in purchase_prices], dtype=bool)
+
+	# Sort the prices by line and then price, so that the first priced entry of each line is its cheapest.
+	line_indexes = np.array(line_indexes, dtype=np.intp)
+	order = np.lexsort((prices, line_indexes))
+	order = order[priced[order]]
+	cheapest_lines, first_entries = np.unique(line_indexes[order], return_index=True)
+
+	for line_index, entry in zip(cheapest_lines, order[first_entries]):
+		lines[line_index].cost = fixed_point.from_fixed_point(prices[entry])
+		lines[line_index].location = purchases[entry]['location']
+
+# Return the ShoppingList for the user's meals, given as a dict mapping meal ids to servings, or None to cook
+# a meal for the servings it usually makes.
+def get_shopping_list(user, meal_servings, currency=None):
+	if currency is None:
+		currency = settings.DEFAULT_CURRENCY
+
+	ingredients = get_ingredients(user, meal_servings)
+	lines = merge_ingredients(ingredients, meal_servings)
+
+	densities = {food_item_id: density for _, food_item_id, _, density, _, _, _ in ingredients}
+	price_lines(lines, get_location_purchases(densities), densities, currency)
+
+	return ShoppingList(lines, currency)
@@ -0,0 +1,143 @@
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .autocomplete import invalidate_users
+from .cache import invalidate_all, invalidate_food_items, invalidate_meals
+from .currency import clear_rate_cache
+from .models import FoodItem, FoodPurchase, FxRate, Meal, MealCostChange, StandardIngredient
+
+# Keep the latest purchase of a FoodItem up to date when one of its purchases is saved.
+# If the purchase has been moved to a different FoodItem, the old FoodItem is refreshed too.
+@receiver(post_save, sender=FoodPurchase)
+def update_latest_purchase_on_save(sender, instance, raw=False, **kwargs):
+	if raw:
+		return
+
+	FoodItem.objects.filter(
+		Q(pk=instance.food_item_id) | Q(latest_purchase_id=instance.pk)
+	).refresh_latest_purchase()
+
+# When the latest purchase of a FoodItem is deleted, the foreign key is set to NULL,
+# so only FoodItems without a latest purchase need to be refreshed.
+# Deletions of whole querysets are handled by FoodPurchaseQuerySet.delete(), and purchases
+# deleted along with their FoodItem or User do not need refreshing at all.
+@receiver(post_delete, sender=FoodPurchase)
+def update_latest_purchase_on_delete(sender, instance, origin=None, **kwargs):
+	if not isinstance(origin, FoodPurchase):
+		return
+
+	FoodItem.objects.filter(
+		pk=instance.food_item_id,
+		latest_purchase__isnull=True
+	).refresh_latest_purchase()
+
+# Cached exchange rates, and every cached price, may be out of date once the rates have changed.
+@receiver(post_save, sender=FxRate)
+@receiver(post_delete, sender=FxRate)
+def clear_rate_cache_on_change(sender, **kwargs):
+	clear_rate_cache()
+	invalidate_all()
+
+# The cached prices of purchases are invalidated by FoodItemQuerySet.refresh_latest_purchase().
+# A FoodItem's density affects the prices of the meals which use it.
+@receiver(post_save, sender=FoodItem)
+@receiver(post_delete, sender=FoodItem)
+def invalidate_food_item_prices(sender, instance, raw=False, **kwargs):
+	if raw:
+		return
+
+	invalidate_food_items([(instance.pk, instance.user_id)])
+
+# The names in the user's autocomplete index may have changed.
+@receiver(post_save, sender=FoodItem)
+@receiver(post_delete, sender=FoodItem)
+def invalidate_food_item_names(sender, instance, raw=False, **kwargs):
+	if raw:
+		return
+
+	invalidate_users([instance.user_id])
+
+# Changing an ingredient only affects the price of its own meal.
+# If the meal has already been deleted, there is nothing to invalidate.
+@receiver(post_save, sender=StandardIngredient)
+@receiver(post_delete, sender=StandardIngredient)
+def invalidate_ingredient_meal_prices(sender, instance, raw=False, **kwargs):
+	if raw:
+		return
+
+	user_id = Meal.objects.filter(pk=instance.meal_id).values_list('user_id', flat=True).first()
+
+	if user_id is not None:
+		invalidate_meals([(instance.meal_id, user_id)])
+
+# Changes which affect the costs of meals are recorded for the next meal cost rollup (see meals/rollup.py).
+# Before a purchase is updated, its previous food item and date are looked up,
+# as the costs of the previous food item's meals change too, from the earlier of the two dates.
+@receiver(pre_save, sender=FoodPurchase)
+def store_previous_purchase(sender, instance, raw=False, **kwargs):
+	if raw or instance._state.adding:
+		return
+
+	instance._previous_food_item_date = FoodPurchase.objects.filter(pk=instance.pk).values_list('food_item_id', 'date').first()
+
+@receiver(post_save, sender=FoodPurchase)
+def record_purchase_meal_cost_change(sender, instance, raw=False, **kwargs):
+	if raw:
+		return
+
+	earliest_dates = {instance.food_item_id: instance.date}
+	previous = getattr(instance, '_previous_food_item_date', None)
+
+	if previous:
+		food_item_id, date = previous
+		earliest_dates[food_item_id] = min(date, earliest_dates.get(food_item_id, date))
+
+	MealCostChange.objects.record_food_items(earliest_dates)
+
+# Purchases deleted along with their FoodItem or User do not need recording, as the ingredients
+# using the FoodItem are deleted too, and those deletions are recorded.
+@receiver(post_delete, sender=FoodPurchase)
+def record_purchase_delete_meal_cost_change(sender, instance, origin=None, **kwargs):
+	if not isinstance(origin, FoodPurchase):
+		return
+
+	MealCostChange.objects.record_food_items({instance.food_item_id: instance.date})
+
+@receiver(post_save, sender=StandardIngredient)
+@receiver(post_delete, sender=StandardIngredient)
+def record_ingredient_meal_cost_change(sender, instance, raw=False, **kwargs):
+	if raw:
+		return
+
+	MealCostChange.objects.record_meals([instance.meal_id])
+
+# A FoodItem's density affects the costs of the meals which use it, on every date, but nothing else about it does.
+# Before a FoodItem is updated, its previous density is looked up, so that other changes, such as renames, are not recorded.
+@receiver(pre_save, sender=FoodItem)
+def store_previous_density(sender, instance, raw=False, update_fields=None, **kwargs):
+	if raw or instance._state.adding or (update_fields is not None and 'density' not in update_fields):
+		return
+
+	instance._previous_density = FoodItem.objects.filter(pk=instance.pk).values_list('density', flat=True).first()
+
+@receiver(post_save, sender=FoodItem)
+def record_food_item_meal_cost_change(sender, instance, created=False, raw=False, **kwargs):
+	if raw or created or '_previous_density' not in instance.__dict__:
+		return
+
+	previous_density = instance.__dict__.pop('_previous_density')
+
+	if previous_density == FoodItem._meta.get_field('density').to_python(instance.density):
+		return
+
+	MealCostChange.objects.record_food_items({instance.pk: None})
+
+# Costs in other currencies change from the date of a changed exchange rate onwards.
+@receiver(post_save, sender=FxRate)
+@receiver(post_delete, sender=FxRate)
+def record_fx_rate_meal_cost_change(sender, instance, raw=False, **kwargs):
+	if raw:
+		return
+
+	MealCostChange.objects.record_all(date=instance.date)
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import runpy
+from datetime import date
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.handlers.asgi import ASGIHandler
+from django.test import AsyncClient
+from django.urls import resolve, reverse
+from django.utils.module_loading import import_string
+
+import mealpricetracker.settings
+
+from meals.models import FoodItem, FoodPurchase, Meal, MealInstance, StandardIngredient
+
+LIST_VIEWS = ['meal_list', 'food_item_list', 'purchase_list', 'meal_instance_list']
+
+@pytest.fixture
+def porridge(user):
+	meal = Meal.objects.create(name='Porridge', user=user)
+	oats = FoodItem.objects.create(name='Oats', user=user)
+
+	StandardIngredient.objects.create(meal=meal, food_item=oats, quantity=100, unit='g')
+	FoodPurchase.objects.create(food_item=oats, price_amount=1, currency='EUR', quantity=1, unit='kg', location='Aldi', date=date(2024, 1, 1))
+	MealInstance.objects.create(meal=meal, date=date(2024, 1, 2), num_servings=2, rating=5, cook_time=10)
+
+	return meal
+
+@async_to_sync
+async def get(client, path):
+	return await client.get(path)
+
+@pytest.mark.parametrize('view_name', LIST_VIEWS)
+def test_list_views_are_async(view_name):
+	assert asyncio.iscoroutinefunction(resolve(reverse(view_name)).func)
+
+# The views are run in an event loop, where any query made outside of the async ORM or sync_to_async() would raise an error.
+@pytest.mark.parametrize('view_name, expected', [
+	('meal_list', '0.10 EUR'),
+	('food_item_list', 'Oats'),
+	('purchase_list', 'Aldi'),
+	('meal_instance_list', '0.05 EUR'),
+])
+def test_list_views_with_async_client(user, porridge, view_name, expected):
+	client = AsyncClient()
+	client.force_login(user)
+
+	response = get(client, reverse(view_name))
+
+	assert response.status_code == 200
+	assert expected in response.content.decode()
+
+@pytest.mark.parametrize('view_name', LIST_VIEWS)
+def test_list_views_require_login(db, view_name):
+	response = get(AsyncClient(), reverse(view_name))
+
+	assert response.status_code in [302, 401]
+
+# Under ASGI no middleware may be sync only, or Django would run the async views in a thread for it.
+def test_no_middleware_is_adapted_under_asgi(monkeypatch, settings, caplog):
+	monkeypatch.setenv('SERVER_MODE', 'asgi')
+	settings.MIDDLEWARE = runpy.run_path(mealpricetracker.settings.__file__)['MIDDLEWARE']
+	settings.DEBUG = True
+	settings.METRICS_ENABLED = True
+	settings.PROFILING_ENABLED = True
+
+	caplog.set_level(logging.DEBUG, logger='django.request')
+	ASGIHandler()
+
+	assert 'adapted' not in caplog.text
+
+	for path in settings.MIDDLEWARE:
+		assert getattr(import_string(path), 'async_capable', False), path
@@ -0,0 +1,123 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from meals import cache
+from meals.models import FoodItem, FoodPurchase, FxRate, Meal, StandardIngredient
+
+def create_purchase(food_item, price_amount):
+	return FoodPurchase.objects.create(food_item=food_item, price_amount=price_amount, currency='EUR', quantity=1,
+									   unit='kg', location='Aldi', date=date.today())
+
+@pytest.fixture
+def meals(user):
+	oats = FoodItem.objects.create(name='Oats', user=user)
+	bread = FoodItem.objects.create(name='Bread', user=user)
+
+	porridge = Meal.objects.create(name='Porridge', user=user)
+	toast = Meal.objects.create(name='Toast', user=user)
+	StandardIngredient.objects.create(meal=porridge, food_item=oats, quantity=100, unit='g')
+	StandardIngredient.objects.create(meal=toast, food_item=bread, quantity=100, unit='g')
+
+	create_purchase(oats, 1.00)
+	create_purchase(bread, 2.00)
+
+	return porridge, toast
+
+def get_cached_prices(user, meals):
+	cache.stats.reset()
+	prices = cache.get_meal_prices(user, meals)
+
+	return prices, cache.stats.hits, cache.stats.misses
+
+def test_meal_prices_cached(user, meals, django_assert_num_queries):
+	porridge, toast = meals
+
+	assert get_cached_prices(user, meals) == ({porridge.id: Decimal('0.10'), toast.id: Decimal('0.20')}, 0, 2)
+
+	with django_assert_num_queries(0):
+		assert get_cached_prices(user, meals) == ({porridge.id: Decimal('0.10'), toast.id: Decimal('0.20')}, 2, 0)
+
+	assert cache.stats.hit_rate == 1
+
+# A new purchase only invalidates the meals which use the purchased food item.
+def test_purchase_invalidates_meals_using_food_item(user, meals):
+	porridge, toast = meals
+	get_cached_prices(user, meals)
+
+	create_purchase(FoodItem.objects.get(name='Oats'), 3.00)
+
+	assert get_cached_prices(user, meals) == ({porridge.id: Decimal('0.30'), toast.id: Decimal('0.20')}, 1, 1)
+
+def test_bulk_purchases_invalidate_meals(user, meals):
+	porridge, toast = meals
+	get_cached_prices(user, meals)
+
+	FoodPurchase.objects.filter(food_item__name='Bread').update(price_amount=5.00)
+
+	assert get_cached_prices(user, meals) == ({porridge.id: Decimal('0.10'), toast.id: Decimal('0.50')}, 1, 1)
+
+def test_ingredient_change_invalidates_meal(user, meals):
+	porridge, toast = meals
+	get_cached_prices(user, meals)
+
+	ingredient = StandardIngredient.objects.get(meal=toast)
+	ingredient.quantity = 200
+	ingredient.save()
+
+	assert get_cached_prices(user, meals) == ({porridge.id: Decimal('0.10'), toast.id: Decimal('0.40')}, 1, 1)
+
+	ingredient.delete()
+
+	assert get_cached_prices(user, meals) == ({porridge.id: Decimal('0.10'), toast.id: None}, 1, 1)
+
+def test_food_item_change_invalidates_meals(user, meals):
+	porridge, toast = meals
+	get_cached_prices(user, meals)
+
+	oats = FoodItem.objects.get(name='Oats')
+	oats.density = Decimal('0.5')
+	oats.save()
+
+	assert get_cached_prices(user, meals)[1:] == (1, 1)
+
+def test_fx_rate_change_invalidates_all_prices(user, other_user, meals):
+	get_cached_prices(user, meals)
+
+	FxRate.objects.create(currency='GBP', date=date.today(), rate=Decimal('0.85'))
+
+	assert get_cached_prices(user, meals)[1:] == (0, 2)
+
+def test_invalidate_user(user, meals):
+	get_cached_prices(user, meals)
+
+	cache.invalidate_user(user)
+
+	assert get_cached_prices(user, meals)[1:] == (0, 2)
+
+# Prices are cached separately for each currency.
+def test_meal_prices_cached_per_currency(user, meals):
+	porridge, _ = meals
+	FxRate.objects.create(currency='GBP', date=date.today(), rate=Decimal('0.5'))
+
+	assert cache.get_meal_prices(user, [porridge], currency='EUR') == {porridge.id: Decimal('0.10')}
+	assert cache.get_meal_prices(user, [porridge], currency='GBP') == {porridge.id: Decimal('0.05')}
+
+	cache.stats.reset()
+	cache.get_meal_prices(user, [porridge], currency='GBP')
+	cache.get_meal_prices(user, [porridge], currency='EUR')
+
+	assert (cache.stats.hits, cache.stats.misses) == (2, 0)
+
+def test_food_item_prices_cached(user, meals, django_assert_num_queries):
+	food_items = list(FoodItem.objects.with_stats(user).order_by('name'))
+
+	assert list(cache.get_food_item_prices(user, food_items).values()) == ['2.00 EUR / kg', '1.00 EUR / kg']
+
+	with django_assert_num_queries(0):
+		cache.get_food_item_prices(user, food_items)
+
+	create_purchase(food_items[0], 4.00)
+
+	assert list(cache.get_food_item_prices(user, FoodItem.objects.with_stats(user).order_by('name')).values()) == ['4.00 EUR / kg', '1.00 EUR / kg']
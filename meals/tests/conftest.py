@@ -13,4 +13,16 @@ def other_user(db, client):
 	username = 'user2'
 	password = 'password'
 
-	return User.objects.create_user(username=username, password=password)
\ No newline at end of file
+	return User.objects.create_user(username=username, password=password)
+# Exchange rates, prices and name indexes cached by one test must not be seen by the next.
+@pytest.fixture(autouse=True)
+def clear_caches():
+	from meals import autocomplete, cache, currency
+
+	currency.clear_rate_cache()
+	cache.clear()
+	autocomplete.indexes.clear()
+	yield
+	currency.clear_rate_cache()
+	cache.clear()
+	autocomplete.indexes.clear()
@@ -0,0 +1,168 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.core.management import call_command
+
+from meals import cache, currency
+from meals.currency import MissingFxRateError, RateCache, convert, get_rate
+from meals.models import FoodItem, FoodPurchase, FxRate, Meal, StandardIngredient
+from meals.pricing import get_meal_prices
+
+monday = date(2024, 1, 8)
+tuesday = monday + timedelta(days=1)
+saturday = monday + timedelta(days=5)
+
+@pytest.fixture
+def fx_rates(db):
+	return FxRate.objects.bulk_create([
+		FxRate(currency='GBP', date=monday, rate=Decimal('0.8')),
+		FxRate(currency='GBP', date=tuesday, rate=Decimal('0.85')),
+		FxRate(currency='USD', date=monday, rate=Decimal('1.1')),
+	])
+
+def test_convert(fx_rates):
+	assert convert(
+		[Decimal('8.00'), Decimal('8.50'), Decimal('10.00'), Decimal('1.10')],
+		['GBP', 'GBP', 'EUR', 'USD'],
+		[monday, tuesday, monday, monday],
+		'EUR'
+	) == [Decimal('10.00'), Decimal('10.00'), Decimal('10.00'), Decimal('1.00')]
+
+def test_convert_between_non_base_currencies(fx_rates):
+	assert convert([Decimal('11.00')], ['USD'], [monday], 'GBP') == [Decimal('8.00')]
+
+# There are no rates at weekends, so the most recent rate before the date is used.
+def test_convert_uses_previous_rate(fx_rates):
+	assert get_rate('GBP', saturday) == Decimal('0.85')
+	assert convert([Decimal('10.00')], ['EUR'], [saturday], 'GBP') == [Decimal('8.50')]
+
+def test_missing_rate(fx_rates):
+	assert convert([Decimal('1.00')], ['GBP'], [monday - timedelta(days=1)], 'EUR') == [None]
+	assert convert([Decimal('1.00')], ['CHF'], [monday], 'EUR') == [None]
+
+	with pytest.raises(MissingFxRateError):
+		get_rate('CHF', monday)
+
+def test_rates_are_cached(fx_rates, django_assert_num_queries):
+	dates = [monday + timedelta(days=i) for i in range(7)]
+
+	with django_assert_num_queries(1):
+		convert([Decimal('1.00')] * len(dates), ['GBP'] * len(dates), dates, 'EUR')
+
+	with django_assert_num_queries(0):
+		convert([Decimal('1.00')] * len(dates), ['GBP'] * len(dates), dates, 'EUR')
+
+def test_rate_cache_cleared_on_change(fx_rates):
+	assert get_rate('GBP', monday) == Decimal('0.8')
+
+	FxRate.objects.filter(currency='GBP', date=monday).update(rate=Decimal('0.9'))
+	FxRate.objects.get(currency='GBP', date=monday).save()
+
+	assert get_rate('GBP', monday) == Decimal('0.9')
+
+def test_rate_cache_evicts_least_recently_used():
+	rate_cache = RateCache(maxsize=2)
+	rate_cache.set('a', 1)
+	rate_cache.set('b', 2)
+	rate_cache.get('a')
+	rate_cache.set('c', 3)
+
+	assert 'a' in rate_cache
+	assert 'b' not in rate_cache
+	assert 'c' in rate_cache
+
+def test_rate_cache_expires(monkeypatch):
+	now = 1000.0
+	monkeypatch.setattr(currency.time, 'monotonic', lambda: now)
+
+	rate_cache = RateCache(maxsize=2, timeout=60)
+	rate_cache.set('a', 1)
+
+	now += 59
+	assert rate_cache.get('a') == 1
+
+	now += 1
+	assert rate_cache.get('a') is None
+	assert len(rate_cache) == 0
+
+# Rates which had not been loaded yet are found once they are.
+def test_missing_rates_are_not_cached(fx_rates):
+	assert convert([Decimal('1.00')], ['CHF'], [monday], 'EUR') == [None]
+
+	FxRate.objects.create(currency='CHF', date=monday, rate=Decimal('0.5'))
+
+	assert convert([Decimal('1.00')], ['CHF'], [monday], 'EUR') == [Decimal('2.00')]
+
+# Clearing the rates in another process, which shares the price cache, clears them in this one.
+def test_rate_cache_cleared_by_other_processes(fx_rates):
+	assert get_rate('GBP', monday) == Decimal('0.8')
+
+	FxRate.objects.filter(currency='GBP', date=monday).update(rate=Decimal('0.9'))
+	assert get_rate('GBP', monday) == Decimal('0.8')
+
+	cache.get_price_cache().set(currency.VERSION_KEY, 'other process', timeout=None)
+	assert get_rate('GBP', monday) == Decimal('0.9')
+
+def test_rate_cache_is_thread_safe():
+	rate_cache = RateCache(maxsize=8)
+
+	def use_cache(offset):
+		for i in range(20000):
+			key = (offset + i) % 16
+			rate_cache.set(key, i)
+			rate_cache.get((key + 1) % 16)
+
+	with ThreadPoolExecutor(4) as executor:
+		list(executor.map(use_cache, range(4)))
+
+	assert len(rate_cache) == 8
+
+def test_get_price_in_currency(user, fx_rates):
+	milk = FoodItem.objects.create(name='Milk', user=user)
+	purchase = FoodPurchase.objects.create(food_item=milk, price_amount=Decimal('0.80'), currency='GBP', quantity=1,
+										   unit='l', location='Tesco', date=monday)
+
+	assert purchase.get_price_in_currency('EUR') == Decimal('1.00')
+	assert purchase.get_price_in_currency('GBP') == Decimal('0.80')
+
+	purchase.date = monday - timedelta(days=1)
+
+	with pytest.raises(MissingFxRateError):
+		purchase.get_price_in_currency('EUR')
+
+# Meals with ingredients bought in different currencies are priced in a single currency.
+def test_mixed_currency_meal_price(user, fx_rates):
+	porridge = Meal.objects.create(name='Porridge', user=user)
+	oats = FoodItem.objects.create(name='Oats', user=user)
+	milk = FoodItem.objects.create(name='Milk', user=user)
+	StandardIngredient.objects.create(meal=porridge, food_item=oats, quantity=1, unit='kg')
+	StandardIngredient.objects.create(meal=porridge, food_item=milk, quantity=1, unit='l')
+
+	FoodPurchase.objects.create(food_item=oats, price_amount=Decimal('2.00'), currency='EUR', quantity=1, unit='kg', location='Aldi', date=monday)
+	FoodPurchase.objects.create(food_item=milk, price_amount=Decimal('0.85'), currency='GBP', quantity=1, unit='l', location='Tesco', date=tuesday)
+
+	assert get_meal_prices([porridge], currency='EUR') == {porridge.id: Decimal('3.00')}
+	assert get_meal_prices([porridge], currency='GBP') == {porridge.id: Decimal('2.45')}
+	assert porridge.get_newest_price() == '3.00 EUR'
+
+def test_load_fx_rates_command(db, tmp_path):
+	csv_path = tmp_path / 'eurofxref-hist.csv'
+	csv_path.write_text(
+		'Date,USD,JPY,GBP,\n'
+		'2024-01-09,1.0940,157.77,0.85990,\n'
+		'2024-01-08,1.0946,158.17,N/A,\n'
+	)
+
+	call_command('load_fx_rates', str(csv_path))
+
+	assert FxRate.objects.count() == 5
+	assert get_rate('GBP', date(2024, 1, 10)) == Decimal('0.8599')
+
+	# Loading the rates again updates them.
+	csv_path.write_text('Date,GBP\n2024-01-09,0.86\n')
+	call_command('load_fx_rates', str(csv_path), '--currencies', 'GBP')
+
+	assert FxRate.objects.count() == 5
+	assert get_rate('GBP', date(2024, 1, 10)) == Decimal('0.86')
@@ -0,0 +1,90 @@
+import pytest
+from django.urls import reverse
+
+from meals import autocomplete
+from meals.forms import FoodItemField
+from meals.models import FoodItem
+
+NAMES = ['Tomatoes', 'Tomato Puree', 'Cherry Tomatoes', 'Sun-Dried Tomato Paste', 'Potatoes', 'Milk']
+
+@pytest.fixture
+def food_items(user, other_user):
+	FoodItem.objects.create(name='Tomato Soup', user=other_user)
+
+	return {name: FoodItem.objects.create(name=name, user=user) for name in NAMES}
+
+def get_names(results):
+	return [name for _, name in results]
+
+def test_ranking():
+	index = autocomplete.NameIndex(enumerate(NAMES))
+
+	# Names starting with the search, then names with a word starting with it.
+	assert get_names(index.search('tomato', 10)) == ['Tomato Puree', 'Tomatoes', 'Cherry Tomatoes', 'Sun-Dried Tomato Paste']
+	assert get_names(index.search('Tomatoes', 10)) == ['Tomatoes', 'Cherry Tomatoes', 'Tomato Puree']
+	assert get_names(index.search('atoes', 10)) == ['Cherry Tomatoes', 'Potatoes', 'Tomatoes']
+
+	# Misspelt names are found by the similarity of their trigrams.
+	assert get_names(index.search('tomatos', 10)) == ['Tomatoes', 'Tomato Puree', 'Cherry Tomatoes']
+	assert get_names(index.search('mlik', 10)) == []
+	assert get_names(index.search('milkk', 10)) == ['Milk']
+
+	assert len(index.search('', 3)) == 3
+	assert len(index.search('tomato', 2)) == 2
+
+def test_trigrams_match_pg_trgm():
+	assert autocomplete.get_trigrams('Hi, Bob') == {'  h', ' hi', 'hi ', '  b', ' bo', 'bob', 'ob '}
+
+def test_endpoint(user, client, food_items):
+	client.force_login(user)
+	response = client.get(reverse('food_item_autocomplete'), {'term': 'tom'})
+
+	assert response.status_code == 200
+	assert response.json() == {
+		'results': [
+			{'id': food_items['Tomato Puree'].id, 'text': 'Tomato Puree'},
+			{'id': food_items['Tomatoes'].id, 'text': 'Tomatoes'},
+			{'id': food_items['Cherry Tomatoes'].id, 'text': 'Cherry Tomatoes'},
+			{'id': food_items['Sun-Dried Tomato Paste'].id, 'text': 'Sun-Dried Tomato Paste'},
+		],
+		'more': False,
+	}
+
+def test_endpoint_requires_login(client):
+	assert client.get(reverse('food_item_autocomplete')).status_code == 401
+
+# The index is built once, and then searched without querying the database.
+def test_index_is_cached(user, food_items, django_assert_num_queries):
+	autocomplete.search(user.pk, 'tom')
+
+	with django_assert_num_queries(0):
+		autocomplete.search(user.pk, 'milk')
+
+def test_index_is_updated_on_writes(user, food_items):
+	assert get_names(autocomplete.search(user.pk, 'oat')) == []
+
+	FoodItem.objects.create(name='Oats', user=user)
+	assert get_names(autocomplete.search(user.pk, 'oat')) == ['Oats']
+
+	food_items['Milk'].name = 'Oat Milk'
+	food_items['Milk'].save()
+	assert get_names(autocomplete.search(user.pk, 'oat')) == ['Oat Milk', 'Oats']
+
+	FoodItem.objects.get(name='Oats').delete()
+	assert get_names(autocomplete.search(user.pk, 'oat')) == ['Oat Milk']
+
+# Users with too many food items to index are searched in the database.
+def test_database_search(user, food_items, settings):
+	settings.AUTOCOMPLETE_MAX_INDEX_SIZE = 2
+
+	assert autocomplete.get_index(user.pk) is None
+	assert get_names(autocomplete.search(user.pk, 'Tomatoes'))[:2] == ['Tomatoes', 'Cherry Tomatoes']
+	assert get_names(autocomplete.search(user.pk, 'tomato'))[:2] == ['Tomato Puree', 'Tomatoes']
+
+	if autocomplete.has_trigram_extension():
+		assert get_names(autocomplete.search(user.pk, 'tomatos'))[0] == 'Tomatoes'
+
+def test_widget_uses_autocomplete(user):
+	field = FoodItemField(user=user)
+
+	assert reverse('food_item_autocomplete') in field.widget.render('food_item', None)
@@ -0,0 +1,154 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from django.urls import reverse
+
+from meals.history import downsample_lttb
+from meals.models import FoodItem, FoodPurchase, FxRate
+
+monday = date(2024, 1, 8)
+
+@pytest.fixture
+def milk(user):
+	return FoodItem.objects.create(name='Milk', user=user)
+
+def create_purchase(food_item, price_amount, quantity, unit, purchase_date, currency='EUR'):
+	return FoodPurchase.objects.create(
+		food_item=food_item,
+		price_amount=Decimal(price_amount),
+		quantity=Decimal(quantity),
+		unit=unit,
+		currency=currency,
+		location='Aldi',
+		date=purchase_date
+	)
+
+def get_history(client, food_item, **params):
+	response = client.get(reverse('food_item_history', args=[food_item.id]), params)
+	assert response.status_code == 200
+
+	return response.json()
+
+class TestFoodItemHistory:
+
+	# Purchases in different units are normalised to the unit of the newest purchase's dimension, and grouped by week.
+	def test_weekly_prices_per_unit(self, user, client, milk):
+		create_purchase(milk, '1.00', '1', 'l', monday)
+		create_purchase(milk, '0.60', '500', 'ml', monday + timedelta(days=2))
+		create_purchase(milk, '1.20', '1', 'l', monday + timedelta(days=7))
+
+		client.force_login(user)
+		history = get_history(client, milk)
+
+		assert history['unit'] == 'l'
+		assert history['period'] == 'week'
+		assert history['currency'] == 'EUR'
+		assert history['points'] == [
+			{'date': '2024-01-08', 'min': '1.00', 'avg': '1.10', 'max': '1.20', 'count': 2},
+			{'date': '2024-01-15', 'min': '1.20', 'avg': '1.20', 'max': '1.20', 'count': 1},
+		]
+
+	def test_monthly_prices_in_another_unit(self, user, client, milk):
+		create_purchase(milk, '1.00', '1', 'l', date(2024, 1, 3))
+		create_purchase(milk, '2.00', '1', 'l', date(2024, 1, 30))
+		create_purchase(milk, '3.00', '1', 'l', date(2024, 2, 14))
+
+		client.force_login(user)
+		history = get_history(client, milk, period='month', unit='cup')
+
+		assert history['unit'] == 'cup'
+		assert [point['date'] for point in history['points']] == ['2024-01-01', '2024-02-01']
+		assert [point['max'] for point in history['points']] == ['0.50', '0.75']
+
+		history = get_history(client, milk, period='month')
+		assert [point['avg'] for point in history['points']] == ['1.50', '3.00']
+
+	# Purchases which cannot be converted to the unit, such as pieces without a density, are left out.
+	def test_unconvertible_units_are_left_out(self, user, client, milk):
+		create_purchase(milk, '1.00', '1', 'pc', monday)
+		create_purchase(milk, '3.00', '2', 'l', monday + timedelta(days=1))
+
+		client.force_login(user)
+		history = get_history(client, milk)
+
+		assert history['points'] == [{'date': '2024-01-08', 'min': '1.50', 'avg': '1.50', 'max': '1.50', 'count': 1}]
+
+	def test_prices_are_converted_to_the_currency(self, user, client, milk):
+		FxRate.objects.create(currency='GBP', date=monday, rate=Decimal('0.8'))
+		create_purchase(milk, '0.80', '1', 'l', monday, currency='GBP')
+		create_purchase(milk, '1.50', '1', 'l', monday)
+
+		client.force_login(user)
+
+		history = get_history(client, milk)
+		assert history['points'] == [{'date': '2024-01-08', 'min': '1.00', 'avg': '1.25', 'max': '1.50', 'count': 2}]
+
+		history = get_history(client, milk, currency='gbp')
+		assert history['points'][0]['avg'] == '1.00'
+
+	def test_long_histories_are_downsampled(self, user, client, milk):
+		FoodPurchase.objects.bulk_create([
+			FoodPurchase(food_item=milk, price_amount=Decimal(1 + week % 7), quantity=1, unit='l', currency='EUR', location='Aldi', date=monday + timedelta(weeks=week))
+			for week in range(100)
+		])
+
+		client.force_login(user)
+		history = get_history(client, milk, points=20)
+
+		assert history['num_periods'] == 100
+		assert history['downsampled']
+		assert len(history['points']) == 20
+		assert history['points'][0]['date'] == monday.isoformat()
+		assert history['points'][-1]['date'] == (monday + timedelta(weeks=99)).isoformat()
+
+	def test_no_purchases(self, user, client, milk):
+		client.force_login(user)
+		history = get_history(client, milk)
+
+		assert history['points'] == []
+
+	def test_the_number_of_queries_does_not_grow_with_history(self, user, client, milk, django_assert_max_num_queries):
+		FoodPurchase.objects.bulk_create([
+			FoodPurchase(food_item=milk, price_amount=Decimal('1.00'), quantity=1, unit='l', currency='EUR', location='Aldi', date=monday + timedelta(days=day))
+			for day in range(365)
+		])
+
+		client.force_login(user)
+
+		with django_assert_max_num_queries(6):
+			get_history(client, milk)
+
+	@pytest.mark.parametrize('params', [{'period': 'year'}, {'unit': 'stone'}, {'currency': 'XYZ'}, {'points': 'many'}, {'points': 1}])
+	def test_invalid_parameters(self, user, client, milk, params):
+		client.force_login(user)
+		response = client.get(reverse('food_item_history', args=[milk.id]), params)
+
+		assert response.status_code == 400
+
+	def test_other_users_food_items(self, other_user, client, milk):
+		client.force_login(other_user)
+		response = client.get(reverse('food_item_history', args=[milk.id]))
+
+		assert response.status_code == 403
+
+	def test_unauthenticated(self, client, milk):
+		response = client.get(reverse('food_item_history', args=[milk.id]))
+
+		assert response.status_code == 401
+
+def test_downsample_lttb_keeps_peaks():
+	x = np.arange(100)
+	y = np.zeros(100)
+	y[37] = 10
+
+	indexes = downsample_lttb(x, y, 10)
+
+	assert len(indexes) == 10
+	assert indexes[0] == 0 and indexes[-1] == 99
+	assert 37 in indexes
+	assert (np.diff(indexes) > 0).all()
+
+def test_downsample_lttb_short_series():
+	assert list(downsample_lttb([1, 2, 3], [1, 2, 3], 10)) == [0, 1, 2]
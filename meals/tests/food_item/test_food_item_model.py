@@ -3,7 +3,7 @@ from django.forms import ValidationError
 
 import pytest
 
-from meals.models import FoodItem, FoodPurchase
+from meals.models import FoodItem, FoodPurchase, Meal, StandardIngredient
 from meals.models.food_item import UserDuplicateFoodItemError
 
 class TestFoodItemModel:
@@ -118,4 +118,40 @@ class TestFoodItemModel:
 		food_item = FoodItem.objects.create(name='Delicious Food Item', user=user)
 		FoodPurchase.objects.create(food_item=food_item, price_amount=purchase_price, currency='EUR', quantity=purchase_quantity, unit=purchase_unit, location='Aldi', date=date.today())
 		
-		assert food_item.get_newest_price(format='absolute', unit=output_unit, quantity=output_quantity) == expected_price
\ No newline at end of file
+		assert food_item.get_newest_price(format='absolute', unit=output_unit, quantity=output_quantity) == expected_price
+
+	def test_food_items_with_stats(self, user, other_user):
+		oats = FoodItem.objects.create(name='Oats', user=user)
+		FoodItem.objects.create(name='Milk', user=user)
+		FoodItem.objects.create(name='Jam', user=other_user)
+
+		porridge = Meal.objects.create(name='Porridge', user=user)
+		flapjack = Meal.objects.create(name='Flapjack', user=user)
+		StandardIngredient.objects.create(meal=porridge, food_item=oats, quantity=50, unit='g')
+		StandardIngredient.objects.create(meal=flapjack, food_item=oats, quantity=200, unit='g')
+
+		FoodPurchase.objects.create(food_item=oats, price_amount=1.00, currency='EUR', quantity=1, unit='kg', location='Aldi', date=date.today())
+		FoodPurchase.objects.create(food_item=oats, price_amount=2.00, currency='EUR', quantity=1, unit='kg', location='Aldi', date=date.today() - timedelta(days=7))
+
+		food_items = {food_item.name: food_item for food_item in FoodItem.objects.with_stats(user)}
+
+		assert set(food_items) == {'Oats', 'Milk'}
+
+		assert food_items['Oats'].num_meals == 2
+		assert food_items['Oats'].num_purchases == 2
+		assert food_items['Oats'].latest_price == 1
+		assert food_items['Oats'].latest_currency == 'EUR'
+
+		assert food_items['Milk'].num_meals == 0
+		assert food_items['Milk'].num_purchases == 0
+		assert food_items['Milk'].latest_price is None
+
+	# The newest price of a food item from with_stats() should not need another query.
+	def test_food_items_with_stats_newest_price(self, user, django_assert_num_queries):
+		oats = FoodItem.objects.create(name='Oats', user=user)
+		FoodPurchase.objects.create(food_item=oats, price_amount=1.00, currency='EUR', quantity=1, unit='kg', location='Aldi', date=date.today())
+
+		food_item = FoodItem.objects.with_stats(user).get()
+
+		with django_assert_num_queries(0):
+			assert food_item.get_newest_price() == '1.00 EUR / kg'
@@ -0,0 +1,102 @@
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.forms import ValidationError
+
+from meals import autocomplete
+from meals.forms import FoodItemForm, StandardIngredientForm
+from meals.models import FoodItem, Meal
+from meals.models.food_item import UserDuplicateFoodItemError
+
+def test_resolve_names(user, other_user):
+	milk = FoodItem.objects.create(name='Milk', user=user)
+	FoodItem.objects.create(name='Oats', user=other_user)
+
+	food_items = FoodItem.objects.resolve_names(user, ['milk', ' oats ', 'Oat milk', 'OAT MILK'])
+
+	assert set(food_items) == {'milk', 'oats', 'oat milk'}
+	assert food_items['milk'] == milk
+	assert not food_items['milk'].created
+	assert food_items['oats'].name == 'Oats'
+	assert food_items['oats'].user == user
+	assert food_items['oats'].created
+	assert food_items['oat milk'].name == 'Oat Milk'
+	assert FoodItem.objects.filter(user=user).count() == 3
+	assert FoodItem.objects.filter(user=other_user).count() == 1
+
+	assert not any(food_item.created for food_item in FoodItem.objects.resolve_names(user, ['Oats', 'Oat Milk']).values())
+
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason='Other databases take three queries.')
+def test_resolve_names_in_one_query(user, django_assert_num_queries):
+	FoodItem.objects.create(name='Milk', user=user)
+
+	with django_assert_num_queries(1):
+		food_items = FoodItem.objects.resolve_names(user, ['Milk', 'Oats'])
+
+	assert [food_items[name].created for name in ['milk', 'oats']] == [False, True]
+
+# FoodItems are returned under the lowercase names they were asked for, whatever the case of their saved names,
+# as the database's lower() may not agree with Python's.
+def test_resolve_names_keys_by_requested_name(user):
+	oats = FoodItem.objects.create(name='Oats', user=user)
+	FoodItem.objects.filter(pk=oats.pk).update(name='OATS')
+
+	food_items = FoodItem.objects.resolve_names(user, ['oats', 'Milk'])
+
+	assert set(food_items) == {'oats', 'milk'}
+	assert food_items['oats'].pk == oats.pk
+	assert food_items['oats'].name == 'OATS'
+	assert not food_items['oats'].created
+
+def test_resolve_names_updates_autocomplete(user):
+	assert autocomplete.search(user.pk, 'oat') == []
+
+	oats = FoodItem.objects.resolve_names(user, ['Oats'])['oats']
+
+	assert autocomplete.search(user.pk, 'oat') == [(oats.id, 'Oats')]
+
+def test_resolve_names_rejects_invalid_names(user):
+	with pytest.raises(ValidationError):
+		FoodItem.objects.resolve_names(user, ['Milk', ' '])
+
+	with pytest.raises(ValidationError):
+		FoodItem.objects.resolve_names(user, ['x' * 101])
+
+	assert not FoodItem.objects.exists()
+
+# The food item form creates new food items with resolve_names(), so a duplicate name finds the existing food item.
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason='Other databases take three queries.')
+def test_food_item_form_resolves_duplicate_in_one_query(user, django_assert_num_queries):
+	milk = FoodItem.objects.create(name='Milk', user=user)
+	form = FoodItemForm({'name': 'mILK', 'density': '1.03'}, user=user)
+
+	with django_assert_num_queries(1):
+		assert form.is_valid(), form.errors
+		assert form.save() == milk
+
+	assert FoodItem.objects.get(pk=milk.pk).density is None
+
+def test_food_item_form_creates_food_item(user):
+	food_item = FoodItemForm({'name': 'oat milk', 'density': '1.03'}, user=user).save()
+
+	assert food_item.created
+	assert FoodItem.objects.get(pk=food_item.pk).name == 'Oat Milk'
+	assert FoodItem.objects.get(pk=food_item.pk).density == Decimal('1.03')
+
+	with pytest.raises(UserDuplicateFoodItemError):
+		FoodItem.objects.create(name='OAT MILK', user=user)
+
+# The name of a new food item is looked up once, although the form resolves it both before and when it is validated.
+def test_form_resolves_new_food_item_once(user, django_assert_num_queries):
+	meal = Meal.objects.create(name='Porridge', user=user)
+	FoodItem.objects.create(name='Oat Milk', user=user)
+
+	form = StandardIngredientForm({'food_item': 'oat milk', 'quantity': '1', 'unit': 'l', 'form_type': 'standard_ingredient'}, user=user, meal=meal)
+
+	with django_assert_num_queries(0):
+		assert form.is_valid(), form.errors
+
+	assert form.cleaned_data['food_item'] == form.instance.food_item
+	assert form.instance.food_item.name == 'Oat Milk'
+	assert FoodItem.objects.filter(user=user).count() == 1
@@ -0,0 +1,108 @@
+import json
+from datetime import date
+
+import pytest
+from django.db import connections
+from django.urls import reverse
+
+from meals.models import FoodItem, FoodPurchase
+
+@pytest.fixture
+def purchases(user, other_user):
+	milk = FoodItem.objects.create(name='Milk', user=user)
+	oats = FoodItem.objects.create(name='Oats', user=user)
+	jam = FoodItem.objects.create(name='Jam', user=other_user)
+
+	return [
+		FoodPurchase.objects.create(food_item=milk, price_amount=1.09, currency='EUR', quantity=1, unit='l', location='Aldi', date=date(2023, 1, 1)),
+		FoodPurchase.objects.create(food_item=oats, price_amount=0.89, currency='EUR', quantity=500, unit='g', location='Lidl, Berlin', date=date(2023, 2, 1)),
+		FoodPurchase.objects.create(food_item=milk, price_amount=1.19, currency='GBP', quantity=2, unit='l', location='Tesco', date=date(2023, 3, 1)),
+		FoodPurchase.objects.create(food_item=jam, price_amount=2.00, currency='EUR', quantity=1, unit='pc', location='Rewe', date=date(2023, 1, 1)),
+	]
+
+def get_content(response):
+	assert response.status_code == 200
+	assert response.streaming
+
+	return b''.join(response.streaming_content).decode()
+
+class TestFoodPurchaseExport:
+
+	def test_export_csv(self, user, client, purchases):
+		client.force_login(user)
+		response = client.get(reverse('purchase_export_csv'))
+
+		assert response['Content-Type'] == 'text/csv'
+		assert get_content(response).splitlines() == [
+			'id,date,food_item,price_amount,currency,quantity,unit,location',
+			f'{purchases[0].id},2023-01-01,Milk,1.09,EUR,1.00,l,Aldi',
+			f'{purchases[1].id},2023-02-01,Oats,0.89,EUR,500.00,g,"Lidl, Berlin"',
+			f'{purchases[2].id},2023-03-01,Milk,1.19,GBP,2.00,l,Tesco',
+		]
+
+	def test_export_ndjson(self, user, client, purchases):
+		client.force_login(user)
+		response = client.get(reverse('purchase_export_ndjson'))
+
+		assert response['Content-Type'] == 'application/x-ndjson'
+
+		rows = [json.loads(line) for line in get_content(response).splitlines()]
+
+		assert rows[0] == {
+			'id': purchases[0].id,
+			'date': '2023-01-01',
+			'food_item': 'Milk',
+			'price_amount': '1.09',
+			'currency': 'EUR',
+			'quantity': '1.00',
+			'unit': 'l',
+			'location': 'Aldi',
+		}
+		assert [row['id'] for row in rows] == [purchase.id for purchase in purchases[:3]]
+
+	def test_export_filters(self, user, client, purchases):
+		client.force_login(user)
+		milk = FoodItem.objects.get(name='Milk', user=user)
+
+		response = client.get(reverse('purchase_export_ndjson'), {'start': '2023-01-15', 'end': '2023-03-01'})
+		assert [json.loads(line)['id'] for line in get_content(response).splitlines()] == [purchases[1].id, purchases[2].id]
+
+		response = client.get(reverse('purchase_export_ndjson'), {'food_item': milk.id})
+		assert [json.loads(line)['id'] for line in get_content(response).splitlines()] == [purchases[0].id, purchases[2].id]
+
+	@pytest.mark.parametrize('params', [
+		{'start': '01/01/2023'},
+		{'end': 'yesterday'},
+		{'food_item': 'milk'},
+	])
+	def test_export_invalid_filters(self, user, client, purchases, params):
+		client.force_login(user)
+		response = client.get(reverse('purchase_export_csv'), params)
+
+		assert response.status_code == 400
+
+	def test_export_requires_login(self, client, purchases):
+		response = client.get(reverse('purchase_export_csv'))
+
+		assert response.status_code == 401
+
+	# The rows are fetched from the database in chunks, and the export should not depend upon their size.
+	def test_export_in_small_chunks(self, user, client, purchases, settings):
+		settings.EXPORT_CHUNK_SIZE = 1
+		client.force_login(user)
+
+		response = client.get(reverse('purchase_export_csv'))
+
+		assert len(get_content(response).splitlines()) == 4
+
+	# Without server-side cursors, as behind PgBouncer, the rows are read a page at a time, in the same order.
+	def test_export_without_server_side_cursors(self, user, client, purchases, settings, monkeypatch):
+		monkeypatch.setitem(connections['default'].settings_dict, 'DISABLE_SERVER_SIDE_CURSORS', True)
+		settings.EXPORT_CHUNK_SIZE = 1
+
+		same_day = FoodPurchase.objects.create(food_item=purchases[0].food_item, price_amount=1.15, currency='EUR', quantity=1, unit='l', location='Aldi', date=date(2023, 1, 1))
+
+		client.force_login(user)
+		response = client.get(reverse('purchase_export_ndjson'))
+
+		assert [json.loads(line)['id'] for line in get_content(response).splitlines()] == [purchases[0].id, same_day.id, purchases[1].id, purchases[2].id]
@@ -0,0 +1,166 @@
+import json
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+
+from meals.importer import get_reader, import_purchases, read_csv, read_ndjson
+from meals.models import FoodItem, FoodPurchase
+
+CSV_HEADER = 'food_item,price_amount,currency,quantity,unit,location,date\n'
+
+def import_csv(user, content, chunk_size=None):
+	return import_purchases(user, read_csv((CSV_HEADER + content).splitlines(keepends=True)), chunk_size=chunk_size)
+
+class TestFoodPurchaseImport:
+
+	def test_import_csv(self, user):
+		milk = FoodItem.objects.create(name='Milk', user=user)
+
+		result = import_csv(user, (
+			'milk,1.09,EUR,1,l,Aldi,2023-01-01\n'
+			'Oats,0.89,eur,500,G,"Lidl, Berlin",2023-02-01\n'
+			'MILK,1.19,GBP,2,l,Tesco,2023-03-01\n'
+		))
+
+		assert result.as_dict() == {'imported': 3, 'food_items_created': 1, 'errors': []}
+
+		oats = FoodItem.objects.get(name='Oats', user=user)
+		assert FoodItem.objects.filter(user=user).count() == 2
+
+		assert list(FoodPurchase.objects.filter(food_item=milk).order_by('date').values_list('price_amount', 'currency')) == [
+			(Decimal('1.09'), 'EUR'),
+			(Decimal('1.19'), 'GBP'),
+		]
+
+		oats_purchase = FoodPurchase.objects.get(food_item=oats)
+		assert (oats_purchase.unit, oats_purchase.currency, oats_purchase.location) == ('g', 'EUR', 'Lidl, Berlin')
+
+		# The latest purchases are kept up to date.
+		assert FoodItem.objects.get(pk=milk.pk).latest_purchase.price_amount == Decimal('1.19')
+
+	def test_import_reports_invalid_rows(self, user):
+		result = import_csv(user, (
+			'Milk,1.09,EUR,1,l,Aldi,2023-01-01\n'
+			',1.09,EUR,1,l,Aldi,2023-01-01\n'
+			'Milk,lots,EUR,1,l,Aldi,2023-01-01\n'
+			'Milk,1.099,EUR,1,l,Aldi,2023-01-01\n'
+			'Milk,1000.00,EUR,1,l,Aldi,2023-01-01\n'
+			'Milk,1.09,XYZ,1,l,Aldi,2023-01-01\n'
+			'Milk,1.09,EUR,0,l,Aldi,2023-01-01\n'
+			'Milk,1.09,EUR,1,furlong,Aldi,2023-01-01\n'
+			'Milk,1.09,EUR,1,l,Aldi,01/01/2023\n'
+		))
+
+		assert result.num_imported == 1
+		assert [error['line'] for error in result.errors] == [3, 4, 5, 6, 7, 8, 9, 10]
+		assert result.errors[0]['error'] == 'food_item is required.'
+		assert FoodPurchase.objects.count() == 1
+
+	# Names which fit, but are too long once title cased, are reported as row errors rather than failing the import.
+	def test_import_reports_names_too_long_when_title_cased(self, user):
+		result = import_csv(user, (
+			'Milk,1.09,EUR,1,l,Aldi,2023-01-01\n'
+			f'{"ß" * 100},1.09,EUR,1,l,Aldi,2023-01-01\n'
+		))
+
+		assert result.num_imported == 1
+		assert [error['line'] for error in result.errors] == [3]
+		assert result.errors[0]['error'].startswith('food_item is invalid: The name of a Food Item must be at most 100 characters.')
+		assert list(FoodItem.objects.values_list('name', flat=True)) == ['Milk']
+
+	def test_import_ndjson(self, user):
+		lines = [
+			json.dumps({'food_item': 'Milk', 'price_amount': '1.09', 'currency': 'EUR', 'quantity': 1, 'unit': 'l', 'location': 'Aldi', 'date': '2023-01-01'}),
+			'{not json',
+			'[1, 2]',
+			'',
+			json.dumps({'food_item': 'Oats', 'price_amount': 0.89, 'currency': 'EUR', 'quantity': '500', 'unit': 'g', 'location': 'Lidl', 'date': '2023-01-02'}),
+		]
+
+		result = import_purchases(user, read_ndjson(line + '\n' for line in lines))
+
+		assert result.num_imported == 2
+		assert [error['line'] for error in result.errors] == [2, 3]
+
+	# The number of queries depends upon the number of chunks, rather than the number of rows.
+	def test_import_query_count(self, user, django_assert_max_num_queries):
+		content = ''.join(f'Food Item {i},1.00,EUR,1,kg,Aldi,2023-01-01\n' for i in range(500))
+
+		with django_assert_max_num_queries(30):
+			result = import_csv(user, content, chunk_size=250)
+
+		assert result.num_imported == 500
+		assert result.num_food_items_created == 500
+
+	def test_import_command(self, user, tmp_path):
+		path = tmp_path / 'receipt.csv'
+		path.write_text(CSV_HEADER + 'Milk,1.09,EUR,1,l,Aldi,2023-01-01\n')
+
+		call_command('import_purchases', str(path), '--user', user.username)
+
+		assert FoodPurchase.objects.filter(food_item__user=user).count() == 1
+
+	# A file exported from one account can be imported into another.
+	def test_export_then_import(self, user, other_user, client, tmp_path):
+		milk = FoodItem.objects.create(name='Milk', user=user)
+		FoodPurchase.objects.create(food_item=milk, price_amount=1.09, currency='EUR', quantity=1, unit='l', location='Aldi', date=date(2023, 1, 1))
+
+		client.force_login(user)
+		response = client.get(reverse('purchase_export_ndjson'))
+
+		path = tmp_path / 'purchases.ndjson'
+		path.write_bytes(b''.join(response.streaming_content))
+
+		call_command('import_purchases', str(path), '--user', other_user.username)
+
+		purchase = FoodPurchase.objects.get(food_item__user=other_user)
+		assert (purchase.food_item.name, purchase.price_amount, purchase.date) == ('Milk', Decimal('1.09'), date(2023, 1, 1))
+
+	def test_import_endpoint(self, user, client):
+		client.force_login(user)
+		upload = SimpleUploadedFile('receipt.csv', (CSV_HEADER + 'Milk,1.09,EUR,1,l,Aldi,2023-01-01\nMilk,x,EUR,1,l,Aldi,2023-01-01\n').encode())
+
+		response = client.post(reverse('purchase_import'), {'file': upload})
+
+		assert response.status_code == 200
+		assert response.json() == {
+			'imported': 1,
+			'food_items_created': 1,
+			'errors': [{'line': 3, 'error': 'price_amount must be a number. Got x.'}],
+		}
+
+	def test_import_endpoint_invalid_format(self, user, client):
+		client.force_login(user)
+		upload = SimpleUploadedFile('receipt.xlsx', b'')
+
+		response = client.post(reverse('purchase_import'), {'file': upload})
+
+		assert response.status_code == 400
+
+	# Files which cannot be read are rejected as a whole, and nothing is imported from them.
+	@pytest.mark.parametrize('filename, content', [
+		('receipt.csv', CSV_HEADER.encode() + b'Milk,1.09,EUR,1,l,Aldi,2023-01-01\n\x89PNG\r\n\x1a\n\x00\x00\xff\xd8'),
+		('receipt.csv', (CSV_HEADER + 'Milk,1.09,EUR,1,l,Aldi,2023-01-01\nMilk,' + 'x' * 200000 + '\n').encode()),
+		('receipt.ndjson', b'{"food_item": "Milk"}\n\xff\xfe\x00\x01'),
+	])
+	def test_import_endpoint_unreadable_file(self, user, client, filename, content):
+		client.force_login(user)
+
+		response = client.post(reverse('purchase_import'), {'file': SimpleUploadedFile(filename, content)})
+
+		assert response.status_code == 400
+		assert not FoodPurchase.objects.exists()
+		assert not FoodItem.objects.exists()
+
+	@pytest.mark.parametrize('format_or_filename, reader', [
+		('csv', read_csv),
+		('receipt.CSV', read_csv),
+		('purchases.ndjson', read_ndjson),
+		('jsonl', read_ndjson),
+	])
+	def test_get_reader(self, format_or_filename, reader):
+		assert get_reader(format_or_filename) == reader
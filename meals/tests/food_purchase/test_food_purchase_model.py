@@ -1,4 +1,5 @@
 from datetime import date, timedelta
+from django.core.management import call_command
 from django.forms import ValidationError
 
 import pytest
@@ -6,5 +7,125 @@ import pytest
 from meals.models import FoodItem, FoodPurchase
 from meals.models.food_item import UserDuplicateFoodItemError
 
+today = date.today()
+last_week = today - timedelta(days=7)
+last_year = today - timedelta(days=365)
+
+def create_purchase(food_item, purchase_date, price_amount=1.00):
+	return FoodPurchase.objects.create(food_item=food_item, price_amount=price_amount, currency='EUR', quantity=1,
+									   unit='l', location='Aldi', date=purchase_date)
+
+def get_latest_purchase(food_item):
+	return FoodItem.objects.get(pk=food_item.pk).latest_purchase
+
 class TestFoodPurchaseModel:
-	pass
\ No newline at end of file
+
+	def test_latest_purchase_updated_on_create(self, user):
+		milk = FoodItem.objects.create(name='Milk', user=user)
+		assert get_latest_purchase(milk) is None
+
+		new_milk = create_purchase(milk, today)
+		create_purchase(milk, last_year)
+
+		assert get_latest_purchase(milk) == new_milk
+
+	def test_latest_purchase_updated_on_date_change(self, user):
+		milk = FoodItem.objects.create(name='Milk', user=user)
+		new_milk = create_purchase(milk, today)
+		old_milk = create_purchase(milk, last_week)
+
+		new_milk.date = last_year
+		new_milk.save()
+
+		assert get_latest_purchase(milk) == old_milk
+
+	def test_latest_purchase_updated_on_food_item_change(self, user):
+		milk = FoodItem.objects.create(name='Milk', user=user)
+		oats = FoodItem.objects.create(name='Oats', user=user)
+		old_milk = create_purchase(milk, last_week)
+		new_milk = create_purchase(milk, today)
+
+		new_milk.food_item = oats
+		new_milk.save()
+
+		assert get_latest_purchase(milk) == old_milk
+		assert get_latest_purchase(oats) == new_milk
+
+	def test_latest_purchase_updated_on_delete(self, user):
+		milk = FoodItem.objects.create(name='Milk', user=user)
+		old_milk = create_purchase(milk, last_week)
+		new_milk = create_purchase(milk, today)
+
+		new_milk.delete()
+		assert get_latest_purchase(milk) == old_milk
+
+		old_milk.delete()
+		assert get_latest_purchase(milk) is None
+
+	def test_latest_purchase_updated_on_bulk_create(self, user):
+		milk = FoodItem.objects.create(name='Milk', user=user)
+		oats = FoodItem.objects.create(name='Oats', user=user)
+
+		FoodPurchase.objects.bulk_create([
+			FoodPurchase(food_item=milk, price_amount=1.00, currency='EUR', quantity=1, unit='l', location='Aldi', date=last_week),
+			FoodPurchase(food_item=milk, price_amount=2.00, currency='EUR', quantity=1, unit='l', location='Aldi', date=today),
+			FoodPurchase(food_item=oats, price_amount=3.00, currency='EUR', quantity=1, unit='kg', location='Aldi', date=last_year),
+		])
+
+		assert get_latest_purchase(milk).price_amount == 2
+		assert get_latest_purchase(oats).price_amount == 3
+
+	# Purchases have the user of their food item, however they are created or moved.
+	def test_user_copied_from_food_item(self, user, other_user):
+		milk = FoodItem.objects.create(name='Milk', user=user)
+		other_milk = FoodItem.objects.create(name='Milk', user=other_user)
+
+		created = create_purchase(milk, today)
+		bulk_created, moved = FoodPurchase.objects.bulk_create([
+			FoodPurchase(food_item=milk, price_amount=1.00, currency='EUR', quantity=1, unit='l', location='Aldi', date=today),
+			FoodPurchase(food_item_id=milk.pk, price_amount=1.00, currency='EUR', quantity=1, unit='l', location='Aldi', date=today),
+		])
+
+		FoodPurchase.objects.filter(pk=moved.pk).update(food_item=other_milk)
+
+		assert list(FoodPurchase.objects.filter(user=user).order_by('pk')) == [created, bulk_created]
+		assert list(FoodPurchase.objects.filter(user=other_user)) == [moved]
+
+	def test_latest_purchase_updated_on_queryset_update(self, user):
+		milk = FoodItem.objects.create(name='Milk', user=user)
+		old_milk = create_purchase(milk, last_week)
+		new_milk = create_purchase(milk, today)
+
+		FoodPurchase.objects.filter(pk=new_milk.pk).update(date=last_year)
+
+		assert get_latest_purchase(milk) == old_milk
+
+	def test_latest_purchase_updated_on_queryset_delete(self, user):
+		milk = FoodItem.objects.create(name='Milk', user=user)
+		old_milk = create_purchase(milk, last_year)
+		create_purchase(milk, last_week)
+		create_purchase(milk, today)
+
+		FoodPurchase.objects.filter(date__gt=last_year).delete()
+
+		assert get_latest_purchase(milk) == old_milk
+
+	# Saving a FoodItem instance which holds an out of date latest purchase should not overwrite it.
+	def test_food_item_save_keeps_latest_purchase(self, user):
+		milk = FoodItem.objects.create(name='Milk', user=user)
+		new_milk = create_purchase(milk, today)
+
+		milk.name = 'Whole Milk'
+		milk.save()
+
+		assert get_latest_purchase(milk) == new_milk
+
+	def test_rebuild_latest_purchases_command(self, user):
+		milk = FoodItem.objects.create(name='Milk', user=user)
+		new_milk = create_purchase(milk, today)
+		create_purchase(milk, last_week)
+
+		FoodItem.objects.update(latest_purchase=None)
+		call_command('rebuild_latest_purchases')
+
+		assert get_latest_purchase(milk) == new_milk
@@ -0,0 +1,108 @@
+import re
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+
+from meals import pagination
+from meals.models import FoodItem, FoodPurchase, Meal, MealInstance
+
+# These tests check that the hot queries of the views are served by the indexes created in migrations/0004_query_indexes.py
+# and migrations/0008_purchase_instance_user.py. The tables are filled with many users' rows and analyzed, so that the plans
+# are the ones the planner would choose for tables where each user owns a small share of the rows.
+# Each user has cooked one in ten of their meals, twenty times each.
+pytestmark = pytest.mark.skipif(connection.vendor != 'postgresql', reason='Query plans are PostgreSQL specific.')
+
+NUM_USERS = 20
+
+@pytest.fixture
+def tables(user):
+	User.objects.bulk_create([User(username=f'other{i}') for i in range(NUM_USERS)])
+
+	with connection.cursor() as cursor:
+		cursor.execute('''
+			INSERT INTO meals_fooditem (name, user_id)
+			SELECT 'Food Item ' || i, auth_user.id FROM auth_user, generate_series(1, 100) i;
+
+			INSERT INTO meals_foodpurchase (food_item_id, user_id, price_amount, currency, quantity, unit, location, date)
+			SELECT meals_fooditem.id, meals_fooditem.user_id, 1, 'EUR', 1, 'kg', 'Aldi', CURRENT_DATE - i FROM meals_fooditem, generate_series(1, 20) i;
+
+			INSERT INTO meals_meal (name, user_id)
+			SELECT 'Meal ' || i, auth_user.id FROM auth_user, generate_series(1, 200) i;
+
+			INSERT INTO meals_mealinstance (meal_id, user_id, date, num_servings, rating, cook_time)
+			SELECT meals_meal.id, meals_meal.user_id, CURRENT_DATE - i, 1, 5, 10 FROM meals_meal, generate_series(1, 20) i WHERE meals_meal.id % 10 = 0;
+
+			ANALYZE meals_fooditem, meals_foodpurchase, meals_meal, meals_mealinstance;
+		''')
+
+def has_trigram_index():
+	with connection.cursor() as cursor:
+		cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'meals_fooditem_name_trgm_idx'")
+		return cursor.fetchone() is not None
+
+# Index scans show the index as 'using <index name> on <table>', and bitmap index scans as 'on <index name>'.
+def assert_uses_index(queryset, index_name):
+	plan = queryset.explain()
+
+	assert re.search(rf'(using|Bitmap Index Scan on) {index_name}\b', plan), plan
+
+class TestQueryPlans:
+
+	# FoodItem.get_newest_purchase() and the latest purchase refresh.
+	def test_newest_purchase_query(self, user, tables):
+		food_item = FoodItem.objects.filter(user=user).first()
+		queryset = FoodPurchase.objects.filter(food_item=food_item).order_by('-date', '-id')[:1]
+
+		assert_uses_index(queryset, 'meals_purchase_item_date_idx')
+
+	# Meal.meal_instances
+	def test_meal_instances_query(self, user, tables):
+		meal = Meal.objects.filter(user=user, mealinstance__isnull=False).first()
+
+		assert_uses_index(meal.meal_instances, 'meals_instance_meal_date_idx')
+
+	# price_record_list
+	def test_price_record_list_query(self, user, tables):
+		queryset, _ = pagination.get_page_queryset(FoodPurchase.objects.filter(user=user).select_related('food_item'), ['-date', '-id'], {})
+
+		assert_uses_index(queryset, 'meals_purchase_user_date_idx')
+
+	# meal_instance_list
+	def test_meal_instance_list_query(self, user, tables):
+		queryset, _ = pagination.get_page_queryset(MealInstance.objects.filter(user=user).select_related('meal'), ['-date', '-id'], {})
+
+		assert_uses_index(queryset, 'meals_instance_user_date_idx')
+
+	# food_item_list
+	def test_food_item_list_query(self, user, tables):
+		queryset, _ = pagination.get_page_queryset(FoodItem.objects.with_stats(user), ['name', 'id'], {})
+
+		assert_uses_index(queryset, 'meals_fooditem_user_name_idx')
+
+	# meal_list
+	def test_meal_list_query(self, user, tables):
+		queryset, _ = pagination.get_page_queryset(Meal.objects.with_stats(user), ['name', 'id'], {})
+
+		assert_uses_index(queryset, 'meals_meal_user_name_idx')
+
+	# FoodItem.check_for_duplicate()
+	def test_duplicate_check_query(self, user, tables):
+		queryset = FoodItem.objects.filter(name__iexact='Food Item 1', user=user)
+
+		assert_uses_index(queryset, 'meals_fooditem_user_upper_pattern_idx')
+
+	# The autocomplete prefix search of users with too many food items to index in memory.
+	def test_name_prefix_search_query(self, user, tables):
+		queryset = FoodItem.objects.filter(user=user, name__istartswith='Food Item 42')
+
+		assert_uses_index(queryset, 'meals_fooditem_user_upper_pattern_idx')
+
+	# The autocomplete similarity search of users with too many food items to index in memory.
+	def test_name_contains_search_query(self, user, tables):
+		if not has_trigram_index():
+			pytest.skip('The pg_trgm extension is not available.')
+
+		queryset = FoodItem.objects.filter(name__icontains='ilk')
+
+		assert_uses_index(queryset, 'meals_fooditem_name_trgm_idx')
@@ -0,0 +1,184 @@
+import json
+
+import pytest
+
+from meals.forms import BaseStandardIngredientFormSet, StandardIngredientForm
+from meals.models import FoodItem, Meal, MealCostChange, StandardIngredient
+from django.forms import formset_factory
+
+def post_json(client, url, body):
+	return client.post(url, json.dumps(body), content_type='application/json')
+
+def get_formset_data(food_items):
+	data = {
+		'ingredient-TOTAL_FORMS': len(food_items),
+		'ingredient-INITIAL_FORMS': 0,
+		'name': 'Porridge',
+	}
+
+	for index, food_item in enumerate(food_items):
+		data[f'ingredient-{index}-food_item'] = food_item
+		data[f'ingredient-{index}-quantity'] = 100
+		data[f'ingredient-{index}-unit'] = 'g'
+		data[f'ingredient-{index}-form_type'] = 'standard_ingredient'
+
+	return data
+
+# The number of queries taken to save a meal does not depend on its number of ingredients.
+def test_meal_form_queries_do_not_grow_with_ingredients(client, user, django_assert_max_num_queries):
+	food_items = [FoodItem.objects.create(name=f'Food {number}', user=user).id for number in range(20)]
+	client.force_login(user)
+
+	# The session and user, the food items chosen by id, those named (three queries on SQLite),
+	# the savepoint, and the meal, ingredient and cost change inserts.
+	with django_assert_max_num_queries(12):
+		response = client.post('/meals/', get_formset_data(food_items + ['Oats', 'oats']))
+
+	meal = Meal.objects.get()
+	assert response.status_code == 302
+	assert StandardIngredient.objects.filter(meal=meal).count() == 22
+	assert FoodItem.objects.filter(user=user, name='Oats').count() == 1
+	assert MealCostChange.objects.filter(meal_id=meal.id).exists()
+
+def test_formset_rejects_other_users_food_items(user, other_user):
+	food_item = FoodItem.objects.create(name='Oats', user=other_user)
+	formset = formset_factory(StandardIngredientForm, formset=BaseStandardIngredientFormSet, extra=0)(
+		get_formset_data([str(food_item.id), '999']), prefix='ingredient', form_kwargs={'user': user}
+	)
+
+	for form in formset:
+		form.instance.meal = Meal(name='Porridge', user=user)
+
+	assert not formset.is_valid()
+	assert 'food_item' in formset.errors[0]
+	assert 'food_item' in formset.errors[1]
+
+def test_batch_create(client, user, other_user):
+	oats = FoodItem.objects.create(name='Oats', user=user)
+	client.force_login(user)
+
+	response = post_json(client, '/meals/batch/', {'meals': [
+		{'name': 'Porridge', 'ingredients': [
+			{'food_item': oats.id, 'quantity': 80, 'unit': 'g'},
+			{'food_item': 'oat milk', 'quantity': '250', 'unit': 'ml'},
+		]},
+		{'name': 'Toast', 'ingredients': [{'food_item': 'Bread', 'quantity': 2, 'unit': 'pc'}]},
+		{'name': 'Water'},
+	]})
+
+	assert response.status_code == 201
+
+	meals = response.json()['meals']
+	assert [(meal['name'], meal['num_ingredients']) for meal in meals] == [('Porridge', 2), ('Toast', 1), ('Water', 0)]
+
+	porridge = Meal.objects.get(pk=meals[0]['id'], user=user)
+	assert [(ingredient.food_item.name, ingredient.quantity, ingredient.unit) for ingredient in porridge.standard_ingredients.order_by('pk')] == [
+		('Oats', 80, 'g'),
+		('Oat Milk', 250, 'ml'),
+	]
+
+def test_batch_create_is_all_or_nothing(client, user, other_user):
+	food_item = FoodItem.objects.create(name='Oats', user=other_user)
+	client.force_login(user)
+
+	response = post_json(client, '/meals/batch/', {'meals': [
+		{'name': 'Toast', 'ingredients': [{'food_item': 'Bread', 'quantity': 2, 'unit': 'pc'}]},
+		{'name': '', 'ingredients': []},
+		{'name': 'Porridge', 'ingredients': [
+			{'food_item': food_item.id, 'quantity': 80, 'unit': 'g'},
+			{'food_item': 'Milk', 'quantity': 200, 'unit': 'bushels'},
+		]},
+	]})
+
+	assert response.status_code == 400
+
+	errors = response.json()['errors']
+	assert set(errors) == {'1', '2'}
+	assert 'name' in errors['1']
+	assert set(errors['2']['ingredients']) == {'0', '1'}
+	assert 'food_item' in errors['2']['ingredients']['0']
+	assert 'unit' in errors['2']['ingredients']['1']
+
+	assert not Meal.objects.exists()
+	assert not FoodItem.objects.filter(user=user).exists()
+
+@pytest.mark.parametrize('body', ['not json', '[]', '{"meals": []}', '{"meals": [1]}'])
+def test_batch_create_rejects_invalid_bodies(client, user, body):
+	client.force_login(user)
+
+	response = client.post('/meals/batch/', body, content_type='application/json')
+
+	assert response.status_code == 400
+	assert 'error' in response.json()
+
+def test_batch_create_size_limit(client, user, settings):
+	settings.MEAL_BATCH_SIZE = 2
+	client.force_login(user)
+
+	response = post_json(client, '/meals/batch/', {'meals': [{'name': 'Toast'}] * 3})
+
+	assert response.status_code == 400
+	assert not Meal.objects.exists()
+
+def test_batch_requires_login(client):
+	assert post_json(client, '/meals/batch/', {'meals': [{'name': 'Toast'}]}).status_code == 401
+	assert post_json(client, '/meals/clone/', {'meals': [{'id': 1}]}).status_code == 401
+
+def test_clone(client, user, other_user, django_assert_max_num_queries):
+	oats = FoodItem.objects.create(name='Oats', user=user)
+	milk = FoodItem.objects.create(name='Milk', user=user)
+	porridge = Meal.objects.create(name='Porridge', user=user)
+	toast = Meal.objects.create(name='Toast', user=user)
+	StandardIngredient.objects.create(meal=porridge, food_item=oats, quantity=80, unit='g')
+	StandardIngredient.objects.create(meal=porridge, food_item=milk, quantity=200, unit='ml')
+
+	# Two to load the meals and ingredients, the savepoint, and the meal, ingredient and cost change inserts.
+	with django_assert_max_num_queries(7):
+		copies = Meal.objects.filter(pk__in=[porridge.pk, toast.pk]).clone([(porridge.pk, None), (toast.pk, 'More Toast')])
+
+	assert [(copy.name, copy.user, copy.num_ingredients) for copy in copies] == [('Porridge (copy)', user, 2), ('More Toast', user, 0)]
+	assert [(ingredient.food_item, ingredient.quantity, ingredient.unit) for ingredient in copies[0].standard_ingredients.order_by('pk')] == [
+		(oats, 80, 'g'),
+		(milk, 200, 'ml'),
+	]
+	assert porridge.standard_ingredients.count() == 2
+
+def test_clone_endpoint(client, user, other_user):
+	porridge = Meal.objects.create(name='Porridge', user=user)
+	pizza = Meal.objects.create(name='Pizza', user=other_user)
+	client.force_login(user)
+
+	response = post_json(client, '/meals/clone/', {'meals': [{'id': porridge.pk}, {'id': pizza.pk}, {'id': 'x'}, {'id': True}]})
+
+	assert response.status_code == 400
+	assert set(response.json()['errors']) == {'1', '2', '3'}
+	assert response.json()['errors']['3'] == {'id': ['id must be the id of a meal.']}
+	assert Meal.objects.count() == 2
+
+	response = post_json(client, '/meals/clone/', {'meals': [{'id': porridge.pk, 'name': 'Porridge for two'}]})
+
+	assert response.status_code == 201
+	assert [meal['name'] for meal in response.json()['meals']] == ['Porridge for two']
+	assert Meal.objects.filter(user=user).count() == 2
+
+# A meal can be copied more than once in a batch, and the copies are returned in the order they were asked for.
+def test_clone_meal_more_than_once(client, user):
+	oats = FoodItem.objects.create(name='Oats', user=user)
+	porridge = Meal.objects.create(name='Porridge', user=user)
+	toast = Meal.objects.create(name='Toast', user=user)
+	StandardIngredient.objects.create(meal=porridge, food_item=oats, quantity=80, unit='g')
+	client.force_login(user)
+
+	response = post_json(client, '/meals/clone/', {'meals': [
+		{'id': porridge.pk, 'name': 'Porridge for two'},
+		{'id': toast.pk},
+		{'id': porridge.pk},
+	]})
+
+	assert response.status_code == 201
+	assert [(meal['name'], meal['num_ingredients']) for meal in response.json()['meals']] == [
+		('Porridge for two', 1),
+		('Toast (copy)', 0),
+		('Porridge (copy)', 1),
+	]
+	assert Meal.objects.filter(user=user).count() == 5
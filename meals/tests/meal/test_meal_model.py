@@ -5,6 +5,7 @@ from pprint import pprint
 import pytest
 
 from meals.models import FoodItem, FoodPurchase, Meal, MealInstance, StandardIngredient
+from meals.pricing import get_ingredient_prices
 
 # Test that getting a meal's standard ingredients returns the correct items.
 def test_get_meal_standard_ingredients(user):
@@ -133,3 +134,50 @@ def test_get_newest_ingredient_price_no_unit_conversion(user, oats_ingredient_qt
 
 	assert porridge.get_newest_ingredient_price('oats') == oats_ingredient_price
 
+
+# Ingredients which cannot be priced have no price, as in the pricing engine.
+def test_get_newest_ingredient_price_without_density(user):
+	milk = FoodItem.objects.create(name='Milk', user=user)
+	porridge = Meal.objects.create(name='Porridge', user=user)
+	ingredient = StandardIngredient.objects.create(meal=porridge, food_item=milk, quantity=100, unit='ml')
+	FoodPurchase.objects.create(food_item=milk, price_amount=1.00, currency='EUR', quantity=1, unit='kg', location='Lidl', date=date.today())
+
+	assert porridge.get_newest_ingredient_price('milk') is None
+	assert ingredient.get_newest_price() == 'N/A'
+	assert get_ingredient_prices([ingredient]) == {ingredient.id: None}
+
+def test_get_newest_ingredient_price_without_fx_rate(user):
+	oats = FoodItem.objects.create(name='Oats', user=user)
+	porridge = Meal.objects.create(name='Porridge', user=user)
+	ingredient = StandardIngredient.objects.create(meal=porridge, food_item=oats, quantity=100, unit='g')
+	FoodPurchase.objects.create(food_item=oats, price_amount=1.00, currency='GBP', quantity=1, unit='kg', location='Tesco', date=date.today())
+
+	assert porridge.get_newest_ingredient_price('oats') is None
+	assert ingredient.get_newest_price() == 'N/A'
+	assert get_ingredient_prices([ingredient]) == {ingredient.id: None}
+
+def test_meals_with_stats(user, other_user):
+	porridge = Meal.objects.create(name='Porridge', user=user)
+	toast 	 = Meal.objects.create(name='Toast', user=user)
+	Meal.objects.create(name='Salad', user=other_user)
+
+	oats = FoodItem.objects.create(name='Oats', user=user)
+	milk = FoodItem.objects.create(name='Milk', user=user)
+	StandardIngredient.objects.create(meal=porridge, food_item=oats, quantity=50, unit='g')
+	StandardIngredient.objects.create(meal=porridge, food_item=milk, quantity=100, unit='ml')
+
+	MealInstance.objects.create(meal=porridge, date=date.today(), num_servings=1, rating=5, cook_time=10)
+	MealInstance.objects.create(meal=porridge, date=date.today(), num_servings=1, rating=5, cook_time=15)
+	MealInstance.objects.create(meal=porridge, date=date.today(), num_servings=1, rating=5, cook_time=15)
+
+	meals = {meal.name: meal for meal in Meal.objects.with_stats(user)}
+
+	assert set(meals) == {'Porridge', 'Toast'}
+
+	assert meals['Porridge'].times_cooked == 3
+	assert meals['Porridge'].num_ingredients == 2
+	assert meals['Porridge'].format_avg_cook_time() == '13 minutes'
+
+	assert meals['Toast'].times_cooked == 0
+	assert meals['Toast'].num_ingredients == 0
+	assert meals['Toast'].format_avg_cook_time() == 'N/A'
@@ -0,0 +1,132 @@
+import os
+import subprocess
+import sys
+from datetime import date
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import AsyncClient
+from django.urls import reverse
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+from prometheus_client.parser import text_string_to_metric_families
+
+from meals import cache
+from meals.models import FoodItem, FoodPurchase, Meal, StandardIngredient
+
+@pytest.fixture(autouse=True)
+def metrics_token(settings):
+	settings.METRICS_TOKEN = 'secret'
+
+def get_samples(client, **headers):
+	response = client.get(reverse('metrics'), **{'HTTP_AUTHORIZATION': 'Bearer secret', **headers})
+	assert response.status_code == 200
+
+	return {
+		(sample.name, tuple(sorted(sample.labels.items()))): sample.value
+		for family in text_string_to_metric_families(response.content.decode())
+		for sample in family.samples
+	}
+
+def get_sample(samples, name, **labels):
+	return samples.get((name, tuple(sorted(labels.items()))), 0)
+
+def test_request_metrics(user, client):
+	client.force_login(user)
+
+	before = get_samples(client)
+	client.get(reverse('food_item_list'))
+	after = get_samples(client)
+
+	assert get_sample(after, 'mealpricetracker_request_duration_seconds_count', view='food_item_list') == \
+		get_sample(before, 'mealpricetracker_request_duration_seconds_count', view='food_item_list') + 1
+	assert get_sample(after, 'mealpricetracker_requests_total', view='food_item_list', method='GET', status='200') == \
+		get_sample(before, 'mealpricetracker_requests_total', view='food_item_list', method='GET', status='200') + 1
+	assert get_sample(after, 'mealpricetracker_request_queries_sum', view='food_item_list') > \
+		get_sample(before, 'mealpricetracker_request_queries_sum', view='food_item_list')
+
+@async_to_sync
+async def async_get(client, path):
+	return await client.get(path)
+
+# Async requests are recorded by the async middleware, with the queries run by sync_to_async() in the views.
+def test_async_request_metrics(user, client):
+	async_client = AsyncClient()
+	async_client.force_login(user)
+
+	before = get_samples(client)
+	response = async_get(async_client, reverse('food_item_list'))
+	after = get_samples(client)
+
+	assert response.status_code == 200
+	assert get_sample(after, 'mealpricetracker_requests_total', view='food_item_list', method='GET', status='200') == \
+		get_sample(before, 'mealpricetracker_requests_total', view='food_item_list', method='GET', status='200') + 1
+	assert get_sample(after, 'mealpricetracker_request_queries_sum', view='food_item_list') > \
+		get_sample(before, 'mealpricetracker_request_queries_sum', view='food_item_list')
+
+def test_pricing_and_cache_metrics(user, client):
+	meal = Meal.objects.create(name='Porridge', user=user)
+	oats = FoodItem.objects.create(name='Oats', user=user)
+	StandardIngredient.objects.create(meal=meal, food_item=oats, quantity=100, unit='g')
+	FoodPurchase.objects.create(food_item=oats, price_amount=1, currency='EUR', quantity=1, unit='kg', location='Aldi', date=date(2024, 1, 1))
+
+	before = get_samples(client)
+
+	meal.get_newest_price()
+	oats.get_newest_price()
+	cache.get_meal_prices(user, [meal])
+	cache.get_meal_prices(user, [meal])
+
+	after = get_samples(client)
+
+	for operation in ['meal_newest_price', 'food_item_newest_price']:
+		assert get_sample(after, 'mealpricetracker_pricing_duration_seconds_count', operation=operation) == \
+			get_sample(before, 'mealpricetracker_pricing_duration_seconds_count', operation=operation) + 1
+
+	for result in ['hit', 'miss']:
+		assert get_sample(after, 'mealpricetracker_price_cache_requests_total', result=result) == \
+			get_sample(before, 'mealpricetracker_price_cache_requests_total', result=result) + 1
+
+def test_metrics_token(client):
+	assert client.get(reverse('metrics')).status_code == 401
+	assert client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code == 401
+	assert get_samples(client)
+
+# Without a token, the metrics are only shown to staff.
+def test_metrics_without_token(settings, user, client):
+	settings.METRICS_TOKEN = None
+
+	assert client.get(reverse('metrics')).status_code == 401
+	assert client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer None').status_code == 401
+
+	client.force_login(user)
+	assert client.get(reverse('metrics')).status_code == 403
+
+	user.is_staff = True
+	user.save()
+	assert client.get(reverse('metrics')).status_code == 200
+
+# With PROMETHEUS_MULTIPROC_DIR set, the metrics of every process are added up.
+def test_metrics_are_aggregated_across_processes(tmp_path):
+	script = (
+		'from meals import metrics\n'
+		'metrics.PRICE_CACHE_REQUESTS.labels("hit").inc(2)\n'
+		'metrics.REQUEST_LATENCY.labels("food_item_list").observe(0.1)\n'
+	)
+	environment = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': str(tmp_path), 'DJANGO_SETTINGS_MODULE': 'mealpricetracker.settings'}
+
+	for _ in range(2):
+		subprocess.run([sys.executable, '-c', script], env=environment, cwd=settings.BASE_DIR, check=True)
+
+	registry = CollectorRegistry()
+	MultiProcessCollector(registry, path=str(tmp_path))
+
+	samples = {
+		(sample.name, tuple(sorted(sample.labels.items()))): sample.value
+		for family in text_string_to_metric_families(generate_latest(registry).decode())
+		for sample in family.samples
+	}
+
+	assert get_sample(samples, 'mealpricetracker_price_cache_requests_total', result='hit') == 4
+	assert get_sample(samples, 'mealpricetracker_request_duration_seconds_count', view='food_item_list') == 2
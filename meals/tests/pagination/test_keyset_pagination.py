@@ -0,0 +1,130 @@
+import re
+from datetime import date, timedelta
+
+import pytest
+from django.templatetags.static import static
+from django.urls import reverse
+
+from meals import pagination
+from meals.models import FoodItem, FoodPurchase, Meal, MealInstance
+
+@pytest.fixture
+def purchases(user):
+	milk = FoodItem.objects.create(name='Milk', user=user)
+
+	# Two purchases on each day, so that pages must be split between rows with the same date.
+	return [
+		FoodPurchase.objects.create(food_item=milk, price_amount=1, currency='EUR', quantity=1, unit='l', location=f'Shop {number}', date=date(2024, 1, 1) + timedelta(days=number // 2))
+		for number in range(7)
+	]
+
+def get_next_page_url(response):
+	match = re.search(r'hx-get="([^"]+)"', response.content.decode())
+
+	return match.group(1).replace('&amp;', '&') if match else None
+
+def get_locations(response):
+	return re.findall(r'<td>(Shop \d)</td>', response.content.decode())
+
+def test_pages_follow_each_other(user, client, purchases):
+	client.force_login(user)
+
+	url = reverse('purchase_list') + '?page_size=3'
+	pages = []
+
+	while url:
+		response = client.get(url)
+		assert response.status_code == 200
+
+		pages.append(get_locations(response))
+		url = get_next_page_url(response)
+
+	expected = [purchase.location for purchase in sorted(purchases, key=lambda purchase: (purchase.date, purchase.id), reverse=True)]
+
+	assert pages == [expected[0:3], expected[3:6], expected[6:7]]
+
+# Rows added after the first page is loaded do not shift the later pages.
+def test_new_rows_do_not_shift_pages(user, client, purchases):
+	client.force_login(user)
+
+	response = client.get(reverse('purchase_list') + '?page_size=3')
+	first_page = get_locations(response)
+
+	FoodPurchase.objects.create(food_item=purchases[0].food_item, price_amount=1, currency='EUR', quantity=1, unit='l', location='Shop 9', date=date(2024, 2, 1))
+
+	second_page = get_locations(client.get(get_next_page_url(response)))
+
+	assert 'Shop 9' not in first_page + second_page
+	assert len(set(first_page + second_page)) == 6
+
+def test_htmx_requests_get_only_rows(user, client, purchases):
+	client.force_login(user)
+
+	response = client.get(reverse('purchase_list') + '?page_size=3', HTTP_HX_REQUEST='true')
+	content = response.content.decode()
+
+	assert '<html>' not in content
+	assert content.strip().startswith('<tr>')
+	assert len(get_locations(response)) == 3
+	assert 'page_size=3' in get_next_page_url(response)
+
+# The pages load htmx from the app's own static files, rather than from a CDN.
+def test_pages_load_htmx_from_static_files(user, client, purchases):
+	client.force_login(user)
+
+	content = client.get(reverse('purchase_list')).content.decode()
+	scripts = [script for script in re.findall(r'<script src="([^"]+)"', content) if 'htmx' in script]
+
+	assert scripts == [static('meals/js/htmx.min.js')]
+
+def test_last_page_has_no_next_page(user, client, purchases):
+	client.force_login(user)
+	response = client.get(reverse('purchase_list'))
+
+	assert len(get_locations(response)) == 7
+	assert get_next_page_url(response) is None
+
+@pytest.mark.parametrize('params', ['cursor=abc', 'cursor=WzFd', 'page_size=0', 'page_size=many', 'page_size=100000'])
+def test_invalid_parameters(user, client, purchases, params):
+	client.force_login(user)
+
+	assert client.get(reverse('purchase_list') + '?' + params).status_code == 400
+
+@pytest.mark.parametrize('view_name', ['food_item_list', 'meal_list', 'meal_instance_list'])
+def test_other_lists_are_paginated(user, client, view_name):
+	for number in range(3):
+		meal = Meal.objects.create(name=f'Meal {number}', user=user)
+		FoodItem.objects.create(name=f'Food {number}', user=user)
+		MealInstance.objects.create(meal=meal, date=date(2024, 1, 1), num_servings=1, rating=5, cook_time=10)
+
+	client.force_login(user)
+
+	first_page = client.get(reverse(view_name) + '?page_size=2')
+	second_page = client.get(get_next_page_url(first_page))
+
+	assert second_page.status_code == 200
+	assert get_next_page_url(second_page) is None
+
+# The meal page only shows, and prices, a page of the meal's instances, and htmx loads the rest as rows.
+def test_meal_instances_of_meal_are_paginated(user, client):
+	meal = Meal.objects.create(name='Porridge', user=user)
+
+	for day in range(3):
+		MealInstance.objects.create(meal=meal, date=date(2024, 1, 1) + timedelta(days=day), num_servings=1, rating=5, cook_time=10)
+
+	client.force_login(user)
+
+	first_page = client.get(reverse('meals_item', args=[meal.id]) + '?page_size=2')
+	second_page = client.get(get_next_page_url(first_page), HTTP_HX_REQUEST='true')
+
+	assert 'Meal Instances: 3' in first_page.content.decode()
+	assert re.findall(r'<td>(Jan\. \d+, 2024)</td>', first_page.content.decode()) == ['Jan. 3, 2024', 'Jan. 2, 2024']
+	assert re.findall(r'<td>(Jan\. \d+, 2024)</td>', second_page.content.decode()) == ['Jan. 1, 2024']
+	assert get_next_page_url(second_page) is None
+	assert client.get(reverse('meals_item', args=[meal.id]) + '?cursor=abc').status_code == 400
+
+def test_cursors_round_trip():
+	ordering = ['-date', '-id']
+	cursor = pagination.encode_cursor([date(2024, 1, 2), 5])
+
+	assert pagination.decode_cursor(cursor, FoodPurchase, ordering) == [date(2024, 1, 2), 5]
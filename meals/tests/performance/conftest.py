@@ -0,0 +1,80 @@
+from datetime import date, timedelta
+
+import pytest
+
+from meals.models import FoodItem, FoodPurchase, Meal, MealInstance, StandardIngredient
+
+# The latency percentiles recorded for each view and size, reported at the end of the test run.
+recorded_latencies = []
+
+# Add data to the user's account until it contains n food items and n meals.
+# The first meal uses every food item, and the first food item is used by every meal,
+# so that the detail pages of both also grow with n.
+def seed(user, n):
+	num_existing = FoodItem.objects.filter(user=user).count()
+	new_range = range(num_existing, n)
+
+	if not new_range:
+		return
+
+	FoodItem.objects.bulk_create([FoodItem(name=f'Food Item {i:05}', user=user) for i in new_range])
+	Meal.objects.bulk_create([Meal(name=f'Meal {i:05}', user=user) for i in new_range])
+
+	food_items = list(FoodItem.objects.filter(user=user).order_by('name'))
+	meals = list(Meal.objects.filter(user=user).order_by('name'))
+	today = date.today()
+
+	purchases = []
+	ingredients = []
+	instances = []
+
+	for i in new_range:
+		food_item, meal = food_items[i], meals[i]
+
+		purchases += [
+			FoodPurchase(food_item=food_item, price_amount=2.00, currency='EUR', quantity=1, unit='kg', location='Lidl', date=today - timedelta(days=30)),
+			FoodPurchase(food_item=food_item, price_amount=1.00, currency='EUR', quantity=500, unit='g', location='Aldi', date=today),
+			FoodPurchase(food_item=food_items[0], price_amount=1.50, currency='EUR', quantity=1, unit='kg', location='Rewe', date=today - timedelta(days=i)),
+		]
+
+		ingredients.append(StandardIngredient(meal=meals[0], food_item=food_item, quantity=100, unit='g'))
+
+		if i > 0:
+			ingredients += [
+				StandardIngredient(meal=meal, food_item=food_items[0], quantity=50, unit='g'),
+				StandardIngredient(meal=meal, food_item=food_item, quantity=200, unit='g'),
+			]
+
+		instances += [
+			MealInstance(meal=meal, date=today, num_servings=2, rating=4, cook_time=30),
+			MealInstance(meal=meals[0], date=today - timedelta(days=i), num_servings=1, rating=5, cook_time=20),
+		]
+
+	FoodPurchase.objects.bulk_create(purchases)
+	StandardIngredient.objects.bulk_create(ingredients)
+	MealInstance.objects.bulk_create(instances)
+
+@pytest.fixture
+def seeded_user(user):
+	def seed_to(n):
+		seed(user, n)
+		return user
+
+	return seed_to
+
+@pytest.fixture
+def latency_results():
+	return recorded_latencies
+
+def pytest_terminal_summary(terminalreporter):
+	if not recorded_latencies:
+		return
+
+	terminalreporter.section('view latency (ms)')
+	terminalreporter.write_line(f'{"view":<24}{"size":>6}{"queries":>9}{"p50":>9}{"p95":>9}{"max":>9}')
+
+	for result in recorded_latencies:
+		terminalreporter.write_line(
+			f'{result["view"]:<24}{result["size"]:>6}{result["queries"]:>9}'
+			f'{result["p50"]:>9.1f}{result["p95"]:>9.1f}{result["max"]:>9.1f}'
+		)
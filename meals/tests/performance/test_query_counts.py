@@ -0,0 +1,87 @@
+import statistics
+import time
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from meals.models import FoodItem, Meal
+
+# The sizes of the data sets that each view is benchmarked against.
+SIZES = [10, 100, 1000]
+
+# The number of times each page is requested when measuring its latency.
+NUM_REQUESTS = 5
+
+# Each view should run the same number of queries however much data the user has.
+# The view is requested at each of the sizes in SIZES, and the query counts compared.
+pytestmark = pytest.mark.benchmark
+
+def get_first_meal(user):
+	return Meal.objects.filter(user=user).order_by('name').first()
+
+def get_first_food_item(user):
+	return FoodItem.objects.filter(user=user).order_by('name').first()
+
+VIEWS = {
+	'meal_list': lambda user: reverse('meal_list'),
+	'meals_item': lambda user: reverse('meals_item', args=[get_first_meal(user).id]),
+	'food_item_list': lambda user: reverse('food_item_list'),
+	'food_item': lambda user: reverse('food_item', args=[get_first_food_item(user).id]),
+	'price_record_list': lambda user: reverse('purchase_list'),
+	'meal_instance_list': lambda user: reverse('meal_instance_list'),
+}
+
+def measure_view(client, url):
+	with CaptureQueriesContext(connection) as queries:
+		response = client.get(url)
+
+	assert response.status_code == 200
+
+	# The queries must be counted before any more requests are made, as each request resets the query log.
+	num_queries = len(queries)
+	timings = []
+
+	for _ in range(NUM_REQUESTS):
+		start = time.perf_counter()
+		client.get(url)
+		timings.append((time.perf_counter() - start) * 1000)
+
+	return num_queries, timings
+
+def record_latency(latency_results, record_property, view_name, size, num_queries, timings):
+	result = {
+		'view': view_name,
+		'size': size,
+		'queries': num_queries,
+		'p50': statistics.median(timings),
+		'p95': statistics.quantiles(timings, n=20, method='inclusive')[-1],
+		'max': max(timings),
+	}
+
+	latency_results.append(result)
+	record_property(f'{view_name}_{size}', result)
+
+@pytest.mark.parametrize('view_name', [
+	'meal_list',
+	'meals_item',
+	'food_item_list',
+	'food_item',
+	'price_record_list',
+	'meal_instance_list',
+])
+def test_query_count_constant(client, seeded_user, latency_results, record_property, view_name):
+	query_counts = {}
+
+	for size in SIZES:
+		user = seeded_user(size)
+		client.force_login(user)
+
+		url = VIEWS[view_name](user)
+		num_queries, timings = measure_view(client, url)
+
+		query_counts[size] = num_queries
+		record_latency(latency_results, record_property, view_name, size, num_queries, timings)
+
+	assert len(set(query_counts.values())) == 1, f'Query counts for {view_name} vary with size: {query_counts}'
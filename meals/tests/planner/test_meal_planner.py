@@ -0,0 +1,180 @@
+import itertools
+import random
+import time
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from meals import planner
+from meals.models import FoodItem, FoodPurchase, Meal, MealInstance, StandardIngredient
+
+# (name, price, rating, cook time, servings)
+MEALS = [
+	('Toast', '1.00', 2, 5, 1),
+	('Pasta', '2.00', 3, 20, 2),
+	('Curry', '3.00', 5, 60, 4),
+	('Salad', '4.00', 4, 10, 1),
+	('Stew', '5.00', 5, 90, 4),
+]
+
+@pytest.fixture
+def meals(user):
+	meals = {}
+
+	for name, price, rating, cook_time, servings in MEALS:
+		meal = Meal.objects.create(name=name, user=user)
+		food_item = FoodItem.objects.create(name=f'{name} Ingredients', user=user)
+
+		StandardIngredient.objects.create(meal=meal, food_item=food_item, quantity=1, unit='pc')
+		FoodPurchase.objects.create(food_item=food_item, price_amount=price, currency='EUR', quantity=1, unit='pc', location='Aldi', date=date(2024, 1, 1))
+		MealInstance.objects.create(meal=meal, date=date(2024, 1, 2), num_servings=servings, rating=rating, cook_time=cook_time)
+
+		meals[name] = meal
+
+	# Meals without a price are not planned.
+	Meal.objects.create(name='Air', user=user)
+
+	return meals
+
+def get_names(plan):
+	return [meal.name for meal in plan.meals]
+
+def assert_no_repeats(order, no_repeat_days):
+	for day, index in enumerate(order):
+		assert index not in order[max(0, day - no_repeat_days + 1):day]
+
+def test_cheapest_plan(user, meals):
+	plan = planner.plan_meals(user, planner.PlanParameters(days=3, no_repeat_days=1, solver='branch_and_bound'))
+
+	assert plan.optimal
+	assert get_names(plan) == ['Toast'] * 3
+	assert plan.total == Decimal('3.00')
+
+def test_no_repeats(user, meals):
+	plan = planner.plan_meals(user, planner.PlanParameters(days=7, no_repeat_days=3, solver='branch_and_bound'))
+
+	assert sorted(get_names(plan)) == ['Curry', 'Curry', 'Pasta', 'Pasta', 'Toast', 'Toast', 'Toast']
+	assert get_names(plan)[::3] == ['Toast'] * 3
+	assert plan.total == Decimal('13.00')
+
+	# Five meals cannot fill a week without repeats.
+	assert not planner.plan_meals(user, planner.PlanParameters(days=7, no_repeat_days=7)).feasible
+
+def test_constraints(user, meals):
+	parameters = planner.PlanParameters(days=4, servings=2, max_cook_time=60, min_rating=Decimal('3.5'), no_repeat_days=4, solver='branch_and_bound')
+	plan = planner.plan_meals(user, parameters)
+
+	# Toast and Salad are cooked twice a day to make two servings. Stew takes too long.
+	assert sorted(get_names(plan)) == ['Curry', 'Pasta', 'Salad', 'Toast']
+	assert plan.total == Decimal('2.00') + Decimal('2.00') + Decimal('3.00') + Decimal('8.00')
+	assert plan.as_dict()['average_rating'] == 3.5
+
+	parameters.budget = Decimal('14.99')
+	assert not planner.plan_meals(user, parameters).feasible
+
+def test_meal_plan_view(client, user, meals):
+	client.force_login(user)
+
+	response = client.get('/meals/plan.json', {'days': 2, 'min_rating': 4, 'solver': 'branch_and_bound'})
+
+	assert response.status_code == 200
+	# Pasta is rated below 4, but the average rating of the plan is not.
+	assert response.json()['total'] == '5.00'
+	assert [day['name'] for day in response.json()['days']] == ['Pasta', 'Curry']
+
+	assert client.get('/meals/plan.json', {'days': 100}).status_code == 400
+	assert client.get('/meals/plan.json', {'budget': 'cheap'}).status_code == 400
+	assert client.get('/meals/plan.json', {'solver': 'magic'}).status_code == 400
+
+def test_meal_plan_view_requires_login(client):
+	assert client.get('/meals/plan.json').status_code == 401
+
+# Every choice within the use limits can be ordered without repeats.
+def test_schedule():
+	generator = random.Random(0)
+
+	for _ in range(500):
+		days = generator.randint(1, 20)
+		no_repeat_days = generator.randint(1, days)
+		max_uses, num_max_uses = planner.get_use_limits(days, no_repeat_days)
+		uses = []
+
+		while sum(uses) < days:
+			at_max = sum(count == max_uses for count in uses) == num_max_uses
+			uses.append(generator.randint(1, min(max_uses - at_max or 1, days - sum(uses))))
+
+		order = planner.schedule(np.array(uses), no_repeat_days)
+
+		assert sorted(order) == sorted(index for index, count in enumerate(uses) for _ in range(count))
+		assert_no_repeats(order, no_repeat_days)
+
+def brute_force(costs, excesses, days, max_uses, num_max_uses, budget):
+	best = None
+
+	for uses in itertools.product(range(max_uses + 1), repeat=len(costs)):
+		if sum(uses) != days or sum(count == max_uses for count in uses) > num_max_uses:
+			continue
+
+		if np.dot(uses, excesses) < -planner.RATING_TOLERANCE:
+			continue
+
+		cost = int(np.dot(uses, costs))
+
+		if (budget is None or cost <= budget) and (best is None or cost < best):
+			best = cost
+
+	return best
+
+def test_branch_and_bound_matches_brute_force():
+	generator = random.Random(1)
+
+	for _ in range(200):
+		num_candidates = generator.randint(1, 6)
+		days = generator.randint(1, 7)
+		max_uses, num_max_uses = planner.get_use_limits(days, generator.randint(1, days))
+		costs = np.array([generator.randint(0, 1000) for _ in range(num_candidates)], dtype=np.int64)
+		excesses = np.array([generator.randint(-4, 2) / 2 for _ in range(num_candidates)])
+		budget = generator.choice([None, generator.randint(0, 5000)])
+
+		uses, optimal = planner.solve_branch_and_bound(costs, excesses, days, max_uses, num_max_uses, budget=budget)
+		expected = brute_force(costs, excesses, days, max_uses, num_max_uses, budget)
+
+		assert optimal
+
+		if expected is None:
+			assert uses is None
+		else:
+			assert int(np.dot(uses, costs)) == expected
+			assert uses.sum() == days
+			assert uses.max() <= max_uses
+			assert (uses == max_uses).sum() <= num_max_uses
+			assert np.dot(uses, excesses) >= -planner.RATING_TOLERANCE
+
+# The cheapest meals are the worst rated, so the cheapest plan with an average rating of at least 4 is hard to find by cost alone.
+def test_branch_and_bound_is_fast():
+	generator = np.random.default_rng(2)
+	costs = np.sort(generator.integers(100, 2000, 400))
+	excesses = np.sort(generator.integers(1, 11, 400)) / 2 - 4
+
+	start = time.perf_counter()
+	uses, optimal = planner.solve_branch_and_bound(costs, excesses, 14, *planner.get_use_limits(14, 7))
+
+	assert optimal
+	assert uses.sum() == 14
+	assert time.perf_counter() - start < 1
+
+def test_milp_matches_branch_and_bound():
+	pytest.importorskip('scipy')
+
+	generator = np.random.default_rng(3)
+	costs = generator.integers(100, 2000, 50)
+	excesses = generator.integers(1, 11, 50) / 2 - 4
+	limits = planner.get_use_limits(10, 3)
+
+	expected, _ = planner.solve_branch_and_bound(costs, excesses, 10, *limits)
+	uses, optimal = planner.solve_milp(costs, excesses, 10, *limits)
+
+	assert optimal
+	assert np.dot(uses, costs) == np.dot(expected, costs)
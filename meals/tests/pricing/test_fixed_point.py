@@ -0,0 +1,95 @@
+import random
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from meals import fixed_point
+from meals.helper import get_unit_id
+from meals.models import FoodPurchase
+from meals.pricing import calculate_price
+
+@pytest.mark.parametrize('numerator, denominator, expected_quotient', [
+	(10, 4, 2),   # 2.5 rounds to even.
+	(14, 4, 4),   # 3.5 rounds to even.
+	(11, 4, 3),   # 2.75
+	(9, 4, 2),    # 2.25
+	(8, 4, 2),
+	(-10, 4, -2), # -2.5 rounds to even.
+	(0, 7, 0),
+])
+def test_divide_round_half_even(numerator, denominator, expected_quotient):
+	assert fixed_point.divide_round_half_even(np.array([numerator]), np.array([denominator]))[0] == expected_quotient
+	assert fixed_point.divide_round_half_even(np.array([numerator], dtype=object), np.array([denominator], dtype=object))[0] == expected_quotient
+
+def test_fixed_point_round_trip():
+	values = [Decimal('0.00'), Decimal('1.05'), Decimal('999.99'), Decimal('12.5')]
+
+	assert [fixed_point.from_fixed_point(value) for value in fixed_point.to_fixed_point(values)] == values
+	assert str(fixed_point.from_fixed_point(20)) == '0.20'
+
+def test_sum_groups():
+	assert list(fixed_point.sum_groups([1, 2, 3, 4], [0, 1, 0, 3], 4)) == [4, 2, 0, 4]
+
+# The fixed point prices should match the Decimal prices to the cent, including how halves are rounded.
+def test_calculate_prices_matches_decimal_path():
+	rng = random.Random(0)
+	units = ['g', 'kg', 'oz', 'lb', 'ml', 'l', 'tsp', 'tbsp', 'cup', 'pc']
+	dimensions = [['g', 'kg', 'oz', 'lb'], ['ml', 'l', 'tsp', 'tbsp', 'cup'], ['pc']]
+
+	cases = []
+
+	for _ in range(2000):
+		dimension = rng.choice(dimensions)
+		purchase_unit, unit = rng.choice(dimension), rng.choice(dimension)
+		purchase_price = Decimal(rng.randint(0, 99999)).scaleb(-2)
+		purchase_quantity = Decimal(rng.randint(1, 99999)).scaleb(-2)
+		quantity = Decimal(rng.randint(1, 99999)).scaleb(-2)
+
+		cases.append((purchase_price, purchase_quantity, purchase_unit, quantity, unit))
+
+	# Cases which land exactly on half a cent.
+	cases += [
+		(Decimal('0.05'), Decimal('1'), 'g', Decimal('0.5'), 'g'),
+		(Decimal('0.15'), Decimal('1'), 'g', Decimal('0.5'), 'g'),
+		(Decimal('1.00'), Decimal('8'), 'kg', Decimal('20'), 'g'),
+		(Decimal('1.00'), Decimal('1'), 'tbsp', Decimal('0.75'), 'ml'),
+	]
+
+	prices, priced = fixed_point.calculate_prices(
+		fixed_point.to_fixed_point(case[0] for case in cases),
+		fixed_point.to_fixed_point(case[1] for case in cases),
+		[get_unit_id(case[2]) for case in cases],
+		fixed_point.to_fixed_point(case[3] for case in cases),
+		[get_unit_id(case[4]) for case in cases],
+	)
+
+	assert priced.all()
+
+	for case, price in zip(cases, prices):
+		purchase_price, purchase_quantity, purchase_unit, quantity, unit = case
+		purchase = FoodPurchase(price_amount=purchase_price, currency='EUR', quantity=purchase_quantity, unit=purchase_unit)
+
+		assert fixed_point.from_fixed_point(price) == calculate_price(purchase, quantity=quantity, unit=unit), case
+
+def test_calculate_prices_with_density():
+	densities = [Decimal('1.03'), Decimal('0.4'), None, Decimal('0.4')]
+
+	prices, priced = fixed_point.calculate_prices(
+		fixed_point.to_fixed_point(['1.00', '1.00', '1.00', '2.00']),
+		fixed_point.to_fixed_point(['1', '1', '1', '1']),
+		[get_unit_id(unit) for unit in ['l', 'kg', 'kg', 'kg']],
+		fixed_point.to_fixed_point(['1000', '250', '250', '250']),
+		[get_unit_id(unit) for unit in ['g', 'ml', 'ml', 'pc']],
+		densities=densities
+	)
+
+	assert list(priced) == [True, True, False, False]
+	assert list(prices[priced]) == [97, 10]
+
+# Products too large for int64 should still be calculated exactly.
+def test_calculate_prices_large_products():
+	prices, priced = fixed_point.calculate_prices([10 ** 12], [10 ** 9 + 1], [get_unit_id('g')], [10 ** 7], [get_unit_id('kg')])
+
+	assert priced.all()
+	assert prices[0] == fixed_point.divide_round_half_even(np.array([10 ** 22], dtype=object), np.array([10 ** 9 + 1], dtype=object))[0]
@@ -0,0 +1,141 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.urls import reverse
+
+from meals import pricing
+from meals.models import FoodItem, FoodPurchase, FxRate, Meal, MealInstance, StandardIngredient
+from meals.pricing import DATE_KEY_RANGE, calculate_price, get_meal_instance_costs, get_meal_prices_on
+
+monday = date(2024, 1, 8)
+
+@pytest.fixture
+def porridge(user):
+	meal = Meal.objects.create(name='Porridge', user=user)
+
+	oats = FoodItem.objects.create(name='Oats', user=user)
+	milk = FoodItem.objects.create(name='Milk', user=user)
+
+	StandardIngredient.objects.create(meal=meal, food_item=oats, quantity=100, unit='g')
+	StandardIngredient.objects.create(meal=meal, food_item=milk, quantity=250, unit='ml')
+
+	FoodPurchase.objects.create(food_item=oats, price_amount=1.00, currency='EUR', quantity=1, unit='kg', location='Aldi', date=monday)
+	FoodPurchase.objects.create(food_item=oats, price_amount=2.00, currency='EUR', quantity=1, unit='kg', location='Aldi', date=monday + timedelta(days=7))
+	FoodPurchase.objects.create(food_item=milk, price_amount=1.20, currency='EUR', quantity=1, unit='l', location='Aldi', date=monday + timedelta(days=3))
+
+	return meal
+
+# Prices should be the same whether only the newest purchases as of each date, or all the purchases between the dates, are loaded.
+@pytest.fixture(params=['as_of', 'between'])
+def purchase_loading(request, monkeypatch):
+	if request.param == 'between':
+		monkeypatch.setattr(pricing, 'MAX_AS_OF_PAIRS', 0)
+
+	return request.param
+
+def test_get_meal_prices_on(porridge, purchase_loading):
+	assert get_meal_prices_on([
+		(porridge.id, monday - timedelta(days=1)),
+		(porridge.id, monday),
+		(porridge.id, monday + timedelta(days=3)),
+		(porridge.id, monday + timedelta(days=30)),
+	]) == [Decimal('0.00'), Decimal('0.10'), Decimal('0.40'), Decimal('0.50')]
+
+	assert porridge.get_price_on(monday + timedelta(days=7)) == Decimal('0.50')
+
+def test_meals_without_ingredients(user, porridge):
+	salad = Meal.objects.create(name='Salad', user=user)
+
+	assert get_meal_prices_on([(salad.id, monday), (porridge.id, monday)]) == [None, Decimal('0.10')]
+	assert get_meal_prices_on([]) == []
+
+# Of several purchases on the same day, the newest is used, as it is for the newest price.
+def test_purchases_on_the_same_day(user, porridge, purchase_loading):
+	oats = FoodItem.objects.get(name='Oats', user=user)
+	FoodPurchase.objects.create(food_item=oats, price_amount=3.00, currency='EUR', quantity=1, unit='kg', location='Lidl', date=monday)
+
+	assert get_meal_prices_on([(porridge.id, monday)]) == [Decimal('0.30')]
+
+def test_prices_are_converted_at_the_purchase_date(user, porridge):
+	FxRate.objects.create(currency='GBP', date=monday, rate=Decimal('0.8'))
+	FxRate.objects.create(currency='GBP', date=monday + timedelta(days=3), rate=Decimal('0.5'))
+
+	assert get_meal_prices_on([(porridge.id, monday), (porridge.id, monday + timedelta(days=3))], currency='GBP') == [
+		Decimal('0.08'),
+		Decimal('0.23'),
+	]
+
+def test_get_meal_instance_costs(porridge):
+	first = MealInstance.objects.create(meal=porridge, date=monday, num_servings=2, rating=5, cook_time=10)
+	second = MealInstance.objects.create(meal=porridge, date=monday + timedelta(days=7), num_servings=3, rating=4, cook_time=10)
+	no_servings = MealInstance.objects.create(meal=porridge, date=monday, num_servings=0, rating=4, cook_time=10)
+
+	assert get_meal_instance_costs(MealInstance.objects.all()) == {
+		first.id: (Decimal('0.10'), Decimal('0.05')),
+		second.id: (Decimal('0.50'), Decimal('0.17')),
+		no_servings.id: (Decimal('0.10'), None),
+	}
+
+# The as-of prices should match the price calculated from the purchase in effect on each day.
+def test_matches_individual_prices(user, porridge, purchase_loading):
+	dates = [monday + timedelta(days=day) for day in range(10)]
+	ingredients = list(StandardIngredient.objects.filter(meal=porridge).select_related('food_item'))
+
+	expected_prices = []
+
+	for meal_date in dates:
+		price = Decimal('0.00')
+
+		for ingredient in ingredients:
+			purchase = FoodPurchase.objects.filter(food_item=ingredient.food_item, date__lte=meal_date).order_by('-date', '-id').first()
+
+			if purchase:
+				price += calculate_price(purchase, quantity=ingredient.quantity, unit=ingredient.unit)
+
+		expected_prices.append(price)
+
+	assert get_meal_prices_on([(porridge.id, meal_date) for meal_date in dates]) == expected_prices
+
+# Only the purchases in effect on the dates are loaded, however long the food item's purchase history is.
+def test_only_purchases_as_of_the_dates_are_loaded(user, porridge):
+	oats = FoodItem.objects.get(name='Oats', user=user)
+
+	FoodPurchase.objects.bulk_create([
+		FoodPurchase(food_item=oats, price_amount=1.00, currency='EUR', quantity=1, unit='kg', location='Aldi', date=monday - timedelta(days=day))
+		for day in range(1, 50)
+	])
+
+	keys = [oats.id * DATE_KEY_RANGE + (monday + timedelta(days=day)).toordinal() for day in [0, 1, 7, 30]]
+
+	assert [(purchase[1], purchase[2]) for purchase in pricing._get_purchases_as_of(keys)] == [
+		(monday, Decimal('1.00')),
+		(monday + timedelta(days=7), Decimal('2.00')),
+	]
+	assert [(purchase[1], purchase[2]) for purchase in pricing._get_purchases_between([oats.id], monday + timedelta(days=1), monday + timedelta(days=30))] == [
+		(monday, Decimal('1.00')),
+		(monday + timedelta(days=7), Decimal('2.00')),
+	]
+
+def test_the_number_of_queries_does_not_grow_with_instances(user, porridge, django_assert_num_queries):
+	MealInstance.objects.bulk_create([
+		MealInstance(meal=porridge, date=monday + timedelta(days=day), num_servings=1, rating=5, cook_time=10)
+		for day in range(100)
+	])
+
+	meal_instances = list(MealInstance.objects.all())
+
+	with django_assert_num_queries(2):
+		costs = get_meal_instance_costs(meal_instances)
+
+	assert len(costs) == 100
+
+def test_meal_instance_list_shows_costs(user, client, porridge):
+	MealInstance.objects.create(meal=porridge, date=monday + timedelta(days=3), num_servings=2, rating=5, cook_time=10)
+
+	client.force_login(user)
+	response = client.get(reverse('meal_instance_list'))
+
+	assert response.status_code == 200
+	assert '0.40 EUR' in response.content.decode()
+	assert '0.20 EUR' in response.content.decode()
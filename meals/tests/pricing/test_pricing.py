@@ -0,0 +1,87 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from meals.models import FoodItem, FoodPurchase, Meal, StandardIngredient
+from meals.pricing import get_ingredient_prices, get_meal_prices, get_newest_purchases
+
+def create_meal_with_ingredients(user, name, num_ingredients):
+	meal = Meal.objects.create(name=name, user=user)
+
+	for i in range(num_ingredients):
+		food_item = FoodItem.objects.create(name=f'{name} Ingredient {i}', user=user)
+		StandardIngredient.objects.create(meal=meal, food_item=food_item, quantity=100, unit='g')
+		FoodPurchase.objects.create(food_item=food_item, price_amount=1.00, currency='EUR', quantity=1,
+									unit='kg', location='Lidl', date=date.today())
+		FoodPurchase.objects.create(food_item=food_item, price_amount=9.00, currency='EUR', quantity=1,
+									unit='kg', location='Lidl', date=date.today() - timedelta(days=7))
+
+	return meal
+
+def test_get_newest_purchases(user):
+	milk = FoodItem.objects.create(name='Milk', user=user)
+	oats = FoodItem.objects.create(name='Oats', user=user)
+	jam  = FoodItem.objects.create(name='Jam', user=user)
+
+	new_milk = FoodPurchase.objects.create(food_item=milk, price_amount=1.00, currency='EUR', quantity=1, unit='l', location='Aldi', date=date.today())
+	FoodPurchase.objects.create(food_item=milk, price_amount=2.00, currency='EUR', quantity=1, unit='l', location='Aldi', date=date.today() - timedelta(days=7))
+	new_oats = FoodPurchase.objects.create(food_item=oats, price_amount=1.00, currency='EUR', quantity=1, unit='kg', location='Aldi', date=date.today() - timedelta(days=1))
+
+	assert get_newest_purchases([milk.id, oats.id, jam.id]) == {
+		milk.id: new_milk,
+		oats.id: new_oats,
+	}
+
+def test_get_newest_purchases_empty():
+	assert get_newest_purchases([]) == {}
+
+# Prices from the engine should match the price calculated for each meal individually.
+def test_get_meal_prices_matches_individual_prices(user):
+	porridge = create_meal_with_ingredients(user, 'Porridge', 2)
+	toast = create_meal_with_ingredients(user, 'Toast', 3)
+	salad = Meal.objects.create(name='Salad', user=user)
+
+	meal_prices = get_meal_prices([porridge, toast, salad])
+
+	assert meal_prices == {
+		porridge.id: Decimal('0.20'),
+		toast.id: Decimal('0.30'),
+		salad.id: None,
+	}
+
+	assert porridge.get_newest_price() == '0.20 EUR'
+	assert toast.get_newest_price() == '0.30 EUR'
+	assert salad.get_newest_price() == 0
+
+# Ingredients whose food items have never been purchased are left out of the meal price.
+def test_get_meal_prices_unpurchased_ingredient(user):
+	porridge = create_meal_with_ingredients(user, 'Porridge', 1)
+	milk = FoodItem.objects.create(name='Milk', user=user)
+	milk_ingredient = StandardIngredient.objects.create(meal=porridge, food_item=milk, quantity=100, unit='ml')
+
+	assert get_ingredient_prices([milk_ingredient]) == {milk_ingredient.id: None}
+	assert get_meal_prices([porridge]) == {porridge.id: Decimal('0.10')}
+
+# The number of queries should not depend upon the number of meals or ingredients.
+def test_get_meal_prices_query_count(user, django_assert_num_queries):
+	meals = [create_meal_with_ingredients(user, f'Meal {i}', 4) for i in range(5)]
+
+	with django_assert_num_queries(2):
+		meal_prices = get_meal_prices(meals)
+
+	assert all(price == Decimal('0.40') for price in meal_prices.values())
+
+# Ingredients in units which cannot be converted to the unit of the purchase have no price.
+def test_get_ingredient_prices_unit_conversion(user):
+	porridge = Meal.objects.create(name='Porridge', user=user)
+	milk = FoodItem.objects.create(name='Milk', user=user)
+	oats = FoodItem.objects.create(name='Oats', user=user, density=Decimal('0.4'))
+	FoodPurchase.objects.create(food_item=milk, price_amount=1.00, currency='EUR', quantity=1, unit='pc', location='Aldi', date=date.today())
+	FoodPurchase.objects.create(food_item=oats, price_amount=1.00, currency='EUR', quantity=1, unit='kg', location='Aldi', date=date.today())
+
+	milk_ingredient = StandardIngredient.objects.create(meal=porridge, food_item=milk, quantity=100, unit='ml')
+	oats_ingredient = StandardIngredient.objects.create(meal=porridge, food_item=oats, quantity=250, unit='ml')
+
+	assert get_ingredient_prices([milk_ingredient, oats_ingredient]) == {
+		milk_ingredient.id: None,
+		oats_ingredient.id: Decimal('0.10'),
+	}
@@ -0,0 +1,129 @@
+from datetime import date
+
+import pytest
+from django.template import Context, Template
+from django.test import override_settings
+from django.urls import reverse
+
+from meals import profiling
+from meals.models import FoodItem, FoodPurchase, Meal, MealInstance
+
+@pytest.fixture(autouse=True)
+def reset_stats():
+	profiling.stats.reset()
+	yield
+	profiling.stats.reset()
+
+@pytest.fixture
+def staff_user(user):
+	user.is_staff = True
+	user.save()
+
+	return user
+
+def parse_server_timing(header):
+	metrics = {}
+
+	for metric in header.split(', '):
+		name, *params = metric.split(';')
+		metrics[name] = dict(param.split('=', 1) for param in params)
+
+	return metrics
+
+@override_settings(PROFILING_ENABLED=True)
+def test_server_timing_header(user, client):
+	FoodItem.objects.create(name='Milk', user=user)
+
+	client.force_login(user)
+	response = client.get(reverse('food_item_list'))
+
+	metrics = parse_server_timing(response['Server-Timing'])
+
+	assert set(metrics) == {'total', 'db', 'tpl', 'dup'}
+	assert float(metrics['total']['dur']) >= float(metrics['tpl']['dur']) > 0
+	assert int(metrics['db']['desc'].strip('"').split()[0]) > 0
+
+def test_disabled_by_default(user, client):
+	client.force_login(user)
+	response = client.get(reverse('food_item_list'))
+
+	assert 'Server-Timing' not in response
+	assert profiling.stats.as_dict() == {}
+
+# Queries run once per row are reported with where they were run from.
+def test_duplicate_queries_are_reported(user):
+	meal = Meal.objects.create(name='Porridge', user=user)
+	MealInstance.objects.create(meal=meal, date=date(2024, 1, 1), num_servings=1, rating=5, cook_time=10)
+	MealInstance.objects.create(meal=meal, date=date(2024, 1, 2), num_servings=1, rating=5, cook_time=10)
+
+	profile = profiling.RequestProfile()
+	token = profiling.current_profile.set(profile)
+
+	try:
+		with profiling.connections['default'].execute_wrapper(profiling.time_query):
+			for meal_instance in MealInstance.objects.all():
+				Meal.objects.get(pk=meal_instance.meal_id)
+	finally:
+		profiling.current_profile.reset(token)
+
+	duplicates = profile.get_duplicate_queries()
+
+	assert len(duplicates) == 1
+	assert duplicates[0]['count'] == 2
+	assert duplicates[0]['origin']['code'].startswith('meals/tests/profiling/test_profiling.py:')
+
+# Queries run by a template calling a method for each row are reported with the template variable.
+def test_template_origins(user):
+	food_item = FoodItem.objects.create(name='Milk', user=user)
+	FoodPurchase.objects.create(food_item=food_item, price_amount=1, currency='EUR', quantity=1, unit='l', location='Aldi', date=date(2024, 1, 1))
+
+	profile = profiling.RequestProfile()
+	token = profiling.current_profile.set(profile)
+
+	try:
+		with profiling.connections['default'].execute_wrapper(profiling.time_query):
+			Template('{% for food_item in food_items %}{{ food_item.get_newest_price }}{% endfor %}').render(Context({
+				'food_items': [FoodItem.objects.get(pk=food_item.pk), FoodItem.objects.get(pk=food_item.pk)],
+			}))
+	finally:
+		profiling.current_profile.reset(token)
+
+	origins = [duplicate['origin']['template'] for duplicate in profile.get_duplicate_queries()]
+
+	assert any(origin and origin.endswith('food_item.get_newest_price') for origin in origins)
+
+@override_settings(PROFILING_ENABLED=True)
+def test_perf_page(staff_user, client):
+	client.force_login(staff_user)
+
+	for _ in range(3):
+		client.get(reverse('food_item_list'))
+
+	response = client.get(reverse('perf'))
+
+	assert response.status_code == 200
+
+	views = response.json()['views']
+	food_item_list = views['food_item_list']
+
+	assert response.json()['enabled']
+	assert food_item_list['count'] == 3
+	assert sum(food_item_list['histogram_ms'].values()) == 3
+	assert set(food_item_list['latency_ms']) == {'mean', 'p50', 'p95', 'p99', 'max'}
+
+def test_perf_page_is_for_staff_only(user, client):
+	assert client.get(reverse('perf')).status_code == 401
+
+	client.force_login(user)
+	assert client.get(reverse('perf')).status_code == 403
+
+def test_stats_window_is_bounded():
+	stats = profiling.ProfileStats(window_size=5)
+
+	for _ in range(10):
+		profile = profiling.RequestProfile()
+		profile.finish()
+		stats.record('view', profile)
+
+	assert stats.as_dict()['view']['count'] == 10
+	assert stats.as_dict()['view']['window'] == 5
@@ -0,0 +1,158 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.core.management import call_command
+
+from meals.models import FoodItem, FoodPurchase, FxRate, Meal, MealCostChange, MealCostRollup, MealCostSnapshot, StandardIngredient
+from meals.pricing import get_meal_prices_on
+from meals.rollup import rollup_meal_costs
+
+today = date(2024, 3, 1)
+
+@pytest.fixture
+def porridge(user):
+	meal = Meal.objects.create(name='Porridge', user=user)
+	oats = FoodItem.objects.create(name='Oats', user=user)
+
+	StandardIngredient.objects.create(meal=meal, food_item=oats, quantity=100, unit='g')
+	FoodPurchase.objects.create(food_item=oats, price_amount=1.00, currency='EUR', quantity=1, unit='kg', location='Aldi', date=today - timedelta(days=5))
+
+	return meal
+
+def get_totals(meal):
+	return dict(MealCostSnapshot.objects.filter(meal=meal).values_list('date', 'total'))
+
+def test_first_rollup(porridge):
+	result = rollup_meal_costs(last_date=today, days=10)
+
+	assert result.num_snapshots == 10
+	assert get_totals(porridge) == {
+		today - timedelta(days=day): Decimal('0.10') if day <= 5 else Decimal('0.00')
+		for day in range(10)
+	}
+
+	snapshot = MealCostSnapshot.objects.get(meal=porridge, date=today)
+	ingredient = porridge.standardingredient_set.get()
+
+	assert snapshot.currency == 'EUR'
+	assert snapshot.ingredient_prices == {str(ingredient.id): '0.10'}
+	assert MealCostSnapshot.objects.get(meal=porridge, date=today - timedelta(days=9)).ingredient_prices == {str(ingredient.id): None}
+
+	assert MealCostRollup.objects.get().last_date == today
+	assert not MealCostChange.objects.exists()
+
+# The snapshots should match the prices calculated on each date.
+def test_snapshots_match_prices_on_dates(porridge):
+	rollup_meal_costs(last_date=today, days=10)
+
+	dates = [today - timedelta(days=day) for day in range(10)]
+
+	assert [get_totals(porridge)[snapshot_date] for snapshot_date in dates] == get_meal_prices_on([(porridge.id, snapshot_date) for snapshot_date in dates])
+
+def test_only_affected_meals_and_days_are_recalculated(user, porridge):
+	toast = Meal.objects.create(name='Toast', user=user)
+	bread = FoodItem.objects.create(name='Bread', user=user)
+	StandardIngredient.objects.create(meal=toast, food_item=bread, quantity=1, unit='pc')
+	FoodPurchase.objects.create(food_item=bread, price_amount=2.00, currency='EUR', quantity=10, unit='pc', location='Aldi', date=today - timedelta(days=20))
+
+	rollup_meal_costs(last_date=today, days=10)
+
+	oats = FoodItem.objects.get(name='Oats')
+	FoodPurchase.objects.create(food_item=oats, price_amount=3.00, currency='EUR', quantity=1, unit='kg', location='Aldi', date=today - timedelta(days=2))
+
+	result = rollup_meal_costs(last_date=today, days=10)
+
+	assert result.num_changes == 1
+	assert result.num_meals == 1
+	assert result.num_snapshots == 3
+	assert get_totals(porridge)[today] == Decimal('0.30')
+	assert get_totals(porridge)[today - timedelta(days=3)] == Decimal('0.10')
+
+# Each rollup adds the snapshots of the days since the last one.
+def test_new_days_are_added(porridge):
+	rollup_meal_costs(last_date=today, days=10)
+	result = rollup_meal_costs(last_date=today + timedelta(days=2), days=10)
+
+	assert result.num_snapshots == 2
+	assert get_totals(porridge)[today + timedelta(days=2)] == Decimal('0.10')
+	assert MealCostRollup.objects.get().last_date == today + timedelta(days=2)
+
+# A rollup of an earlier date still applies the changes to the snapshots up to the high-water mark.
+def test_rollup_of_earlier_date(porridge):
+	rollup_meal_costs(last_date=today, days=10)
+
+	oats = FoodItem.objects.get(name='Oats')
+	FoodPurchase.objects.create(food_item=oats, price_amount=3.00, currency='EUR', quantity=1, unit='kg', location='Aldi', date=today - timedelta(days=1))
+
+	rollup_meal_costs(last_date=today - timedelta(days=3), days=10)
+
+	assert get_totals(porridge)[today] == Decimal('0.30')
+	assert get_totals(porridge)[today - timedelta(days=2)] == Decimal('0.10')
+	assert MealCostRollup.objects.get().last_date == today
+	assert not MealCostChange.objects.exists()
+
+def test_ingredient_changes(porridge):
+	rollup_meal_costs(last_date=today, days=10)
+
+	ingredient = porridge.standardingredient_set.get()
+	ingredient.quantity = 200
+	ingredient.save()
+
+	rollup_meal_costs(last_date=today, days=10)
+	assert get_totals(porridge)[today] == Decimal('0.20')
+
+	ingredient.delete()
+
+	rollup_meal_costs(last_date=today, days=10)
+	assert get_totals(porridge) == {}
+
+# Only a change of density changes the costs of a food item's meals.
+def test_food_item_changes(porridge):
+	rollup_meal_costs(last_date=today, days=10)
+
+	oats = FoodItem.objects.get(name='Oats')
+	oats.name = 'Rolled Oats'
+	oats.save()
+
+	assert not MealCostChange.objects.exists()
+
+	oats.density = '0.4'
+	oats.save()
+
+	assert MealCostChange.objects.filter(food_item_id=oats.id, date=None).count() == 1
+
+def test_bulk_changes_are_recorded(porridge):
+	rollup_meal_costs(last_date=today, days=10)
+
+	FoodPurchase.objects.filter(food_item__name='Oats').update(price_amount=2.00)
+	rollup_meal_costs(last_date=today, days=10)
+
+	assert get_totals(porridge)[today] == Decimal('0.20')
+
+	FoodPurchase.objects.filter(food_item__name='Oats').delete()
+	rollup_meal_costs(last_date=today, days=10)
+
+	assert get_totals(porridge)[today] == Decimal('0.00')
+
+def test_currency_changes_recalculate_everything(porridge):
+	FxRate.objects.create(currency='GBP', date=today - timedelta(days=30), rate=Decimal('0.5'))
+
+	rollup_meal_costs(last_date=today, days=10)
+	result = rollup_meal_costs(last_date=today, days=10, currency='GBP')
+
+	assert result.num_snapshots == 10
+	assert get_totals(porridge)[today] == Decimal('0.05')
+	assert set(MealCostSnapshot.objects.values_list('currency', flat=True)) == {'GBP'}
+
+	# Purchases are converted at the rate on their dates, so a new rate changes the costs from its date onwards.
+	FxRate.objects.create(currency='GBP', date=today - timedelta(days=6), rate=Decimal('1.0'))
+	result = rollup_meal_costs(last_date=today, days=10, currency='GBP')
+
+	assert result.num_snapshots == 7
+	assert get_totals(porridge)[today] == Decimal('0.10')
+
+def test_command(porridge):
+	call_command('rollup_meal_costs', '--date', today.isoformat(), '--days', '5')
+
+	assert len(get_totals(porridge)) == 5
@@ -0,0 +1,33 @@
+import runpy
+
+from django.conf import settings
+from django.core.management import call_command
+
+def test_gunicorn_config(monkeypatch):
+	monkeypatch.setenv('GUNICORN_WORKERS', '3')
+	monkeypatch.setenv('SERVER_MODE', 'asgi')
+
+	config = runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+
+	assert config['workers'] == 3
+	assert config['preload_app']
+	assert config['worker_class'] == 'uvicorn.workers.UvicornWorker'
+	assert config['wsgi_app'] == 'mealpricetracker.asgi:application'
+
+def test_gunicorn_config_clears_metrics_directory(monkeypatch, tmp_path):
+	monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path / 'prometheus'))
+
+	config = runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+
+	(tmp_path / 'prometheus' / 'counter_1.db').write_bytes(b'')
+	config['on_starting'](None)
+
+	assert not list((tmp_path / 'prometheus').iterdir())
+
+def test_load_test(user, live_server, capsys):
+	call_command('load_test', live_server.url, '--user', 'user1', '--password', 'password', '--path', '/food_items/', '--concurrency', '2', '--requests', '10')
+
+	output = capsys.readouterr().out
+
+	assert '10 requests' in output
+	assert 'Responses: 200: 10' in output
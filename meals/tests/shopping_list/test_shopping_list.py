@@ -0,0 +1,114 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from meals import shopping_list
+from meals.models import FoodItem, FoodPurchase, Meal, MealInstance, StandardIngredient
+
+# (meal, food item, quantity, unit)
+INGREDIENTS = [
+	('Pancakes', 'Flour', '200', 'g'),
+	('Pancakes', 'Milk', '0.3', 'l'),
+	('Pancakes', 'Sugar', '1', 'tsp'),
+	('Pancakes', 'Eggs', '2', 'pc'),
+	('Pancakes', 'Oil', '10', 'ml'),
+	('Cake', 'Flour', '0.5', 'kg'),
+	('Cake', 'Milk', '250', 'ml'),
+	('Cake', 'Sugar', '1', 'tbsp'),
+	('Cake', 'Oil', '50', 'g'),
+]
+
+# (food item, price, quantity, unit, location, date)
+PURCHASES = [
+	('Flour', '1.00', '1', 'kg', 'Aldi', date(2024, 1, 1)),
+	('Flour', '1.50', '1', 'kg', 'Aldi', date(2024, 2, 1)),
+	('Flour', '1.20', '1', 'kg', 'Lidl', date(2024, 1, 1)),
+	('Milk', '1.00', '1', 'l', 'Aldi', date(2024, 1, 1)),
+	('Eggs', '1.80', '6', 'pc', 'Aldi', date(2024, 1, 1)),
+	('Oil', '3.00', '1', 'l', 'Lidl', date(2024, 1, 1)),
+]
+
+@pytest.fixture
+def meals(user, other_user):
+	food_items = {name: FoodItem.objects.create(name=name, user=user) for name in ['Flour', 'Milk', 'Sugar', 'Eggs']}
+	food_items['Oil'] = FoodItem.objects.create(name='Oil', user=user, density=Decimal('0.9'))
+	meals = {name: Meal.objects.create(name=name, user=user) for name in ['Pancakes', 'Cake']}
+
+	for meal, food_item, quantity, unit in INGREDIENTS:
+		StandardIngredient.objects.create(meal=meals[meal], food_item=food_items[food_item], quantity=quantity, unit=unit)
+
+	for food_item, price, quantity, unit, location, purchase_date in PURCHASES:
+		FoodPurchase.objects.create(food_item=food_items[food_item], price_amount=price, currency='EUR', quantity=quantity, unit=unit, location=location, date=purchase_date)
+
+	# The pancakes make two servings. The cake has never been cooked.
+	MealInstance.objects.create(meal=meals['Pancakes'], date=date(2024, 1, 2), num_servings=2, rating=4, cook_time=20)
+
+	meals['Other'] = Meal.objects.create(name='Other', user=other_user)
+
+	return meals
+
+def get_lines(shopping):
+	return [(line.name, line.quantity, line.unit, line.cost, line.location) for line in shopping.lines]
+
+def test_shopping_list(user, meals):
+	shopping = shopping_list.get_shopping_list(user, {meals['Pancakes'].id: 4, meals['Cake'].id: None})
+
+	# The oil's volume is added to its mass, and the sugar is only measured in spoons.
+	assert get_lines(shopping) == [
+		('Eggs', Decimal('4.00'), 'pc', Decimal('1.20'), 'Aldi'),
+		('Flour', Decimal('900.00'), 'g', Decimal('1.08'), 'Lidl'),
+		('Milk', Decimal('850.00'), 'ml', Decimal('0.85'), 'Aldi'),
+		('Oil', Decimal('68.00'), 'g', Decimal('0.23'), 'Lidl'),
+		('Sugar', Decimal('1.67'), 'tbsp', None, None),
+	]
+	assert shopping.total == Decimal('3.36')
+	assert shopping.as_dict()['num_unpriced'] == 1
+
+def test_larger_units(user, meals):
+	shopping = shopping_list.get_shopping_list(user, {meals['Pancakes'].id: 20})
+
+	assert [(line.name, line.quantity, line.unit) for line in shopping.lines] == [
+		('Eggs', Decimal('20.00'), 'pc'),
+		('Flour', Decimal('2.00'), 'kg'),
+		('Milk', Decimal('3.00'), 'l'),
+		('Oil', Decimal('90.00'), 'g'),
+		('Sugar', Decimal('3.33'), 'tbsp'),
+	]
+
+# Other users' meals are not included.
+def test_other_users_meals(user, meals):
+	assert shopping_list.get_shopping_list(user, {meals['Other'].id: None}).lines == []
+
+def test_queries(user, meals, django_assert_num_queries):
+	with django_assert_num_queries(2):
+		shopping_list.get_shopping_list(user, {meals['Pancakes'].id: 4, meals['Cake'].id: None})
+
+def test_parse_meals():
+	assert shopping_list.parse_meals('1:4, 2') == {1: 4, 2: None}
+
+	for value in [None, '', 'a', '1:0', '1:x']:
+		with pytest.raises(shopping_list.ShoppingListParameterError):
+			shopping_list.parse_meals(value)
+
+def test_shopping_list_view(client, user, meals):
+	client.force_login(user)
+
+	response = client.get('/meals/shopping_list.json', {'meals': f'{meals["Pancakes"].id}:4,{meals["Cake"].id}'})
+
+	assert response.status_code == 200
+	assert response.json()['total'] == '3.36'
+	assert response.json()['lines'][1] == {
+		'food_item_id': FoodItem.objects.get(name='Flour').id,
+		'name': 'Flour',
+		'quantity': '900.00',
+		'unit': 'g',
+		'cost': '1.08',
+		'location': 'Lidl',
+	}
+
+	assert client.get('/meals/shopping_list.json').status_code == 400
+	assert client.get('/meals/shopping_list.json', {'meals': '1', 'currency': 'XYZ'}).status_code == 400
+
+def test_shopping_list_view_requires_login(client):
+	assert client.get('/meals/shopping_list.json').status_code == 401
@@ -0,0 +1,75 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from meals.helper import UnitConversionError, convert_quantities, get_unit_conversion_factor, get_unit_conversion_ratio, get_unit_id
+
+@pytest.mark.parametrize('from_unit, to_unit, expected_factor', [
+	('g', 'g', 1),
+	('g', 'kg', 0.001),
+	('kg', 'g', 1000),
+	('KG', 'g', 1000),
+	('lb', 'oz', 16),
+	('oz', 'g', 28.3495),
+	('lb', 'kg', 0.453592),
+	('ml', 'l', 0.001),
+	('tsp', 'ml', 5),
+	('tbsp', 'tsp', 3),
+	('cup', 'l', 0.25),
+	('pc', 'pc', 1),
+])
+def test_get_unit_conversion_factor(from_unit, to_unit, expected_factor):
+	assert get_unit_conversion_factor(from_unit, to_unit) == pytest.approx(expected_factor)
+
+# Conversions within a dimension are exact.
+def test_get_unit_conversion_ratio_exact():
+	assert get_unit_conversion_ratio('g', 'oz') == Fraction(10_000, 283_495)
+	assert get_unit_conversion_ratio('g', 'oz') * get_unit_conversion_ratio('oz', 'g') == 1
+
+@pytest.mark.parametrize('from_unit, to_unit', [
+	('pc', 'g'),
+	('ml', 'pc'),
+	('g', 'furlong'),
+])
+def test_unknown_conversion_raises(from_unit, to_unit):
+	with pytest.raises(UnitConversionError):
+		get_unit_conversion_factor(from_unit, to_unit)
+
+def test_mass_volume_conversion_needs_density():
+	with pytest.raises(UnitConversionError):
+		get_unit_conversion_factor('ml', 'g')
+
+	assert get_unit_conversion_ratio('ml', 'g', density='1.03') == Fraction('1.03')
+	assert get_unit_conversion_ratio('kg', 'l', density=2) == Fraction(1, 2)
+	assert get_unit_conversion_ratio('tbsp', 'g', density='0.5') == Fraction('7.5')
+
+def test_convert_quantities():
+	converted = convert_quantities([1, 2, 3, 4], ['kg', 'tbsp', 'ml', 'pc'], ['g', 'ml', 'g', 'pc'], densities=[np.nan, np.nan, 0.5, np.nan])
+
+	assert converted == pytest.approx([1000, 30, 1.5, 4])
+
+def test_convert_quantities_unit_ids():
+	from_ids = np.array([get_unit_id('l'), get_unit_id('lb')])
+	to_ids = np.array([get_unit_id('ml'), get_unit_id('oz')])
+
+	assert convert_quantities([2, 1], from_ids, to_ids) == pytest.approx([2000, 16])
+
+# The batched conversion should agree with the scalar conversion for every pair of units.
+def test_convert_quantities_matches_scalar():
+	units = ['g', 'kg', 'oz', 'lb', 'ml', 'l', 'tsp', 'tbsp', 'cup']
+	pairs = [(from_unit, to_unit) for from_unit in units for to_unit in units]
+
+	converted = convert_quantities(np.ones(len(pairs)), [pair[0] for pair in pairs], [pair[1] for pair in pairs], densities=0.8)
+
+	for (from_unit, to_unit), factor in zip(pairs, converted):
+		assert factor == pytest.approx(get_unit_conversion_factor(from_unit, to_unit, density=0.8))
+
+@pytest.mark.parametrize('from_units, to_units, densities', [
+	(['g', 'pc'], ['g', 'g'], None),
+	(['g', 'ml'], ['g', 'g'], None),
+	(['g', 'ml'], ['g', 'g'], [np.nan, np.nan]),
+])
+def test_convert_quantities_raises(from_units, to_units, densities):
+	with pytest.raises(UnitConversionError):
+		convert_quantities([1, 1], from_units, to_units, densities=densities)
@@ -10,12 +10,18 @@ urlpatterns = [
 
 	path('meals/', views.meal_list, name='meal_list'),
 	# path('meals/new/', views.meals_new, name='meals_new'),
+	path('meals/batch/', views.meal_batch_create, name='meal_batch_create'),
+	path('meals/clone/', views.meal_batch_clone, name='meal_batch_clone'),
+	path('meals/plan.json', views.meal_plan, name='meal_plan'),
+	path('meals/shopping_list.json', views.shopping_list_view, name='shopping_list'),
 	path('meals/<int:meal_id>/', views.meals_item, name='meals_item'),
     path('meals/<int:meal_id>/delete/', views.meals_item_delete, name='meals_item_delete'),
 
 	path('food_items/', views.food_item_list, name='food_item_list'),
 	path('food_items/new/', views.new_food_item, name='new_food_item'),
+	path('food_items/autocomplete.json', views.food_item_autocomplete, name='food_item_autocomplete'),
 	path('food_items/<int:food_item_id>/', views.food_item, name='food_item'),
+	path('food_items/<int:food_item_id>/history.json', views.food_item_history, name='food_item_history'),
 	path('food_items/<int:food_item_id>/delete/', views.food_item_delete, name='food_item_delete'),
 
 	path('ingredients/<int:ingredient_id>/', views.ingredient, name='ingredient'),
@@ -24,6 +30,9 @@ urlpatterns = [
 
 	path('purchases/', views.price_record_list, name='purchase_list'),
 	path('purchases/new/', views.new_food_purchase, name='new_purchase'),
+	path('purchases/export.csv', views.export_purchases_csv, name='purchase_export_csv'),
+	path('purchases/export.ndjson', views.export_purchases_ndjson, name='purchase_export_ndjson'),
+	path('purchases/import/', views.import_purchases, name='purchase_import'),
     
 	path('purchases/<int:food_purchase_id>/', views.food_purchase_detail, name='purchase'),
 	path('purchases/<int:food_purchase_id>/delete/', views.food_purchase_delete, name='purchase_delete'),
@@ -31,4 +40,7 @@ urlpatterns = [
 	path('meal_instances/', views.meal_instance_list, name='meal_instance_list'),
 	path('meal_instances/new/', views.new_meal_instance, name='new_meal_instance'),
 	path('meal_instances/<int:meal_instance_id>/delete', views.meal_instance_delete, name='meal_instance_delete'),
+
+	path('_perf/', views.perf, name='perf'),
+	path('metrics', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
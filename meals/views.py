@@ -1,17 +1,22 @@
+import io
+import json
+
+from asgiref.sync import sync_to_async
 from django import forms
+from django.conf import settings
 from django.contrib import messages
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, HttpResponseRedirect, HttpResponseForbidden
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.urls import reverse, reverse_lazy
 from django.views.decorators.http import require_POST
 from django.forms import formset_factory
 from django.views.decorators.http import require_http_methods
 
-
-from dal import autocomplete
-
-from .forms import FoodItemForm, FoodPurchaseForm, MealForm, MealInstanceForm, StandardIngredientForm
+from .forms import BaseStandardIngredientFormSet, FoodItemForm, FoodPurchaseForm, MealForm, MealInstanceForm, StandardIngredientForm
 from .models import FoodItem, FoodPurchase, Meal, MealInstance, StandardIngredient
+from . import cache, export, history, importer, meal_batch, metrics, pagination, planner, profiling, shopping_list
+from .autocomplete import search as search_food_items
+from .pricing import format_ingredient_price, format_meal_price, get_meal_instance_costs
 
 from pprint import pprint
 
@@ -29,16 +34,47 @@ def index(request):
 
 	return render(request, 'meals/home.html', context)
 
+# The list views are async, so that under ASGI a worker can serve other requests while their queries run.
+# Anything which may query the database without the async ORM, such as request.user, the price cache, form
+# validation and template rendering, is run through sync_to_async().
+
+# Return the logged in user of a request, or None, from an async view.
+# request.user is loaded from the session when it is first used, which must not be done in the event loop.
+@sync_to_async
+def get_user(request):
+	return request.user if request.user.is_authenticated else None
+
+arender = sync_to_async(render)
+
+# Render a page of a list view. When the next page is loaded by HTMX, for infinite scrolling, only its rows are rendered.
+async def render_list_page(request, template_name, rows_template_name, context, page):
+	context['next_page_url'] = page.get_next_url(request)
+
+	if request.headers.get('HX-Request'):
+		return await arender(request, rows_template_name, context)
+
+	return await arender(request, template_name, context)
+
 ##############################################################################
 #---------------------------------- Food Item -------------------------------#
 ##############################################################################
 
-def food_item_list(request):
-	user = request.user
-	if not user.is_authenticated:
+async def food_item_list(request):
+	user = await get_user(request)
+	if user is None:
 		return redirect('/')
 
-	food_items = FoodItem.objects.filter(user=user).order_by('name')
+	try:
+		page = await pagination.apaginate(FoodItem.objects.with_stats(user), ['name', 'id'], request.GET)
+	except pagination.PaginationError as e:
+		return HttpResponseBadRequest(str(e))
+
+	food_items = page.items
+	food_item_prices = await sync_to_async(cache.get_food_item_prices)(user, food_items)
+
+	for food_item in food_items:
+		food_item.newest_price = food_item_prices[food_item.id]
+
 	form = FoodItemForm(user=user, request=request)
 
 	context = {
@@ -46,7 +82,7 @@ def food_item_list(request):
 		'food_items': food_items
 	}
 
-	return render(request, 'meals/food_item/list.html', context)
+	return await render_list_page(request, 'meals/food_item/list.html', 'meals/food_item/list_rows.html', context, page)
 
 # View a single food item.
 def food_item(request, food_item_id):
@@ -61,21 +97,41 @@ def food_item(request, food_item_id):
 
 	price_records = FoodPurchase.objects.filter(food_item=food_item)
 
+	# The ingredients using this food item, with their meals, so that the quantity
+	# used in each meal does not have to be looked up separately.
+	ingredients = StandardIngredient.objects.filter(food_item=food_item).select_related('meal')
+
 	food_purchase_form = FoodPurchaseForm(initial={'food_item': food_item}, user=user)
 	food_purchase_form.fields['food_item'].widget = forms.HiddenInput()
 	food_purchase_form.initial['food_item'] = food_item
 
-	meals = food_item.meals
-
 	context = {
 		'food_item': food_item,
-		'meals': meals,
+		'ingredients': ingredients,
 		'price_records': price_records,
 		'food_purchase_form': food_purchase_form
 	}
 
 	return render(request, 'meals/food_item/info.html', context)
 
+# The price history of a food item, per unit and grouped by week or month, for charts.
+def food_item_history(request, food_item_id):
+	user = request.user
+	if not user.is_authenticated:
+		return HttpResponse(status=401)
+
+	food_item = get_object_or_404(FoodItem, pk=food_item_id)
+
+	if food_item.user != user:
+		return HttpResponseForbidden()
+
+	try:
+		price_history = history.get_price_history(food_item, request.GET)
+	except history.HistoryParameterError as e:
+		return HttpResponseBadRequest(str(e))
+
+	return JsonResponse(price_history)
+
 # Create a new food item.
 @require_http_methods(['POST'])
 def new_food_item(request):
@@ -109,31 +165,38 @@ def food_item_delete(request, food_item_id):
 	previous_page = request.META.get('HTTP_REFERER', '/')
 	return redirect(previous_page)
 
-class FoodItemAutocomplete(autocomplete.Select2QuerySetView):
-	def get_queryset(self):
-
-		print('self.q: ', self.q)
-
-		if not self.request.user.is_authenticated:
-			return FoodItem.objects.none()
-
-		qs = FoodItem.objects.filter(user=self.request.user)
+# Suggest the user's food items matching the search term, best first, for the food item select boxes.
+# The response is in the format expected by select2.
+def food_item_autocomplete(request):
+	user = request.user
+	if not user.is_authenticated:
+		return HttpResponse(status=401)
 
-		if self.q:
-			qs = qs.filter(name__istartswith=self.q)
+	query = request.GET.get('term') or request.GET.get('q') or ''
+	food_items = search_food_items(user.pk, query)
 
-		return qs
+	return JsonResponse({
+		'results': [{'id': food_item_id, 'text': name} for food_item_id, name in food_items],
+		'more': False,
+	})
 
 ##############################################################################
 #---------------------------- Food Purchase ---------------------------------#
 ##############################################################################
 
-def price_record_list(request):
-	user = request.user
-	if not user.is_authenticated:
+async def price_record_list(request):
+	user = await get_user(request)
+	if user is None:
 		return HttpResponseRedirect('/')
 
-	price_records = FoodPurchase.objects.filter(food_item__user__exact=user).order_by('-date')
+	try:
+		page = await pagination.apaginate(
+			FoodPurchase.objects.filter(user=user).select_related('food_item'),
+			['-date', '-id'],
+			request.GET
+		)
+	except pagination.PaginationError as e:
+		return HttpResponseBadRequest(str(e))
 
 	food_purchase_form = FoodPurchaseForm(user=user)
 
@@ -141,10 +204,59 @@ def price_record_list(request):
 	context = {
 		'food_purchase_form': food_purchase_form,
 		'food_purchase_form_toggle': True,
-		'price_records': price_records
+		'price_records': page.items
 	}
 
-	return render(request, 'meals/food_purchase/list.html', context=context)
+	return await render_list_page(request, 'meals/food_purchase/list.html', 'meals/food_purchase/list_rows.html', context, page)
+
+# Stream the user's purchase history as a CSV file.
+def export_purchases_csv(request):
+	return export_purchases(request, export.generate_csv, 'text/csv', 'csv')
+
+# Stream the user's purchase history as newline delimited JSON.
+def export_purchases_ndjson(request):
+	return export_purchases(request, export.generate_ndjson, 'application/x-ndjson', 'ndjson')
+
+def export_purchases(request, generate, content_type, extension):
+	user = request.user
+	if not user.is_authenticated:
+		return HttpResponse(status=401)
+
+	try:
+		purchases = export.get_export_queryset(user, request.GET)
+	except export.ExportFilterError as e:
+		return HttpResponseBadRequest(str(e))
+
+	response = StreamingHttpResponse(generate(purchases), content_type=content_type)
+	response['Content-Disposition'] = f'attachment; filename="purchases.{extension}"'
+
+	return response
+
+# Import purchases from an uploaded CSV or NDJSON file, and return a report of the import.
+@require_POST
+def import_purchases(request):
+	user = request.user
+	if not user.is_authenticated:
+		return HttpResponse(status=401)
+
+	upload = request.FILES.get('file')
+
+	if upload is None:
+		return HttpResponseBadRequest('A file must be uploaded.')
+
+	try:
+		reader = importer.get_reader(request.POST.get('format') or upload.name)
+	except importer.ImportFormatError as e:
+		return HttpResponseBadRequest(str(e))
+
+	file = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+
+	try:
+		result = importer.import_purchases(user, reader(file))
+	except importer.ImportFormatError as e:
+		return HttpResponseBadRequest(str(e))
+
+	return JsonResponse(result.as_dict())
 
 def new_food_purchase(request):
 	user = request.user
@@ -224,29 +336,57 @@ def food_purchase_delete(request, food_purchase_id):
 #------------------------------- Meal Instance ------------------------------#
 ##############################################################################
 
-def meal_instance_list(request):
-	user = request.user
-	if not user.is_authenticated:
+async def meal_instance_list(request):
+	user = await get_user(request)
+	if user is None:
 		return redirect('/')
 
-	meal_instances = MealInstance.objects.filter(meal__user__exact=user).order_by('-date')
-
 	if request.method == 'POST':
-		meal_instance_form = MealInstanceForm(request.POST, user=user)
-
-		if meal_instance_form.is_valid():
-			meal_instance_form.save()
-	
+		meal_instance_form = await save_meal_instance_form(request, user)
 	else:
 		meal_instance_form = MealInstanceForm(user=user)
 
+	try:
+		page = await pagination.apaginate(
+			MealInstance.objects.filter(user=user).select_related('meal'),
+			['-date', '-id'],
+			request.GET
+		)
+	except pagination.PaginationError as e:
+		return HttpResponseBadRequest(str(e))
+
+	# Only the meal instances on the page are priced.
+	meal_instances = await sync_to_async(add_meal_instance_costs)(page.items)
+
 	context = {
 		'user': user,
 		'meal_instances': meal_instances,
 		'meal_instance_form': meal_instance_form
 	}
 
-	return render(request, 'meals/meal_instance/list.html', context)
+	return await render_list_page(request, 'meals/meal_instance/list.html', 'meals/meal_instance/list_rows.html', context, page)
+
+@sync_to_async
+def save_meal_instance_form(request, user):
+	meal_instance_form = MealInstanceForm(request.POST, user=user)
+
+	if meal_instance_form.is_valid():
+		meal_instance_form.save()
+
+	return meal_instance_form
+
+# Set the cost of each meal instance on the day it was made, and its cost per serving, for the meal instance table.
+# All the meal instances are priced together.
+def add_meal_instance_costs(meal_instances):
+	meal_instances = list(meal_instances)
+	costs = get_meal_instance_costs(meal_instances)
+
+	for meal_instance in meal_instances:
+		cost, cost_per_serving = costs[meal_instance.id]
+		meal_instance.cost = format_ingredient_price(cost)
+		meal_instance.cost_per_serving = format_ingredient_price(cost_per_serving)
+
+	return meal_instances
 
 def new_meal_instance(request):
 	user = request.user
@@ -291,44 +431,129 @@ def meal_instance_delete(request, meal_instance_id):
 #------------------------------------ Meal ----------------------------------#
 ##############################################################################
 
-def meal_list(request):
-	user = request.user
-	if not user.is_authenticated:
-		return HttpResponse(status=401)
-
-	meals = Meal.objects.filter(user=user)
+StandardIngredientFormSet = formset_factory(StandardIngredientForm, formset=BaseStandardIngredientFormSet, extra=0)
 
-	StandardIngredientFormSet = formset_factory(StandardIngredientForm, extra=0)
+async def meal_list(request):
+	user = await get_user(request)
+	if user is None:
+		return HttpResponse(status=401)
 
 	if request.method == 'POST':
-		meal_form = MealForm(request.POST)
-		ingredient_formset = StandardIngredientFormSet(request.POST, request.FILES, prefix='ingredient', form_kwargs={'user': user})
-
-		if meal_form.is_valid():
-			meal = meal_form.save(user=user, commit=False)
+		meal, meal_form, ingredient_formset = await save_meal_forms(request, user)
 
-			for ingredient_form in ingredient_formset:
-				ingredient_form.instance.meal = meal
-
-			if ingredient_formset.is_valid():
-				meal.save()
-
-				for ingredient_form in ingredient_formset:
-					ingredient_form.save(meal=meal)
-
-				return redirect('meals_item', meal_id=meal.id)
-			
+		if meal is not None:
+			return redirect('meals_item', meal_id=meal.id)
 	else:
 		meal_form = MealForm()
 		ingredient_formset = StandardIngredientFormSet(prefix='ingredient', form_kwargs={'user': user})
 
+	try:
+		page = await pagination.apaginate(Meal.objects.with_stats(user), ['name', 'id'], request.GET)
+	except pagination.PaginationError as e:
+		return HttpResponseBadRequest(str(e))
+
+	# Price all of the meals on the page at once, rather than one query per ingredient.
+	meals = page.items
+	meal_prices = await sync_to_async(cache.get_meal_prices)(user, meals)
+
+	for meal in meals:
+		meal.newest_price = format_meal_price(meal_prices[meal.id])
+
 	context = {
 		'meal_form': meal_form,
 		'ingredient_formset': ingredient_formset,
 		'meals': meals
 	}
 
-	return render(request, 'meals/meals/list.html', context)
+	return await render_list_page(request, 'meals/meals/list.html', 'meals/meals/list_rows.html', context, page)
+
+# Save a new meal and its ingredients. Returns the meal, or None if the forms are not valid, and the forms.
+@sync_to_async
+def save_meal_forms(request, user):
+	meal_form = MealForm(request.POST)
+	ingredient_formset = StandardIngredientFormSet(request.POST, request.FILES, prefix='ingredient', form_kwargs={'user': user})
+
+	if meal_form.is_valid():
+		meal = meal_form.save(user=user, commit=False)
+
+		for ingredient_form in ingredient_formset:
+			ingredient_form.instance.meal = meal
+
+		if ingredient_formset.is_valid():
+			meal = ingredient_formset.save(meal)
+
+			return meal, meal_form, ingredient_formset
+
+	return None, meal_form, ingredient_formset
+
+# Return the list in the meals key of a JSON request body, or raise a MealBatchError.
+def _get_batch(request):
+	try:
+		body = json.loads(request.body)
+	except ValueError:
+		raise meal_batch.MealBatchError('The request body must be JSON.')
+
+	if not isinstance(body, dict):
+		raise meal_batch.MealBatchError('The request body must be an object with a list of meals.')
+
+	return body.get('meals')
+
+# Create a batch of meals with their ingredients, from a JSON body such as
+# {"meals": [{"name": "Porridge", "ingredients": [{"food_item": "Oats", "quantity": 80, "unit": "g"}]}]}.
+# Food items can be given by id or by name, and are created if they do not exist.
+@require_POST
+def meal_batch_create(request):
+	user = request.user
+	if not user.is_authenticated:
+		return HttpResponse(status=401)
+
+	try:
+		meals = meal_batch.create_meals(user, _get_batch(request))
+	except meal_batch.MealBatchError as e:
+		return JsonResponse(e.as_dict(), status=400)
+
+	return JsonResponse({'meals': meal_batch.serialise_meals(meals)}, status=201)
+
+# Copy a batch of meals with their ingredients, from a JSON body such as {"meals": [{"id": 1, "name": "Porridge for two"}]}.
+@require_POST
+def meal_batch_clone(request):
+	user = request.user
+	if not user.is_authenticated:
+		return HttpResponse(status=401)
+
+	try:
+		meals = meal_batch.clone_meals(user, _get_batch(request))
+	except meal_batch.MealBatchError as e:
+		return JsonResponse(e.as_dict(), status=400)
+
+	return JsonResponse({'meals': meal_batch.serialise_meals(meals)}, status=201)
+
+# The cheapest plan of the user's meals for a number of days which meets the constraints in the query parameters.
+def meal_plan(request):
+	user = request.user
+	if not user.is_authenticated:
+		return HttpResponse(status=401)
+
+	try:
+		plan = planner.plan_meals(user, planner.parse_parameters(request.GET))
+	except planner.PlanParameterError as e:
+		return HttpResponseBadRequest(str(e))
+
+	return JsonResponse(plan.as_dict())
+
+# The combined ingredients of the user's meals given in the meals query parameter, and their cost at the cheapest locations.
+def shopping_list_view(request):
+	user = request.user
+	if not user.is_authenticated:
+		return HttpResponse(status=401)
+
+	try:
+		meal_servings = shopping_list.parse_meals(request.GET.get('meals'))
+		currency = shopping_list.parse_currency(request.GET)
+	except shopping_list.ShoppingListParameterError as e:
+		return HttpResponseBadRequest(str(e))
+
+	return JsonResponse(shopping_list.get_shopping_list(user, meal_servings, currency).as_dict())
 
 def meals_item(request, meal_id):
 	user = request.user
@@ -367,12 +592,38 @@ def meals_item(request, meal_id):
 		standard_ingredient_form = StandardIngredientForm(meal=meal, user=user)
 
 	meal_instance_form.fields['meal'].widget = forms.HiddenInput()
+
+	# Only the meal instances on the page are priced.
+	try:
+		page = pagination.paginate(MealInstance.objects.filter(meal=meal), ['-date', '-id'], request.GET)
+	except pagination.PaginationError as e:
+		return HttpResponseBadRequest(str(e))
+
+	meal_instances = add_meal_instance_costs(page.items)
+
+	if request.headers.get('HX-Request'):
+		context = {
+			'hide_meal_instance_name': True,
+			'meal_instances': meal_instances,
+			'next_page_url': page.get_next_url(request),
+		}
+
+		return render(request, 'meals/meal_instance/list_rows.html', context)
+
+	standard_ingredients = list(standard_ingredients.select_related('food_item'))
+	meal_price, ingredient_prices = cache.get_meal_price_details(user, meal)
+
+	for ingredient in standard_ingredients:
+		ingredient.newest_price = format_ingredient_price(ingredient_prices.get(ingredient.id))
 	
 	context = {
 		'hide_meal_instance_name': True,
 		'meal': meal,
+		'meal_price': format_meal_price(meal_price),
 		'standard_ingredients': standard_ingredients,
-		'meal_instances': meal.meal_instances,
+		'meal_instances': meal_instances,
+		'num_meal_instances': meal.meal_instances.count(),
+		'next_page_url': page.get_next_url(request),
 		'standard_ingredients_form': standard_ingredient_form,
 		'meal_instance_form': meal_instance_form
 	}
@@ -447,4 +698,40 @@ def ingredient_delete(request, ingredient_id):
 	messages.success(request, message)
 
 	previous_page = request.META.get('HTTP_REFERER', '/')
-	return redirect(previous_page)
\ No newline at end of file
+	return redirect(previous_page)
+
+##############################################################################
+#-------------------------------- Profiling ---------------------------------#
+##############################################################################
+
+# The recent timings of each view recorded by the profiling middleware, for staff only.
+def perf(request):
+	user = request.user
+	if not user.is_authenticated:
+		return HttpResponse(status=401)
+
+	if not user.is_staff:
+		return HttpResponseForbidden()
+
+	return JsonResponse({
+		'enabled': settings.PROFILING_ENABLED,
+		'views': profiling.stats.as_dict(),
+	})
+
+# The Prometheus metrics of every process, in the text exposition format,
+# for scrapers which send METRICS_TOKEN as a bearer token, and for staff.
+def metrics_view(request):
+	if not settings.METRICS_ENABLED:
+		return HttpResponse(status=404)
+
+	has_token = bool(settings.METRICS_TOKEN) and request.headers.get('Authorization') == f'Bearer {settings.METRICS_TOKEN}'
+
+	if not has_token and not request.user.is_authenticated:
+		return HttpResponse(status=401)
+
+	if not has_token and not request.user.is_staff:
+		return HttpResponseForbidden()
+
+	content, content_type = metrics.export()
+
+	return HttpResponse(content, content_type=content_type)